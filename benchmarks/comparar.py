@@ -0,0 +1,43 @@
+import argparse
+import json
+import sys
+
+LIMIAR_PADRAO = 1.10
+
+
+def comparar(base, atual, limiar=LIMIAR_PADRAO):
+    # Devolve (nome, mediana base, mediana atual, razão) para os benchmarks presentes nos dois arquivos
+    linhas = []
+    for nome, resultado in atual["resultados"].items():
+        anterior = base["resultados"].get(nome)
+        if anterior is None:
+            continue
+        razao = resultado["mediana_s"] / anterior["mediana_s"] if anterior["mediana_s"] else float("inf")
+        linhas.append((nome, anterior["mediana_s"], resultado["mediana_s"], razao))
+    regressoes = [linha for linha in linhas if linha[3] > limiar]
+    return linhas, regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara dois arquivos de resultados de benchmarks.")
+    parser.add_argument("base")
+    parser.add_argument("atual")
+    parser.add_argument("--limiar", type=float, default=LIMIAR_PADRAO,
+                        help="razão atual/base acima da qual o resultado é tratado como regressão")
+    args = parser.parse_args(argv)
+    with open(args.base, encoding="utf-8") as arquivo:
+        base = json.load(arquivo)
+    with open(args.atual, encoding="utf-8") as arquivo:
+        atual = json.load(arquivo)
+    if base["meta"]["movimentacoes"] != atual["meta"]["movimentacoes"]:
+        print("aviso: os resultados foram medidos com bancos de tamanhos diferentes", file=sys.stderr)
+    print(f"{'benchmark':<40} {'base (ms)':>12} {'atual (ms)':>12} {'razão':>8}")
+    linhas, regressoes = comparar(base, atual, args.limiar)
+    for nome, anterior, resultado, razao in linhas:
+        marca = "  <- regressão" if razao > args.limiar else ""
+        print(f"{nome:<40} {anterior * 1000:>12.2f} {resultado * 1000:>12.2f} {razao:>8.2f}{marca}")
+    return 1 if regressoes else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+import argparse
+from datetime import datetime, timezone
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from gestor_financeiro import DatabaseManager, converter_data_para_exibicao, formatar_valor
+
+from .gerar_dados import SEMENTE_PADRAO, TAMANHOS, gerar_banco, gerar_movimentacoes
+
+PASTA_DADOS = os.path.join(os.path.dirname(__file__), "dados")
+REPETICOES_PADRAO = 5
+
+BENCHMARKS = {}
+
+
+def benchmark(nome, gui=False, depois=None):
+    # Registra uma função de benchmark; depois(contexto) desfaz as escritas fora da medição
+    def registrar(funcao):
+        BENCHMARKS[nome] = (funcao, gui, depois)
+        return funcao
+    return registrar
+
+
+class Contexto:
+    def __init__(self, db, quantidade, pasta_temporaria):
+        self.db = db
+        self.quantidade = quantidade
+        self.pasta_temporaria = pasta_temporaria
+        self.maior_id = db.fetch_all('SELECT COALESCE(MAX(id), 0) FROM movimentacoes')[0][0]
+        self.ano = db.fetch_all("SELECT substr(MAX(data), 1, 4) FROM movimentacoes")[0][0] or "2024"
+        self.root = None
+        self.ui = None
+
+
+def _remover_inseridas(contexto):
+    contexto.db.execute_query('DELETE FROM movimentacoes WHERE id > ?', (contexto.maior_id,))
+
+
+@benchmark("inserir_1000_individuais", depois=_remover_inseridas)
+def _inserir_individuais(contexto):
+    for _ in range(1000):
+        contexto.db.adicionar_movimentacao(data="15/06/2024", tipo="Saída", conta="Carteira",
+                                           valor="12.34", observacoes="benchmark")
+
+
+@benchmark("importar_10000_em_lote", depois=_remover_inseridas)
+def _importar_em_lote(contexto):
+    contexto.db.importar_movimentacoes(gerar_movimentacoes(10_000, semente=1))
+
+
+@benchmark("buscar_movimentacoes_conta")
+def _buscar_movimentacoes_conta(contexto):
+    contexto.db.buscar_movimentacoes("Conta Conjunta")
+
+
+@benchmark("pagina_inicial")
+def _pagina_inicial(contexto):
+    contexto.db.buscar_pagina_movimentacoes()
+
+
+@benchmark("pagina_profunda")
+def _pagina_profunda(contexto):
+    contexto.db.buscar_pagina_movimentacoes(apos_id=contexto.maior_id // 2)
+
+
+@benchmark("pagina_filtrada_periodo_conta_tipo")
+def _pagina_filtrada(contexto):
+    contexto.db.buscar_pagina_movimentacoes({
+        "data_inicio": f"01/01/{contexto.ano}", "data_fim": f"31/12/{contexto.ano}",
+        "conta": "Poupança", "tipo": "Entrada",
+    })
+
+
+@benchmark("busca_textual")
+def _busca_textual(contexto):
+    contexto.db.buscar_pagina_movimentacoes({"busca": "farmácia shop*"})
+
+
+@benchmark("atualizar_resumo")
+def _atualizar_resumo(contexto):
+    contexto.db.buscar_saldos()
+    contexto.db.calcular_saldo()
+
+
+@benchmark("fluxo_de_caixa_mensal")
+def _fluxo_de_caixa(contexto):
+    contexto.db.fluxo_de_caixa("mes")
+
+
+@benchmark("totalizar_periodo")
+def _totalizar_periodo(contexto):
+    contexto.db.totalizar_movimentacoes({"data_inicio": "15/03/2016", "data_fim": "20/07/2023"})
+
+
+@benchmark("exportar_csv")
+def _exportar_csv(contexto):
+    contexto.db.exportar_csv(os.path.join(contexto.pasta_temporaria, "exportacao.csv"))
+
+
+def _linhas_formatadas(contexto, limite):
+    return [
+        (mov[0], converter_data_para_exibicao(mov[1]), mov[2], mov[3], formatar_valor(abs(mov[4])), mov[5])
+        for mov in contexto.db.buscar_pagina_movimentacoes(limite=limite)
+    ]
+
+
+@benchmark("treeview_resumo", gui=True)
+def _treeview_resumo(contexto):
+    dados = [(conta, formatar_valor(centavos)) for conta, centavos in contexto.db.buscar_saldos()]
+    contexto.ui._preencher_treeview(contexto.ui.tree_resumo, dados, [0, 1])
+    contexto.root.update()
+
+
+@benchmark("treeview_10000_linhas", gui=True)
+def _treeview_10000_linhas(contexto):
+    contexto.ui._preencher_treeview(contexto.ui.tree_movimentacoes, _linhas_formatadas(contexto, 10_000), range(6))
+    contexto.root.update()
+
+
+@benchmark("grade_virtual_pagina_inicial", gui=True)
+def _grade_virtual(contexto):
+    contexto.ui.grade_movimentacoes.exibir_pagina_inicial(contexto.db.buscar_pagina_movimentacoes())
+    contexto.root.update()
+
+
+def _abrir_interface(contexto):
+    # Importado só aqui para que os benchmarks sem interface rodem sem Tk nem display
+    import tkinter as tk
+    import main
+
+    try:
+        contexto.root = tk.Tk()
+    except tk.TclError as e:
+        raise SystemExit(f"erro: sem display para a interface ({e}); execute com xvfb-run") from e
+    contexto.ui = main.UIManager(contexto.root, contexto.db.db_name)
+    contexto.root.update()
+
+
+def medir(funcao, contexto, repeticoes, depois=None):
+    funcao(contexto)  # aquecimento: cache de páginas e de comandos preparados
+    if depois:
+        depois(contexto)
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(contexto)
+        tempos.append(time.perf_counter() - inicio)
+        if depois:
+            depois(contexto)
+    return {
+        "repeticoes": repeticoes,
+        "min_s": min(tempos),
+        "mediana_s": statistics.median(tempos),
+        "media_s": statistics.mean(tempos),
+        "max_s": max(tempos),
+    }
+
+
+def preparar_banco(tamanho, semente, pasta=PASTA_DADOS):
+    # Os bancos gerados ficam em cache por tamanho e semente, já que gerar 10M linhas leva minutos
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(pasta, f"movimentacoes-{tamanho}-{semente}.db")
+    if not os.path.exists(caminho):
+        print(f"gerando {caminho}...", file=sys.stderr)
+        gerar_banco(caminho, TAMANHOS[tamanho], semente)
+    return caminho
+
+
+def _versao_git():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executar(tamanho="10k", semente=SEMENTE_PADRAO, repeticoes=REPETICOES_PADRAO, gui=False, apenas=None):
+    caminho = preparar_banco(tamanho, semente)
+    db = DatabaseManager(caminho)
+    resultados = {}
+    with tempfile.TemporaryDirectory() as pasta_temporaria:
+        contexto = Contexto(db, TAMANHOS[tamanho], pasta_temporaria)
+        if gui:
+            _abrir_interface(contexto)
+        for nome, (funcao, requer_gui, depois) in BENCHMARKS.items():
+            if (requer_gui and not gui) or (apenas and nome not in apenas):
+                continue
+            resultados[nome] = medir(funcao, contexto, repeticoes, depois)
+            print(f"{nome:<40} {resultados[nome]['mediana_s'] * 1000:>12.2f} ms", file=sys.stderr)
+        if contexto.root is not None:
+            contexto.ui.executor.encerrar()
+            contexto.root.destroy()
+    db.conn.close()
+    return {
+        "meta": {
+            "commit": _versao_git(),
+            "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "tamanho": tamanho,
+            "movimentacoes": TAMANHOS[tamanho],
+            "semente": semente,
+            "gui": gui,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "plataforma": platform.platform(),
+        },
+        "resultados": resultados,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mede o desempenho do banco e da interface com dados sintéticos.")
+    parser.add_argument("--tamanho", choices=sorted(TAMANHOS), default="10k")
+    parser.add_argument("--semente", type=int, default=SEMENTE_PADRAO)
+    parser.add_argument("--repeticoes", type=int, default=REPETICOES_PADRAO)
+    parser.add_argument("--gui", action="store_true", help="inclui a Treeview (requer display; use xvfb-run)")
+    parser.add_argument("--apenas", nargs="+", choices=sorted(BENCHMARKS), help="executa só os benchmarks indicados")
+    parser.add_argument("--saida", help="arquivo JSON de resultados (padrão: saída padrão)")
+    args = parser.parse_args(argv)
+    resultado = executar(args.tamanho, args.semente, args.repeticoes, args.gui, args.apenas)
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            arquivo.write(texto + "\n")
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import argparse
+from datetime import date, timedelta
+from itertools import accumulate
+import os
+import random
+
+from gestor_financeiro import DatabaseManager
+
+TAMANHOS = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+SEMENTE_PADRAO = 42
+INICIO_PADRAO = date(2015, 1, 1)
+ANOS_PADRAO = 10
+
+# (nome, peso): a conta corrente e o cartão concentram a maior parte dos lançamentos
+CONTAS = [
+    ("Conta Corrente", 45),
+    ("Cartão de Crédito", 30),
+    ("Carteira", 10),
+    ("Poupança", 7),
+    ("Investimentos", 5),
+    ("Conta Conjunta", 3),
+]
+
+# (descrição, peso, mediana em reais, dispersão log-normal)
+SAIDAS = [
+    ("Supermercado", 18, 180, 0.7),
+    ("Padaria", 12, 25, 0.5),
+    ("Restaurante", 10, 70, 0.6),
+    ("Combustível", 8, 200, 0.4),
+    ("Farmácia", 6, 60, 0.7),
+    ("Uber", 8, 25, 0.6),
+    ("Aluguel", 2, 1800, 0.2),
+    ("Conta de luz", 2, 180, 0.3),
+    ("Conta de água", 2, 90, 0.3),
+    ("Internet", 2, 120, 0.1),
+    ("Streaming", 3, 40, 0.3),
+    ("Academia", 2, 110, 0.2),
+    ("Boleto", 4, 300, 1.0),
+    ("Transferência enviada", 5, 250, 1.1),
+]
+ENTRADAS = [
+    ("Salário", 5, 6500, 0.3),
+    ("Transferência recebida", 4, 300, 1.0),
+    ("Pix recebido", 4, 120, 1.0),
+    ("Rendimento", 3, 45, 0.8),
+    ("Reembolso", 1, 80, 0.7),
+]
+ESTABELECIMENTOS = ["Centro", "Shopping", "Bairro", "Online", "Matriz", "Filial", "Norte", "Sul", ""]
+PROPORCAO_ENTRADAS = 0.2
+
+
+def gerar_movimentacoes(quantidade, semente=SEMENTE_PADRAO, inicio=INICIO_PADRAO, anos=ANOS_PADRAO):
+    # Gera linhas no formato de importar_movimentacoes, sempre as mesmas para a mesma semente.
+    # Dias úteis têm mais lançamentos que fins de semana e o volume cresce ao longo dos anos.
+    aleatorio = random.Random(semente)
+    dias = [inicio + timedelta(days=i) for i in range(365 * anos)]
+    pesos_dias = [(1 if dia.weekday() < 5 else 0.6) * (1 + i / len(dias)) for i, dia in enumerate(dias)]
+    datas = [dia.isoformat() for dia in dias]
+    contas = [nome for nome, _ in CONTAS]
+    pesos_contas = [peso for _, peso in CONTAS]
+    # Pesos acumulados calculados uma vez; choices refaria a soma a cada sorteio
+    acumulado_saidas = list(accumulate(categoria[1] for categoria in SAIDAS))
+    acumulado_entradas = list(accumulate(categoria[1] for categoria in ENTRADAS))
+
+    gerados = 0
+    while gerados < quantidade:
+        bloco = min(10_000, quantidade - gerados)
+        blocos_datas = aleatorio.choices(datas, pesos_dias, k=bloco)
+        blocos_contas = aleatorio.choices(contas, pesos_contas, k=bloco)
+        for i in range(bloco):
+            if aleatorio.random() < PROPORCAO_ENTRADAS:
+                tipo = "Entrada"
+                descricao, _, mediana, dispersao = aleatorio.choices(ENTRADAS, cum_weights=acumulado_entradas)[0]
+            else:
+                tipo = "Saída"
+                descricao, _, mediana, dispersao = aleatorio.choices(SAIDAS, cum_weights=acumulado_saidas)[0]
+            valor = max(round(mediana * aleatorio.lognormvariate(0, dispersao), 2), 0.01)
+            observacoes = f"{descricao} {aleatorio.choice(ESTABELECIMENTOS)}".strip()
+            gerados += 1
+            yield gerados, {
+                "data": blocos_datas[i],
+                "tipo": tipo,
+                "conta": blocos_contas[i],
+                "valor": f"{valor:.2f}",
+                "observacoes": observacoes,
+            }
+
+
+def gerar_banco(caminho, quantidade, semente=SEMENTE_PADRAO):
+    if os.path.exists(caminho):
+        raise FileExistsError(f"{caminho} já existe")
+    db = DatabaseManager(caminho)
+    try:
+        db.importar_movimentacoes(gerar_movimentacoes(quantidade, semente))
+        db.conn.execute('PRAGMA optimize')
+    finally:
+        db.conn.close()
+    return caminho
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera um banco de movimentações sintéticas e determinísticas.")
+    parser.add_argument("arquivo")
+    parser.add_argument("--tamanho", choices=sorted(TAMANHOS), default="10k")
+    parser.add_argument("--quantidade", type=int, help="quantidade exata de movimentações (substitui --tamanho)")
+    parser.add_argument("--semente", type=int, default=SEMENTE_PADRAO)
+    args = parser.parse_args(argv)
+    gerar_banco(args.arquivo, args.quantidade or TAMANHOS[args.tamanho], args.semente)
+    print(args.arquivo)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+from .banco import DatabaseManager, conectar, restaurar_backup
+from .cache import CacheResultados
+from .conversoes import (
+    calcular_impressao,
+    converter_busca,
+    converter_data_para_banco,
+    converter_data_para_exibicao,
+    converter_para_centavos,
+    converter_valor,
+    formatar_valor,
+    normalizar_descricao,
+    validar_campos,
+)
+from .erros import ErroBancoDados, ErroGestorFinanceiro, ExportacaoCancelada
+from .executor import EscritorAgrupado, ExecutorConsultas
+from .exportacao import pyarrow_disponivel
+from .instrumentacao import Instrumentacao
+from .importacao import ResultadoConciliacao, ResultadoImportacao, ler_arquivo, ler_csv, ler_ofx
+from .recorrencias import FREQUENCIAS, gerar_ocorrencias
@@ -0,0 +1,1757 @@
+import calendar
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import json
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+
+from .cache import CacheResultados
+from .conversoes import (
+    calcular_impressao,
+    converter_busca,
+    converter_data_para_banco,
+    converter_para_centavos,
+    converter_valor,
+    validar_campos,
+)
+from .erros import ErroBancoDados, ExportacaoCancelada
+from .exportacao import TAMANHO_BLOCO_EXPORTACAO, criar_escritor
+from .importacao import TAMANHO_LOTE_IMPORTACAO, ResultadoConciliacao, ResultadoImportacao, ler_arquivo
+from .recorrencias import FREQUENCIAS, gerar_ocorrencias
+from .sincronizacao import PAGINAS_POR_PASSO_BACKUP, copias_da_pasta, escrever_alteracoes, ler_alteracoes
+
+TAMANHO_LOTE_MIGRACAO = 10000
+TAMANHO_PAGINA = 200
+CACHE_COMANDOS_PADRAO = 512
+# Abaixo do limite padrão do SQLite (10), deixando espaço para o arquivo sendo criado por arquivar_ano
+MAX_ARQUIVOS_ANEXADOS = 8
+# Tolerâncias padrão da conciliação entre a data/valor do extrato e os da movimentação
+TOLERANCIA_DIAS = 3
+TOLERANCIA_CENTAVOS = 0
+# Parâmetros por comando em consultas com IN (...), bem abaixo do limite do SQLite
+MAX_PARAMETROS_CONSULTA = 500
+
+PRAGMAS_PADRAO = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -65536,  # em KiB: 64 MiB de cache de páginas
+    "mmap_size": 268435456,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+    "foreign_keys": "ON",
+}
+
+# Gatilhos por linha que a importação em lote desliga e substitui por um delta agregado
+GATILHOS_INSERCAO = ("saldos_apos_inserir", "busca_apos_inserir", "resumo_apos_inserir", "alteracoes_apos_inserir")
+# Gatilhos desligados ao mover um ano para o arquivo: saldos e resumos continuam contando essas linhas
+# e o arquivamento não é uma exclusão a ser repassada para outras instâncias
+GATILHOS_EXCLUSAO = ("saldos_apos_excluir", "resumo_apos_excluir", "alteracoes_apos_excluir")
+# Gatilhos do registro de alterações, desligados enquanto alterações de outra instância são aplicadas
+GATILHOS_ALTERACOES = (
+    "alteracoes_apos_inserir", "alteracoes_apos_editar", "alteracoes_apos_excluir",
+    "alteracoes_contas_apos_inserir", "alteracoes_contas_apos_editar", "alteracoes_contas_apos_excluir",
+)
+COLUNAS_MOVIMENTACOES = "id, data, tipo, conta_id, valor_centavos, observacoes"
+
+# Colunas devolvidas nas consultas de movimentações: id, data, tipo, nome da conta, valor_centavos, observacoes.
+# fonte é a tabela movimentacoes ou a união dela com os anos arquivados (ver _fonte_movimentacoes).
+SELECT_MOVIMENTACOES = '''
+    SELECT m.id, m.data, m.tipo, c.nome, m.valor_centavos, m.observacoes
+    FROM {fonte} m JOIN contas c ON c.id = m.conta_id'''
+
+# Saldo da conta antes da linha (data, id): meses anteriores vêm de resumo_mensal e só o começo do
+# próprio mês é somado a partir de movimentacoes, pelo índice (conta_id, data)
+SALDO_ANTERIOR = '''(
+    (SELECT COALESCE(SUM(r.total), 0) FROM resumo_mensal r WHERE r.conta_id = {conta} AND r.mes < substr({data}, 1, 7))
+    + (SELECT COALESCE(SUM(a.valor_centavos), 0) FROM {fonte} a
+       WHERE a.conta_id = {conta} AND a.data >= substr({data}, 1, 7) || '-01' AND (a.data, a.id) < ({data}, {id}))
+)'''
+
+
+def conectar(db_name, cached_statements=CACHE_COMANDOS_PADRAO, **pragmas):
+    # Fábrica de conexões. Em WAL leitores não bloqueiam o escritor e vice-versa; o autocommit
+    # (isolation_level=None) deixa o controle de transações explícito em DatabaseManager.transaction.
+    # Passe um pragma como None para não aplicá-lo.
+    conn = sqlite3.connect(db_name, isolation_level=None, cached_statements=cached_statements)
+    for nome, valor in {**PRAGMAS_PADRAO, **pragmas}.items():
+        if valor is not None:
+            conn.execute(f'PRAGMA {nome} = {valor}')
+    return conn
+
+
+class DatabaseManager:
+    def __init__(self, db_name="financeiro.db", instrumentacao=None, cache=True, **opcoes_conexao):
+        # instrumentacao: Instrumentacao opcional que recebe o tempo e as linhas de cada comando
+        # executado por execute_query e fetch_all. cache: True, False ou um CacheResultados.
+        self.db_name = db_name
+        self.instrumentacao = instrumentacao
+        self.cache = CacheResultados() if cache is True else (cache or None)
+        self.conn = conectar(db_name, **opcoes_conexao)
+        self._savepoints = 0
+        self._geracao_escrita = 0
+        # Arquivos de anos anteriores anexados a esta conexão, do menos para o mais recente em uso
+        self._anexados = OrderedDict()
+        self._pasta = os.path.dirname(os.path.abspath(db_name))
+        self._initialize_database()
+
+    @contextmanager
+    def transaction(self):
+        # Agrupa várias escritas num único commit. BEGIN IMMEDIATE reserva a escrita já no início,
+        # evitando "database is locked" ao promover uma leitura; transações aninhadas viram savepoints.
+        if self.conn.in_transaction:
+            self._savepoints += 1
+            nome = f'sp_{self._savepoints}'
+            self.conn.execute(f'SAVEPOINT {nome}')
+            try:
+                yield self
+            except BaseException:
+                self.conn.execute(f'ROLLBACK TO {nome}')
+                self.conn.execute(f'RELEASE {nome}')
+                raise
+            else:
+                self.conn.execute(f'RELEASE {nome}')
+            finally:
+                self._savepoints -= 1
+            return
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield self
+        except BaseException:
+            self.conn.rollback()
+            raise
+        else:
+            self.conn.commit()
+            self._geracao_escrita += 1
+
+    def _initialize_database(self):
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS movimentacoes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                data TEXT NOT NULL,
+                tipo TEXT NOT NULL,
+                conta TEXT NOT NULL,
+                valor REAL NOT NULL,
+                observacoes TEXT
+            )
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS contas (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nome TEXT NOT NULL
+            )
+        ''')
+        self._migrar_esquema()
+
+    def _migrar_esquema(self):
+        # Cada migração roda uma única vez; a versão fica registrada em PRAGMA user_version
+        migracoes = [
+            self._migracao_datas_iso,
+            self._migracao_tabela_saldos,
+            self._migracao_gatilhos_em_lote,
+            self._migracao_valor_em_centavos,
+            self._migracao_contas_normalizadas,
+            self._migracao_remover_estado_gatilhos,
+            self._migracao_busca_textual,
+            self._migracao_resumo_mensal,
+            self._migracao_recorrencias,
+            self._migracao_arquivos,
+            self._migracao_impressao,
+            self._migracao_alteracoes,
+            self._migracao_chave_global,
+        ]
+        # A conversão de datas confirma por lotes para poder ser retomada (e é idempotente);
+        # as demais rodam numa única transação junto com a atualização da versão
+        migracoes_em_lotes = [self._migracao_datas_iso]
+        versao_atual = self.fetch_all('PRAGMA user_version')[0][0]
+        for versao, migracao in enumerate(migracoes, start=1):
+            if versao_atual < versao:
+                if migracao in migracoes_em_lotes:
+                    migracao()
+                    self.conn.execute(f'PRAGMA user_version = {versao}')
+                    continue
+                with self.transaction():
+                    migracao()
+                    self.conn.execute(f'PRAGMA user_version = {versao}')
+        if versao_atual < len(migracoes):
+            # Índices, gatilhos, saldos e resumos derivam do esquema e são recriados com as
+            # definições atuais sempre que alguma migração roda
+            with self.transaction():
+                self._criar_indices()
+                self._criar_gatilhos()
+                self.reconstruir_saldos()
+                self.reconstruir_resumo()
+
+    def _migracao_datas_iso(self):
+        # Converte DD/MM/AAAA para AAAA-MM-DD em lotes por faixa de id. Cada lote é confirmado
+        # separadamente e só toca linhas ainda no formato antigo, então uma migração
+        # interrompida pode ser retomada sem reprocessar o que já foi convertido.
+        maior_id = self.fetch_all('SELECT MAX(id) FROM movimentacoes')[0][0] or 0
+        for inicio in range(0, maior_id, TAMANHO_LOTE_MIGRACAO):
+            with self.transaction():
+                self.conn.execute('''
+                    UPDATE movimentacoes
+                    SET data = substr(data, 7, 4) || '-' || substr(data, 4, 2) || '-' || substr(data, 1, 2)
+                    WHERE id > ? AND id <= ?
+                      AND data GLOB '[0-9][0-9]/[0-9][0-9]/[0-9][0-9][0-9][0-9]'
+                ''', (inicio, inicio + TAMANHO_LOTE_MIGRACAO))
+
+    def _migracao_tabela_saldos(self):
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS saldos (
+                conta TEXT PRIMARY KEY,
+                entradas REAL NOT NULL DEFAULT 0,
+                saidas REAL NOT NULL DEFAULT 0,
+                quantidade INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+
+    def _migracao_gatilhos_em_lote(self):
+        # Durante importações em lote o gatilho de inserção fica desligado e os saldos
+        # recebem um único delta agregado ao final (ver importar_movimentacoes)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS estado_gatilhos (
+                lote_ativo INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        self.conn.execute('INSERT INTO estado_gatilhos (lote_ativo) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM estado_gatilhos)')
+
+    def _migracao_valor_em_centavos(self):
+        # valor REAL -> valor_centavos INTEGER com sinal (entradas positivas, saídas negativas). O
+        # arredondamento parte do texto mais curto que representa o REAL ("1.005", não 1.00499...)
+        # e usa ROUND_HALF_UP, como os valores digitados; o ROUND do SQLite daria 1.00
+        self.conn.create_function(
+            "converter_para_centavos", 2,
+            lambda valor, tipo: converter_para_centavos(Decimal(repr(float(valor))), tipo), deterministic=True)
+        self._recriar_tabela_movimentacoes('''
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            data TEXT NOT NULL,
+            tipo TEXT NOT NULL,
+            conta TEXT NOT NULL,
+            valor_centavos INTEGER NOT NULL,
+            observacoes TEXT
+        ''', '''
+            SELECT id, data, tipo, conta, converter_para_centavos(valor, tipo), observacoes
+            FROM movimentacoes
+        ''')
+        self.conn.execute('DROP TABLE saldos')
+        self.conn.execute('''
+            CREATE TABLE saldos (
+                conta TEXT PRIMARY KEY,
+                entradas INTEGER NOT NULL DEFAULT 0,
+                saidas INTEGER NOT NULL DEFAULT 0,
+                quantidade INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+
+    def _migracao_contas_normalizadas(self):
+        # movimentacoes.conta (texto) -> conta_id referenciando contas(id). Contas duplicadas são
+        # unificadas e contas usadas em movimentações mas ausentes do cadastro são criadas.
+        self.conn.execute('DELETE FROM contas WHERE id NOT IN (SELECT MIN(id) FROM contas GROUP BY nome)')
+        self.conn.execute('''
+            INSERT INTO contas (nome)
+            SELECT DISTINCT conta FROM movimentacoes WHERE conta NOT IN (SELECT nome FROM contas)
+        ''')
+        self.conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_contas_nome ON contas (nome)')
+        self._recriar_tabela_movimentacoes('''
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            data TEXT NOT NULL,
+            tipo TEXT NOT NULL,
+            conta_id INTEGER NOT NULL REFERENCES contas (id) ON DELETE RESTRICT,
+            valor_centavos INTEGER NOT NULL,
+            observacoes TEXT
+        ''', '''
+            SELECT m.id, m.data, m.tipo, c.id, m.valor_centavos, m.observacoes
+            FROM movimentacoes m JOIN contas c ON c.nome = m.conta
+        ''')
+        self.conn.execute('DROP TABLE saldos')
+        self.conn.execute('''
+            CREATE TABLE saldos (
+                conta_id INTEGER PRIMARY KEY REFERENCES contas (id) ON DELETE CASCADE,
+                entradas INTEGER NOT NULL DEFAULT 0,
+                saidas INTEGER NOT NULL DEFAULT 0,
+                quantidade INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+
+    def _migracao_remover_estado_gatilhos(self):
+        # A importação em lote passou a remover o gatilho de inserção dentro da própria transação;
+        # a condição WHEN consultada a cada linha custava mais do que o próprio gatilho
+        self.conn.execute('DROP TABLE IF EXISTS estado_gatilhos')
+
+    def _migracao_busca_textual(self):
+        # Índice FTS5 de conteúdo externo: guarda só os termos e lê o texto de movimentacoes pelo id.
+        # remove_diacritics faz "cafe" encontrar "café"; os índices de prefixo aceleram buscas como "merc*".
+        self.conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS movimentacoes_busca USING fts5 (
+                observacoes,
+                content = 'movimentacoes',
+                content_rowid = 'id',
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+        ''')
+        self.conn.execute("INSERT INTO movimentacoes_busca (movimentacoes_busca) VALUES ('rebuild')")
+
+    def _migracao_resumo_mensal(self):
+        # Totais pré-agregados por (conta, mês, tipo); total é a soma com sinal de valor_centavos
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS resumo_mensal (
+                conta_id INTEGER NOT NULL REFERENCES contas (id) ON DELETE CASCADE,
+                mes TEXT NOT NULL,
+                tipo TEXT NOT NULL,
+                total INTEGER NOT NULL DEFAULT 0,
+                quantidade INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (conta_id, mes, tipo)
+            ) WITHOUT ROWID
+        ''')
+
+    def _migracao_recorrencias(self):
+        # materializada_ate guarda a última data já lançada de cada regra; movimentacoes.recorrencia_id
+        # liga cada lançamento à regra que o gerou (ver idx_movimentacoes_recorrencia)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS recorrencias (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tipo TEXT NOT NULL,
+                conta_id INTEGER NOT NULL REFERENCES contas (id) ON DELETE RESTRICT,
+                valor_centavos INTEGER NOT NULL,
+                observacoes TEXT,
+                frequencia TEXT NOT NULL,
+                intervalo INTEGER NOT NULL DEFAULT 1,
+                data_inicio TEXT NOT NULL,
+                data_fim TEXT,
+                materializada_ate TEXT
+            )
+        ''')
+        self.conn.execute('''
+            ALTER TABLE movimentacoes
+            ADD COLUMN recorrencia_id INTEGER REFERENCES recorrencias (id) ON DELETE SET NULL
+        ''')
+
+    def _migracao_arquivos(self):
+        # Anos movidos para arquivos separados (caminho relativo à pasta do banco) e o fechamento
+        # acumulado de cada conta ao fim de cada um, usado como ponto de partida dos saldos
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS arquivos (
+                ano INTEGER PRIMARY KEY,
+                caminho TEXT NOT NULL,
+                quantidade INTEGER NOT NULL,
+                arquivado_em TEXT NOT NULL
+            )
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS fechamentos (
+                ano INTEGER NOT NULL REFERENCES arquivos (ano),
+                conta_id INTEGER NOT NULL REFERENCES contas (id) ON DELETE RESTRICT,
+                entradas INTEGER NOT NULL,
+                saidas INTEGER NOT NULL,
+                quantidade INTEGER NOT NULL,
+                PRIMARY KEY (ano, conta_id)
+            ) WITHOUT ROWID
+        ''')
+
+    def _migracao_impressao(self):
+        # Impressão digital do conteúdo (ver calcular_impressao) e o número da ocorrência entre as
+        # movimentações com a mesma impressão, na ordem dos ids; o par é único (idx_movimentacoes_impressao)
+        self.conn.execute('ALTER TABLE movimentacoes ADD COLUMN impressao INTEGER')
+        self.conn.execute('ALTER TABLE movimentacoes ADD COLUMN ocorrencia INTEGER')
+        self.conn.create_function("calcular_impressao", 4, calcular_impressao, deterministic=True)
+        self.conn.execute('UPDATE movimentacoes SET impressao = calcular_impressao(data, conta_id, valor_centavos, observacoes)')
+        self.conn.execute('''
+            UPDATE movimentacoes SET ocorrencia = n.ocorrencia
+            FROM (SELECT id, ROW_NUMBER() OVER (PARTITION BY impressao ORDER BY id) AS ocorrencia FROM movimentacoes) n
+            WHERE n.id = movimentacoes.id
+        ''')
+
+    def _migracao_alteracoes(self):
+        # Registro só de acréscimos, alimentado por gatilhos, de cada inserção, edição e exclusão em
+        # movimentacoes e contas. dados é a linha em JSON (a nova, ou a excluída) com a conta pelo
+        # nome, que não depende dos ids de cada instância. origem e origem_seq identificam alterações
+        # recebidas de outra instância; as locais ficam com NULL. sincronizacao guarda até onde cada
+        # instância de origem já foi aplicada aqui.
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS alteracoes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                tabela TEXT NOT NULL,
+                operacao TEXT NOT NULL,
+                dados TEXT NOT NULL,
+                origem TEXT,
+                origem_seq INTEGER,
+                registrada_em TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS sincronizacao (
+                origem TEXT PRIMARY KEY,
+                ultima_seq INTEGER NOT NULL
+            )
+        ''')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS instancia (id TEXT NOT NULL)')
+        self.conn.execute('INSERT INTO instancia (id) SELECT ? WHERE NOT EXISTS (SELECT 1 FROM instancia)',
+                          (uuid.uuid4().hex,))
+        # Backups gravados por fazer_backup, para que o próximo só leve as alterações posteriores
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS copias (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                pasta TEXT NOT NULL,
+                arquivo TEXT NOT NULL,
+                completa INTEGER NOT NULL,
+                seq_ate INTEGER NOT NULL,
+                criada_em TEXT NOT NULL
+            )
+        ''')
+
+    def _migracao_chave_global(self):
+        # Chave de cada movimentação entre instâncias: a instância onde foi criada e o id que recebeu
+        # lá. As criadas aqui ficam com origem NULL (a chave é esta instância e o próprio id), então
+        # inserir não custa nada a mais; as recebidas de outra instância guardam a chave de lá.
+        self.conn.execute('ALTER TABLE movimentacoes ADD COLUMN origem TEXT')
+        self.conn.execute('ALTER TABLE movimentacoes ADD COLUMN origem_id INTEGER')
+        # Até aqui as movimentações eram sincronizadas pelo id, que era o mesmo nas duas pontas: as
+        # inseridas por alterações de outra instância (ou herdadas por renovar_instancia) passam a
+        # ter a chave daquela instância, e o registro ganha a chave de cada movimentação
+        self.conn.execute('''
+            UPDATE movimentacoes SET origem = a.origem, origem_id = movimentacoes.id
+            FROM (
+                SELECT json_extract(dados, '$.id') AS id, origem, MAX(seq) FROM alteracoes
+                WHERE tabela = 'movimentacoes' AND operacao = 'inserir' AND origem IS NOT NULL
+                GROUP BY json_extract(dados, '$.id')
+            ) a
+            WHERE a.id = movimentacoes.id
+        ''')
+        self.conn.execute('''
+            UPDATE alteracoes
+            SET dados = json_remove(json_set(dados, '$.origem', COALESCE(origem, (SELECT id FROM instancia)),
+                                             '$.origem_id', json_extract(dados, '$.id')), '$.id')
+            WHERE tabela = 'movimentacoes'
+        ''')
+
+    def _recriar_tabela_movimentacoes(self, colunas, select):
+        # Troca o esquema da tabela copiando as linhas para uma tabela nova. O contador do
+        # AUTOINCREMENT é preservado para que ids de movimentações excluídas não sejam reutilizados.
+        sequencia = self.fetch_all("SELECT seq FROM sqlite_sequence WHERE name = 'movimentacoes'")
+        self.conn.execute(f'CREATE TABLE movimentacoes_nova ({colunas})')
+        self.conn.execute(f'INSERT INTO movimentacoes_nova {select}')
+        self.conn.execute('DROP TABLE movimentacoes')
+        self.conn.execute('ALTER TABLE movimentacoes_nova RENAME TO movimentacoes')
+        if sequencia:
+            self.conn.execute(
+                "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'movimentacoes'", (sequencia[0][0],)
+            )
+
+    def _criar_indices(self):
+        self.conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_movimentacoes_data_conta_tipo
+            ON movimentacoes (data, conta_id, tipo)
+        ''')
+        self.conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_movimentacoes_conta_data
+            ON movimentacoes (conta_id, data)
+        ''')
+        # Uma ocorrência por regra e data: rodar a materialização de novo nunca duplica lançamentos
+        self.conn.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_movimentacoes_recorrencia
+            ON movimentacoes (recorrencia_id, data) WHERE recorrencia_id IS NOT NULL
+        ''')
+        # Detecção de duplicatas na importação: uma consulta por linha, direto pela impressão
+        self.conn.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_movimentacoes_impressao
+            ON movimentacoes (impressao, ocorrencia)
+        ''')
+        # Movimentações recebidas de outras instâncias, pela chave de lá (ver _migracao_chave_global)
+        self.conn.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_movimentacoes_origem
+            ON movimentacoes (origem, origem_id) WHERE origem IS NOT NULL
+        ''')
+
+    def _criar_gatilhos(self):
+        self._criar_gatilhos_saldos()
+        self._criar_gatilhos_busca()
+        self._criar_gatilhos_resumo()
+        self._criar_gatilhos_arquivo()
+        self._criar_gatilhos_alteracoes()
+
+    def _criar_gatilhos_saldos(self):
+        # Os gatilhos mantêm a tabela saldos na mesma transação da escrita em movimentacoes,
+        # então o resumo nunca precisa varrer as movimentações
+        gatilhos = {
+            "saldos_apos_inserir": '''
+                CREATE TRIGGER saldos_apos_inserir AFTER INSERT ON movimentacoes
+                BEGIN
+                    INSERT OR IGNORE INTO saldos (conta_id) VALUES (NEW.conta_id);
+                    UPDATE saldos
+                    SET entradas = entradas + MAX(NEW.valor_centavos, 0),
+                        saidas = saidas + MAX(-NEW.valor_centavos, 0),
+                        quantidade = quantidade + 1
+                    WHERE conta_id = NEW.conta_id;
+                END
+            ''',
+            "saldos_apos_excluir": '''
+                CREATE TRIGGER saldos_apos_excluir AFTER DELETE ON movimentacoes
+                BEGIN
+                    UPDATE saldos
+                    SET entradas = entradas - MAX(OLD.valor_centavos, 0),
+                        saidas = saidas - MAX(-OLD.valor_centavos, 0),
+                        quantidade = quantidade - 1
+                    WHERE conta_id = OLD.conta_id;
+                    DELETE FROM saldos WHERE conta_id = OLD.conta_id AND quantidade <= 0;
+                END
+            ''',
+            "saldos_apos_editar": '''
+                CREATE TRIGGER saldos_apos_editar AFTER UPDATE OF conta_id, valor_centavos ON movimentacoes
+                BEGIN
+                    UPDATE saldos
+                    SET entradas = entradas - MAX(OLD.valor_centavos, 0),
+                        saidas = saidas - MAX(-OLD.valor_centavos, 0),
+                        quantidade = quantidade - 1
+                    WHERE conta_id = OLD.conta_id;
+                    DELETE FROM saldos WHERE conta_id = OLD.conta_id AND quantidade <= 0;
+                    INSERT OR IGNORE INTO saldos (conta_id) VALUES (NEW.conta_id);
+                    UPDATE saldos
+                    SET entradas = entradas + MAX(NEW.valor_centavos, 0),
+                        saidas = saidas + MAX(-NEW.valor_centavos, 0),
+                        quantidade = quantidade + 1
+                    WHERE conta_id = NEW.conta_id;
+                END
+            ''',
+        }
+        for nome, definicao in gatilhos.items():
+            self.conn.execute(f'DROP TRIGGER IF EXISTS {nome}')
+            self.conn.execute(definicao)
+
+    def _criar_gatilhos_busca(self):
+        # Num índice de conteúdo externo a remoção precisa informar o texto antigo, por isso
+        # exclusões e edições usam o comando 'delete' do FTS5 com os valores de OLD
+        gatilhos = {
+            "busca_apos_inserir": '''
+                CREATE TRIGGER busca_apos_inserir AFTER INSERT ON movimentacoes
+                BEGIN
+                    INSERT INTO movimentacoes_busca (rowid, observacoes) VALUES (NEW.id, NEW.observacoes);
+                END
+            ''',
+            "busca_apos_excluir": '''
+                CREATE TRIGGER busca_apos_excluir AFTER DELETE ON movimentacoes
+                BEGIN
+                    INSERT INTO movimentacoes_busca (movimentacoes_busca, rowid, observacoes)
+                    VALUES ('delete', OLD.id, OLD.observacoes);
+                END
+            ''',
+            "busca_apos_editar": '''
+                CREATE TRIGGER busca_apos_editar AFTER UPDATE OF observacoes ON movimentacoes
+                BEGIN
+                    INSERT INTO movimentacoes_busca (movimentacoes_busca, rowid, observacoes)
+                    VALUES ('delete', OLD.id, OLD.observacoes);
+                    INSERT INTO movimentacoes_busca (rowid, observacoes) VALUES (NEW.id, NEW.observacoes);
+                END
+            ''',
+        }
+        for nome, definicao in gatilhos.items():
+            self.conn.execute(f'DROP TRIGGER IF EXISTS {nome}')
+            self.conn.execute(definicao)
+
+    def _criar_gatilhos_resumo(self):
+        gatilhos = {
+            "resumo_apos_inserir": '''
+                CREATE TRIGGER resumo_apos_inserir AFTER INSERT ON movimentacoes
+                BEGIN
+                    INSERT INTO resumo_mensal (conta_id, mes, tipo, total, quantidade)
+                    VALUES (NEW.conta_id, substr(NEW.data, 1, 7), NEW.tipo, NEW.valor_centavos, 1)
+                    ON CONFLICT (conta_id, mes, tipo) DO UPDATE
+                    SET total = total + excluded.total, quantidade = quantidade + 1;
+                END
+            ''',
+            "resumo_apos_excluir": '''
+                CREATE TRIGGER resumo_apos_excluir AFTER DELETE ON movimentacoes
+                BEGIN
+                    UPDATE resumo_mensal
+                    SET total = total - OLD.valor_centavos, quantidade = quantidade - 1
+                    WHERE conta_id = OLD.conta_id AND mes = substr(OLD.data, 1, 7) AND tipo = OLD.tipo;
+                    DELETE FROM resumo_mensal
+                    WHERE conta_id = OLD.conta_id AND mes = substr(OLD.data, 1, 7) AND tipo = OLD.tipo
+                      AND quantidade <= 0;
+                END
+            ''',
+            "resumo_apos_editar": '''
+                CREATE TRIGGER resumo_apos_editar AFTER UPDATE OF data, tipo, conta_id, valor_centavos ON movimentacoes
+                BEGIN
+                    UPDATE resumo_mensal
+                    SET total = total - OLD.valor_centavos, quantidade = quantidade - 1
+                    WHERE conta_id = OLD.conta_id AND mes = substr(OLD.data, 1, 7) AND tipo = OLD.tipo;
+                    DELETE FROM resumo_mensal
+                    WHERE conta_id = OLD.conta_id AND mes = substr(OLD.data, 1, 7) AND tipo = OLD.tipo
+                      AND quantidade <= 0;
+                    INSERT INTO resumo_mensal (conta_id, mes, tipo, total, quantidade)
+                    VALUES (NEW.conta_id, substr(NEW.data, 1, 7), NEW.tipo, NEW.valor_centavos, 1)
+                    ON CONFLICT (conta_id, mes, tipo) DO UPDATE
+                    SET total = total + excluded.total, quantidade = quantidade + 1;
+                END
+            ''',
+        }
+        for nome, definicao in gatilhos.items():
+            self.conn.execute(f'DROP TRIGGER IF EXISTS {nome}')
+            self.conn.execute(definicao)
+
+    def _criar_gatilhos_arquivo(self):
+        # Anos arquivados são somente leitura: nada pode ser lançado ou movido para eles
+        gatilhos = {
+            "arquivo_antes_inserir": '''
+                CREATE TRIGGER arquivo_antes_inserir BEFORE INSERT ON movimentacoes
+                WHEN NEW.data <= (SELECT MAX(ano) FROM arquivos) || '-12-31'
+                BEGIN
+                    SELECT RAISE(ABORT, 'a data pertence a um ano arquivado');
+                END
+            ''',
+            "arquivo_antes_editar": '''
+                CREATE TRIGGER arquivo_antes_editar BEFORE UPDATE OF data ON movimentacoes
+                WHEN NEW.data <= (SELECT MAX(ano) FROM arquivos) || '-12-31'
+                BEGIN
+                    SELECT RAISE(ABORT, 'a data pertence a um ano arquivado');
+                END
+            ''',
+        }
+        for nome, definicao in gatilhos.items():
+            self.conn.execute(f'DROP TRIGGER IF EXISTS {nome}')
+            self.conn.execute(definicao)
+
+    def _criar_gatilhos_alteracoes(self):
+        # Um UPDATE que só mexe em colunas derivadas (ocorrencia, recorrencia_id) não é registrado
+        gatilhos = {
+            "alteracoes_apos_inserir": f'''
+                CREATE TRIGGER alteracoes_apos_inserir AFTER INSERT ON movimentacoes
+                BEGIN
+                    INSERT INTO alteracoes (tabela, operacao, dados)
+                    VALUES ('movimentacoes', 'inserir', {_json_movimentacao("NEW")});
+                END
+            ''',
+            "alteracoes_apos_editar": f'''
+                CREATE TRIGGER alteracoes_apos_editar
+                AFTER UPDATE OF data, tipo, conta_id, valor_centavos, observacoes ON movimentacoes
+                BEGIN
+                    INSERT INTO alteracoes (tabela, operacao, dados)
+                    VALUES ('movimentacoes', 'editar', {_json_movimentacao("NEW")});
+                END
+            ''',
+            "alteracoes_apos_excluir": f'''
+                CREATE TRIGGER alteracoes_apos_excluir AFTER DELETE ON movimentacoes
+                BEGIN
+                    INSERT INTO alteracoes (tabela, operacao, dados)
+                    VALUES ('movimentacoes', 'excluir', {_json_movimentacao("OLD")});
+                END
+            ''',
+            "alteracoes_contas_apos_inserir": '''
+                CREATE TRIGGER alteracoes_contas_apos_inserir AFTER INSERT ON contas
+                BEGIN
+                    INSERT INTO alteracoes (tabela, operacao, dados)
+                    VALUES ('contas', 'inserir', json_object('id', NEW.id, 'nome', NEW.nome));
+                END
+            ''',
+            "alteracoes_contas_apos_editar": '''
+                CREATE TRIGGER alteracoes_contas_apos_editar AFTER UPDATE OF nome ON contas
+                BEGIN
+                    INSERT INTO alteracoes (tabela, operacao, dados)
+                    VALUES ('contas', 'editar', json_object('id', NEW.id, 'nome', NEW.nome, 'nome_anterior', OLD.nome));
+                END
+            ''',
+            "alteracoes_contas_apos_excluir": '''
+                CREATE TRIGGER alteracoes_contas_apos_excluir AFTER DELETE ON contas
+                BEGIN
+                    INSERT INTO alteracoes (tabela, operacao, dados)
+                    VALUES ('contas', 'excluir', json_object('id', OLD.id, 'nome', OLD.nome));
+                END
+            ''',
+        }
+        for nome, definicao in gatilhos.items():
+            self.conn.execute(f'DROP TRIGGER IF EXISTS {nome}')
+            self.conn.execute(definicao)
+
+    def _aplicar_delta_saldos(self, apos_id):
+        # Soma aos saldos as movimentações inseridas com id maior que apos_id, numa única passada
+        self.conn.execute('''
+            INSERT INTO saldos (conta_id, entradas, saidas, quantidade)
+            SELECT conta_id,
+                   SUM(MAX(valor_centavos, 0)),
+                   SUM(MAX(-valor_centavos, 0)),
+                   COUNT(*)
+            FROM movimentacoes
+            WHERE id > ?
+            GROUP BY conta_id
+            ON CONFLICT (conta_id) DO UPDATE
+            SET entradas = entradas + excluded.entradas,
+                saidas = saidas + excluded.saidas,
+                quantidade = quantidade + excluded.quantidade
+        ''', (apos_id,))
+
+    def _aplicar_delta_resumo(self, apos_id):
+        self.conn.execute('''
+            INSERT INTO resumo_mensal (conta_id, mes, tipo, total, quantidade)
+            SELECT conta_id, substr(data, 1, 7), tipo, SUM(valor_centavos), COUNT(*)
+            FROM movimentacoes
+            WHERE id > ?
+            GROUP BY 1, 2, 3
+            ON CONFLICT (conta_id, mes, tipo) DO UPDATE
+            SET total = total + excluded.total,
+                quantidade = quantidade + excluded.quantidade
+        ''', (apos_id,))
+
+    def reconstruir_resumo(self):
+        # Os meses de anos arquivados ficam congelados; só os demais são recalculados
+        with self.transaction():
+            self.conn.execute('DELETE FROM resumo_mensal WHERE mes > ?', (self._ultimo_mes_arquivado(),))
+            self.conn.execute('''
+                INSERT INTO resumo_mensal (conta_id, mes, tipo, total, quantidade)
+                SELECT conta_id, substr(data, 1, 7), tipo, SUM(valor_centavos), COUNT(*)
+                FROM movimentacoes
+                GROUP BY 1, 2, 3
+            ''')
+
+    def verificar_resumo(self):
+        # Compara resumo_mensal com uma agregação completa das movimentações e devolve as chaves
+        # (conta, mês, tipo) divergentes; lista vazia significa que os totais estão corretos.
+        # Meses de anos arquivados não são verificados.
+        calculado = '''SELECT conta_id, substr(data, 1, 7) AS mes, tipo, SUM(valor_centavos), COUNT(*)
+                       FROM movimentacoes GROUP BY 1, 2, 3'''
+        registrado = 'SELECT conta_id, mes, tipo, total, quantidade FROM resumo_mensal WHERE mes > ?'
+        return self.fetch_all(f'''
+            SELECT c.nome, d.mes, d.tipo
+            FROM (SELECT conta_id, mes, tipo FROM ({calculado} EXCEPT {registrado})
+                  UNION
+                  SELECT conta_id, mes, tipo FROM ({registrado} EXCEPT {calculado})) d
+            LEFT JOIN contas c ON c.id = d.conta_id
+            ORDER BY c.nome, d.mes, d.tipo
+        ''', (self._ultimo_mes_arquivado(),) * 2)
+
+    def reconstruir_saldos(self):
+        # Recalcula a tabela saldos a partir das movimentações, para corrigir qualquer divergência.
+        # Os anos arquivados entram pelo fechamento do último deles.
+        with self.transaction():
+            self.conn.execute('DELETE FROM saldos')
+            self.conn.execute('''
+                INSERT INTO saldos (conta_id, entradas, saidas, quantidade)
+                SELECT conta_id, SUM(entradas), SUM(saidas), SUM(quantidade)
+                FROM (
+                    SELECT conta_id, entradas, saidas, quantidade
+                    FROM fechamentos WHERE ano = (SELECT MAX(ano) FROM fechamentos)
+                    UNION ALL
+                    SELECT conta_id, MAX(valor_centavos, 0), MAX(-valor_centavos, 0), 1
+                    FROM movimentacoes
+                )
+                GROUP BY conta_id
+            ''')
+
+    def execute_query(self, query, params=()):
+        inicio = time.perf_counter()
+        try:
+            with self.transaction():
+                cursor = self.conn.execute(query, params)
+        except sqlite3.Error as e:
+            raise ErroBancoDados(str(e)) from e
+        if self.instrumentacao is not None:
+            self.instrumentacao.registrar(self.conn, query, params, time.perf_counter() - inicio, cursor.rowcount)
+        return cursor
+
+    def fetch_all(self, query, params=()):
+        if self.instrumentacao is None:
+            return self.conn.execute(query, params).fetchall()
+        inicio = time.perf_counter()
+        linhas = self.conn.execute(query, params).fetchall()
+        self.instrumentacao.registrar(self.conn, query, params, time.perf_counter() - inicio, len(linhas))
+        return linhas
+
+    def _fetch_all_em_cache(self, query, params=()):
+        # Leituras repetidas com o mesmo comando e parâmetros (que já saem normalizados de
+        # _montar_filtros) vêm do cache. A geração combina os commits desta conexão com o
+        # PRAGMA data_version, que muda quando outra conexão ou processo grava no banco.
+        # Dentro de uma transação aberta o cache é ignorado, pois ela pode ter escritas não confirmadas.
+        if self.cache is None or self.conn.in_transaction:
+            return self.fetch_all(query, params)
+        geracao = (self._geracao_escrita, self.conn.execute('PRAGMA data_version').fetchone()[0])
+        params = tuple(params)
+        return self.cache.obter((query, params), geracao, lambda: self.fetch_all(query, params))
+
+    def adicionar_movimentacao(self, **kwargs):
+        # Validar formato da data antes de inserir
+        kwargs['data'] = converter_data_para_banco(kwargs['data'])
+        kwargs['valor_centavos'] = converter_para_centavos(kwargs.pop('valor'), kwargs['tipo'])
+        with self.transaction():
+            kwargs['conta_id'] = self._obter_conta_id(kwargs.pop('conta'))
+            kwargs['impressao'] = calcular_impressao(kwargs['data'], kwargs['conta_id'], kwargs['valor_centavos'],
+                                                     kwargs['observacoes'])
+            query = '''INSERT INTO movimentacoes (data, tipo, conta_id, valor_centavos, observacoes, impressao, ocorrencia)
+                       VALUES (:data, :tipo, :conta_id, :valor_centavos, :observacoes, :impressao,
+                               (SELECT COALESCE(MAX(ocorrencia), 0) + 1 FROM movimentacoes WHERE impressao = :impressao))'''
+            return self.execute_query(query, kwargs).lastrowid
+
+    def _obter_conta_id(self, nome):
+        # Contas informadas numa movimentação e ainda não cadastradas são criadas automaticamente
+        self.conn.execute('INSERT OR IGNORE INTO contas (nome) VALUES (?)', (nome,))
+        return self.fetch_all('SELECT id FROM contas WHERE nome = ?', (nome,))[0][0]
+
+    def importar_arquivo(self, caminho, conta=None, tamanho_lote=TAMANHO_LOTE_IMPORTACAO, ignorar_duplicadas=True):
+        return self.importar_movimentacoes(ler_arquivo(caminho, conta), tamanho_lote, ignorar_duplicadas)
+
+    def importar_movimentacoes(self, linhas, tamanho_lote=TAMANHO_LOTE_IMPORTACAO, ignorar_duplicadas=True):
+        # Insere em lotes com executemany dentro de uma única transação: um único commit
+        # para o arquivo inteiro. Linhas inválidas são contadas e puladas, sem abortar a importação.
+        # A n-ésima linha do arquivo com uma impressão é duplicata se o banco já tinha n movimentações
+        # com ela: reimportar um extrato que se sobrepõe ao anterior só traz as linhas novas, mas
+        # lançamentos idênticos legítimos (dois cafés iguais no mesmo dia) continuam entrando.
+        # Com ignorar_duplicadas=False elas são importadas e apenas contadas.
+        resultado = ResultadoImportacao()
+        query = '''INSERT INTO movimentacoes (data, tipo, conta_id, valor_centavos, observacoes, impressao, ocorrencia)
+                   VALUES (?1, ?2, ?3, ?4, ?5, ?6,
+                           (SELECT COALESCE(MAX(ocorrencia), 0) + 1 FROM movimentacoes WHERE impressao = ?6))'''
+        contas = {}
+        # Movimentações anteriores à importação ainda não correspondidas, por impressão
+        vistas = {}
+        lote = []
+        fim_arquivado = self._fim_arquivado() or ""
+
+        def gravar(lote):
+            # As impressões do lote são consultadas de uma vez, em blocos, pelo índice único
+            novas = list({linha[5] for _, linha in lote if linha[5] not in vistas})
+            for inicio in range(0, len(novas), MAX_PARAMETROS_CONSULTA):
+                bloco = novas[inicio:inicio + MAX_PARAMETROS_CONSULTA]
+                vistas.update(self.conn.execute(f'''
+                    SELECT impressao, COUNT(*) FROM movimentacoes
+                    WHERE impressao IN ({', '.join('?' * len(bloco))}) AND id <= ?
+                    GROUP BY impressao
+                ''', bloco + [maior_id]))
+            novas_linhas = []
+            for numero, linha in lote:
+                existentes = vistas.get(linha[5])
+                if existentes:
+                    vistas[linha[5]] = existentes - 1
+                    resultado.marcar_duplicada(numero)
+                    if ignorar_duplicadas:
+                        continue
+                novas_linhas.append(linha)
+            self.conn.executemany(query, novas_linhas)
+            resultado.importadas += len(novas_linhas)
+
+        with self.transaction():
+            maior_id = self.fetch_all('SELECT COALESCE(MAX(id), 0) FROM movimentacoes')[0][0]
+            # Os gatilhos por linha saem durante a carga e voltam antes do commit; como DDL é
+            # transacional no SQLite, outras conexões nunca os veem ausentes
+            for gatilho in GATILHOS_INSERCAO:
+                self.conn.execute(f'DROP TRIGGER IF EXISTS {gatilho}')
+            for numero, campos in linhas:
+                try:
+                    valor = converter_valor(campos["valor"])
+                    validar_campos(tipo=campos["tipo"], conta=campos["conta"], valor=valor)
+                    conta_id = contas.get(campos["conta"])
+                    if conta_id is None:
+                        conta_id = contas[campos["conta"]] = self._obter_conta_id(campos["conta"])
+                    data = converter_data_para_banco(campos["data"])
+                    if data <= fim_arquivado:
+                        raise ValueError(f"o ano {data[:4]} está arquivado")
+                    centavos = converter_para_centavos(valor, campos["tipo"])
+                except (ValueError, KeyError) as e:
+                    resultado.rejeitar(numero, str(e))
+                    continue
+                lote.append((numero, (data, campos["tipo"], conta_id, centavos, campos["observacoes"],
+                                      calcular_impressao(data, conta_id, centavos, campos["observacoes"]))))
+                if len(lote) >= tamanho_lote:
+                    gravar(lote)
+                    lote = []
+            if lote:
+                gravar(lote)
+            self._criar_gatilhos()
+            self._aplicar_delta_saldos(maior_id)
+            self._aplicar_delta_resumo(maior_id)
+            self.conn.execute('''
+                INSERT INTO movimentacoes_busca (rowid, observacoes)
+                SELECT id, observacoes FROM movimentacoes WHERE id > ?
+            ''', (maior_id,))
+            self.conn.execute(f'''
+                INSERT INTO alteracoes (tabela, operacao, dados)
+                SELECT 'movimentacoes', 'inserir', {_json_movimentacao("m")} FROM movimentacoes m WHERE m.id > ? ORDER BY m.id
+            ''', (maior_id,))
+        return resultado
+
+    def buscar_duplicatas(self):
+        # Movimentações cujo conteúdo se repete (mesma impressão), agrupadas e na ordem de ocorrência
+        return self.fetch_all(SELECT_MOVIMENTACOES.format(fonte="movimentacoes") + '''
+            WHERE m.impressao IN (SELECT impressao FROM movimentacoes GROUP BY impressao HAVING COUNT(*) > 1)
+            ORDER BY m.impressao, m.ocorrencia
+        ''')
+
+    def conciliar_arquivo(self, caminho, conta=None, dias=TOLERANCIA_DIAS, centavos=TOLERANCIA_CENTAVOS):
+        return self.conciliar(ler_arquivo(caminho, conta), dias, centavos)
+
+    def conciliar(self, linhas, dias=TOLERANCIA_DIAS, centavos=TOLERANCIA_CENTAVOS):
+        # Casa as linhas de um extrato com movimentações da mesma conta cuja data e valor estejam
+        # dentro das tolerâncias, sem gravar nada. Os candidatos de cada linha vêm de uma busca por
+        # faixa de datas no índice (conta_id, data), que numa conta cobre poucas linhas. Os pares são casados do mais próximo ao
+        # mais distante: mesmo conteúdo (mesma impressão) primeiro, depois a menor diferença de datas
+        # e a de valor. Cada linha e cada movimentação entram em no máximo um par.
+        resultado = ResultadoConciliacao()
+        contas = {nome: conta_id for conta_id, nome in self.fetch_all('SELECT id, nome FROM contas')}
+        extrato = []
+        pares = []
+        for numero, campos in linhas:
+            try:
+                valor = converter_valor(campos["valor"])
+                validar_campos(tipo=campos["tipo"], conta=campos["conta"], valor=valor)
+                data = converter_data_para_banco(campos["data"])
+                valor_centavos = converter_para_centavos(valor, campos["tipo"])
+            except (ValueError, KeyError) as e:
+                resultado.rejeitar(numero, str(e))
+                continue
+            conta_id = contas.get(campos["conta"])
+            posicao = len(extrato)
+            extrato.append((numero, campos, conta_id, data))
+            if conta_id is None:
+                continue
+            dia = date.fromisoformat(data)
+            impressao = calcular_impressao(data, conta_id, valor_centavos, campos["observacoes"])
+            for mov_id, data_mov, valor_mov, impressao_mov in self.fetch_all('''
+                SELECT id, data, valor_centavos, impressao FROM movimentacoes
+                WHERE conta_id = ? AND valor_centavos BETWEEN ? AND ? AND data BETWEEN ? AND ?
+            ''', (conta_id, valor_centavos - centavos, valor_centavos + centavos,
+                  (dia - timedelta(days=dias)).isoformat(), (dia + timedelta(days=dias)).isoformat())):
+                dif_dias = (date.fromisoformat(data_mov) - dia).days
+                dif_centavos = valor_mov - valor_centavos
+                pares.append((impressao_mov != impressao, abs(dif_dias), abs(dif_centavos), posicao, mov_id,
+                              dif_dias, dif_centavos))
+        pares.sort()
+        casadas = {}
+        usadas = set()
+        for _, _, _, posicao, mov_id, dif_dias, dif_centavos in pares:
+            if posicao not in casadas and mov_id not in usadas:
+                casadas[posicao] = (*extrato[posicao][:2], mov_id, dif_dias, dif_centavos)
+                usadas.add(mov_id)
+        for posicao, (numero, campos, _, _) in enumerate(extrato):
+            if posicao in casadas:
+                resultado.conciliadas.append(casadas[posicao])
+            else:
+                resultado.pendentes.append((numero, campos))
+        ids_contas = sorted({conta_id for _, _, conta_id, _ in extrato if conta_id is not None})
+        if ids_contas:
+            datas = [data for _, _, _, data in extrato]
+            resultado.sem_extrato = [
+                row for row in self.fetch_all(
+                    SELECT_MOVIMENTACOES.format(fonte="movimentacoes")
+                    + f" WHERE m.conta_id IN ({', '.join('?' * len(ids_contas))}) AND m.data BETWEEN ? AND ?"
+                    + " ORDER BY m.data, m.id",
+                    ids_contas + [min(datas), max(datas)])
+                if row[0] not in usadas
+            ]
+        return resultado
+
+    def editar_movimentacao(self, id, **kwargs):
+        kwargs['data'] = converter_data_para_banco(kwargs['data'])
+        kwargs['valor_centavos'] = converter_para_centavos(kwargs.pop('valor'), kwargs['tipo'])
+        with self.transaction():
+            kwargs['conta_id'] = self._obter_conta_id(kwargs.pop('conta'))
+            kwargs['impressao'] = calcular_impressao(kwargs['data'], kwargs['conta_id'], kwargs['valor_centavos'],
+                                                     kwargs['observacoes'])
+            # A ocorrência só muda se o conteúdo mudou; aí a movimentação vai para o fim da fila da nova impressão
+            query = '''UPDATE movimentacoes
+                       SET data=:data, tipo=:tipo, conta_id=:conta_id, valor_centavos=:valor_centavos, observacoes=:observacoes,
+                           ocorrencia = CASE WHEN impressao IS :impressao THEN ocorrencia ELSE
+                               (SELECT COALESCE(MAX(ocorrencia), 0) + 1 FROM movimentacoes WHERE impressao = :impressao) END,
+                           impressao=:impressao
+                       WHERE id=:id'''
+            return self.execute_query(query, {**kwargs, "id": id}).rowcount
+
+    def excluir_movimentacao(self, id):
+        # Devolve a quantidade de linhas removidas (0 se o id não existe)
+        query = 'DELETE FROM movimentacoes WHERE id=?'
+        return self.execute_query(query, (id,)).rowcount
+
+    def buscar_movimentacoes(self, filtro=None):
+        if filtro:
+            return self.filtrar_movimentacoes({"conta": filtro})
+        return self.filtrar_movimentacoes()
+
+    def _montar_filtros(self, filtros):
+        # Devolve as condições, os parâmetros e a fonte das linhas: sem período só o banco
+        # principal é consultado; um período que alcança anos arquivados inclui os arquivos deles
+        conditions = []
+        params = []
+        esquemas = self._esquemas_dos_filtros(filtros)
+        if filtros:
+            if "data_inicio" in filtros and "data_fim" in filtros:
+                conditions.append("m.data BETWEEN ? AND ?")
+                params.extend([converter_data_para_banco(filtros["data_inicio"]),
+                               converter_data_para_banco(filtros["data_fim"])])
+            if "tipo" in filtros:
+                conditions.append("m.tipo = ?")
+                params.append(filtros["tipo"])
+            if "conta" in filtros:
+                # A conta é resolvida para o id uma única vez e a busca usa o índice (conta_id, data)
+                conditions.append("m.conta_id = (SELECT id FROM contas WHERE nome = ?)")
+                params.append(filtros["conta"])
+            consulta = converter_busca(filtros.get("busca", ""))
+            if consulta:
+                conditions.append(f"m.id IN (SELECT id FROM {_fonte_busca(esquemas)})")
+                params.extend([consulta] * len(esquemas))
+        return conditions, params, _fonte_movimentacoes(esquemas)
+
+    def _esquemas_dos_filtros(self, filtros):
+        if filtros and "data_inicio" in filtros and "data_fim" in filtros:
+            return self._esquemas(converter_data_para_banco(filtros["data_inicio"]),
+                                  converter_data_para_banco(filtros["data_fim"]))
+        return ["main"]
+
+    def _arquivos(self):
+        return self._fetch_all_em_cache('SELECT ano, caminho FROM arquivos ORDER BY ano')
+
+    def _fim_arquivado(self):
+        arquivos = self._arquivos()
+        return f"{arquivos[-1][0]:04d}-12-31" if arquivos else None
+
+    def _ultimo_mes_arquivado(self):
+        return (self._fim_arquivado() or "")[:7]
+
+    def _esquemas(self, inicio, fim):
+        # "main" mais os arquivos dos anos arquivados dentro de [inicio, fim] (datas ISO). Os arquivos
+        # são anexados (ATTACH) só quando uma consulta precisa deles e ficam anexados para as
+        # próximas; passando de MAX_ARQUIVOS_ANEXADOS, os usados há mais tempo são desanexados.
+        necessarios = [(ano, caminho) for ano, caminho in self._arquivos() if inicio[:4] <= f"{ano:04d}" <= fim[:4]]
+        if len(necessarios) > MAX_ARQUIVOS_ANEXADOS:
+            raise ErroBancoDados(f"O período abrange mais de {MAX_ARQUIVOS_ANEXADOS} anos arquivados; "
+                                 "consulte um intervalo menor.")
+        nomes = [f"arquivo_{ano}" for ano, _ in necessarios]
+        for (ano, caminho), nome in zip(necessarios, nomes):
+            if nome in self._anexados:
+                self._anexados.move_to_end(nome)
+                continue
+            while len(self._anexados) >= MAX_ARQUIVOS_ANEXADOS:
+                antigo = next(anexado for anexado in self._anexados if anexado not in nomes)
+                self.conn.execute(f'DETACH DATABASE {antigo}')
+                del self._anexados[antigo]
+            arquivo = os.path.join(self._pasta, caminho)
+            if not os.path.exists(arquivo):
+                raise ErroBancoDados(f"Arquivo do ano {ano} não encontrado: {arquivo}")
+            try:
+                self.conn.execute(f'ATTACH DATABASE ? AS {nome}', (arquivo,))
+            except sqlite3.Error as e:
+                raise ErroBancoDados(str(e)) from e
+            self._anexados[nome] = arquivo
+        return ["main"] + nomes
+
+    @staticmethod
+    def _clausula_where(conditions):
+        return " WHERE " + " AND ".join(conditions) if conditions else ""
+
+    def filtrar_movimentacoes(self, filtros=None):
+        conditions, params, fonte = self._montar_filtros(filtros)
+        return self._fetch_all_em_cache(SELECT_MOVIMENTACOES.format(fonte=fonte) + self._clausula_where(conditions), params)
+
+    def iterar_movimentacoes(self, filtros=None, tamanho_bloco=TAMANHO_BLOCO_EXPORTACAO):
+        # Percorre o resultado em blocos, sem materializar a lista inteira
+        conditions, params, fonte = self._montar_filtros(filtros)
+        cursor = self.conn.execute(SELECT_MOVIMENTACOES.format(fonte=fonte) + self._clausula_where(conditions)
+                                   + ' ORDER BY m.id', params)
+        try:
+            while True:
+                bloco = cursor.fetchmany(tamanho_bloco)
+                if not bloco:
+                    break
+                yield from bloco
+        finally:
+            cursor.close()
+
+    def totalizar_movimentacoes(self, filtros=None):
+        # Quantidade, entradas e saídas (em centavos) das movimentações que atendem aos filtros.
+        # Sem busca textual o total sai de resumo_mensal (ver totalizar_periodo).
+        filtros = filtros or {}
+        if not converter_busca(filtros.get("busca", "")):
+            # Sem período, como nas listagens, os anos arquivados ficam de fora
+            inicio, fim = _dia_seguinte(self._fim_arquivado()), "9999-12-31"
+            if "data_inicio" in filtros and "data_fim" in filtros:
+                inicio = converter_data_para_banco(filtros["data_inicio"])
+                fim = converter_data_para_banco(filtros["data_fim"])
+            return self.totalizar_periodo(inicio, fim, tipo=filtros.get("tipo"), conta=filtros.get("conta"))
+        conditions, params, fonte = self._montar_filtros(filtros)
+        return self._fetch_all_em_cache(f'''
+            SELECT COUNT(*),
+                   COALESCE(SUM(MAX(m.valor_centavos, 0)), 0),
+                   COALESCE(SUM(MAX(-m.valor_centavos, 0)), 0)
+            FROM {fonte} m''' + self._clausula_where(conditions), params)[0]
+
+    def totalizar_periodo(self, inicio, fim, tipo=None, conta=None):
+        # Meses inteiros dentro de [inicio, fim] (datas ISO) vêm de resumo_mensal; só os dias das
+        # pontas que não cobrem um mês inteiro são somados a partir de movimentacoes, pelo índice de data.
+        # O custo depende do número de meses e contas, não do número de movimentações.
+        mes_inicio = inicio[:7] if inicio[8:] == "01" else _mes_seguinte(inicio[:7])
+        ultimo_dia = calendar.monthrange(int(fim[:4]), int(fim[5:7]))[1]
+        mes_fim = fim[:7] if int(fim[8:]) == ultimo_dia else _mes_anterior(fim[:7])
+        filtros = []
+        params = []
+        if tipo:
+            filtros.append("tipo = ?")
+            params.append(tipo)
+        if conta:
+            filtros.append("conta_id = (SELECT id FROM contas WHERE nome = ?)")
+            params.append(conta)
+        and_filtros = "".join(" AND " + filtro for filtro in filtros)
+        consulta_movimentacoes = '''
+            SELECT COUNT(*), COALESCE(SUM(MAX(valor_centavos, 0)), 0), COALESCE(SUM(MAX(-valor_centavos, 0)), 0)
+            FROM {fonte} WHERE data BETWEEN ? AND ?''' + and_filtros
+
+        def somar(de, ate):
+            fonte = _fonte_movimentacoes(self._esquemas(de, ate))
+            return self._fetch_all_em_cache(consulta_movimentacoes.format(fonte=fonte), [de, ate] + params)[0]
+
+        if mes_inicio > mes_fim:
+            return somar(inicio, fim)
+        quantidade, entradas, saidas = self._fetch_all_em_cache('''
+            SELECT COALESCE(SUM(quantidade), 0), COALESCE(SUM(MAX(total, 0)), 0), COALESCE(SUM(MAX(-total, 0)), 0)
+            FROM resumo_mensal WHERE mes BETWEEN ? AND ?''' + and_filtros, [mes_inicio, mes_fim] + params)[0]
+        pontas = []
+        if inicio < mes_inicio + "-01":
+            pontas.append((inicio, _mes_anterior(mes_inicio) + "-31"))
+        if fim > mes_fim + "-31":
+            pontas.append((_mes_seguinte(mes_fim) + "-01", fim))
+        for de, ate in pontas:
+            q, e, s = somar(de, ate)
+            quantidade, entradas, saidas = quantidade + q, entradas + e, saidas + s
+        return quantidade, entradas, saidas
+
+    def fluxo_de_caixa(self, agrupamento="mes", conta=None, inicio=None, fim=None):
+        # Entradas, saídas, resultado e saldo acumulado por mês ("AAAA-MM") ou ano ("AAAA"), lidos
+        # de resumo_mensal. O saldo acumulado considera também os períodos anteriores a inicio.
+        tamanho = 4 if agrupamento == "ano" else 7
+        where = ""
+        params = [tamanho, tamanho]
+        if conta:
+            where = " WHERE conta_id = (SELECT id FROM contas WHERE nome = ?)"
+            params.append(conta)
+        params.extend([inicio or "0000", fim or "9999-99"])
+        return self._fetch_all_em_cache('''
+            SELECT periodo, entradas, saidas, entradas - saidas, saldo_acumulado
+            FROM (
+                SELECT substr(mes, 1, ?) AS periodo,
+                       SUM(CASE WHEN tipo = 'Entrada' THEN total ELSE 0 END) AS entradas,
+                       -SUM(CASE WHEN tipo = 'Saída' THEN total ELSE 0 END) AS saidas,
+                       SUM(SUM(total)) OVER (ORDER BY substr(mes, 1, ?)) AS saldo_acumulado
+                FROM resumo_mensal''' + where + '''
+                GROUP BY periodo
+            )
+            WHERE periodo BETWEEN ? AND ?
+            ORDER BY periodo
+        ''', params)
+
+    def buscar_pagina_movimentacoes(self, filtros=None, apos_id=None, antes_id=None, limite=TAMANHO_PAGINA,
+                                    saldo_acumulado=False):
+        # Paginação por chave: segue o índice do id a partir da última linha vista, sem OFFSET.
+        # Com saldo_acumulado cada linha ganha uma sétima coluna com o saldo da conta após ela.
+        consulta = converter_busca(filtros.get("busca", "")) if filtros else ""
+        if consulta:
+            return self._buscar_pagina_por_relevancia(filtros, consulta, apos_id, antes_id, limite, saldo_acumulado)
+        conditions, params, fonte = self._montar_filtros(filtros)
+        if antes_id is not None:
+            conditions.append("m.id < ?")
+            params.append(antes_id)
+            query = SELECT_MOVIMENTACOES.format(fonte=fonte) + self._clausula_where(conditions) + ' ORDER BY m.id DESC LIMIT ?'
+            return self._fetch_all_em_cache(_com_saldo_acumulado(query, saldo_acumulado, fonte), params + [limite])[::-1]
+        if apos_id is not None:
+            conditions.append("m.id > ?")
+            params.append(apos_id)
+        query = SELECT_MOVIMENTACOES.format(fonte=fonte) + self._clausula_where(conditions) + ' ORDER BY m.id LIMIT ?'
+        return self._fetch_all_em_cache(_com_saldo_acumulado(query, saldo_acumulado, fonte), params + [limite])
+
+    def extrato_conta(self, conta, data_inicio=None, data_fim=None, apos_id=None, antes_id=None,
+                      limite=TAMANHO_PAGINA):
+        # Extrato de uma conta em ordem de data: id, data, tipo, valor_centavos, observacoes e saldo
+        # após cada linha. A janela do SUM() OVER cobre só a página; o saldo anterior à primeira
+        # linha sai de SALDO_ANTERIOR. A paginação usa o par (data, id) da linha de referência.
+        inicio = converter_data_para_banco(data_inicio) if data_inicio else "0001-01-01"
+        fim = converter_data_para_banco(data_fim) if data_fim else "9999-12-31"
+        # Sem período, como nas listagens, só o banco principal é consultado
+        fonte = _fonte_movimentacoes(self._esquemas(inicio, fim) if data_inicio and data_fim else ["main"])
+        params = [conta, inicio, fim]
+        chave = ""
+        ordem = "ASC"
+        if antes_id is not None or apos_id is not None:
+            chave = " AND (m.data, m.id) {} (SELECT data, id FROM {} WHERE id = ?)".format(
+                "<" if antes_id is not None else ">", fonte)
+            params.append(antes_id if antes_id is not None else apos_id)
+            ordem = "DESC" if antes_id is not None else "ASC"
+        return self._fetch_all_em_cache('''
+            WITH pagina AS (
+                SELECT m.id, m.data, m.tipo, m.valor_centavos, m.observacoes, m.conta_id
+                FROM ''' + fonte + ''' m
+                WHERE m.conta_id = (SELECT id FROM contas WHERE nome = ?) AND m.data BETWEEN ? AND ?''' + chave + f'''
+                ORDER BY m.data {ordem}, m.id {ordem}
+                LIMIT ?
+            ),
+            primeira AS (SELECT conta_id, data, id FROM pagina ORDER BY data, id LIMIT 1)
+            SELECT id, data, tipo, valor_centavos, observacoes,
+                   SUM(valor_centavos) OVER (ORDER BY data, id)
+                   + (SELECT ''' + SALDO_ANTERIOR.format(
+                       fonte=fonte, conta="primeira.conta_id", data="primeira.data", id="primeira.id")
+                   + ''' FROM primeira)
+            FROM pagina
+            ORDER BY data, id
+        ''', params + [limite])
+
+    def _buscar_pagina_por_relevancia(self, filtros, consulta, apos_id, antes_id, limite, saldo_acumulado=False):
+        # Com busca textual as linhas vêm da mais para a menos relevante (bm25). A chave de paginação
+        # passa a ser o par (rank, id), com o rank da linha de referência recalculado pelo FTS5.
+        # Com anos arquivados o rank vem do índice de cada arquivo
+        conditions, params, fonte = self._montar_filtros({k: v for k, v in filtros.items() if k != "busca"})
+        esquemas = self._esquemas_dos_filtros(filtros)
+        busca = _fonte_busca(esquemas)
+        params = [consulta] * len(esquemas) + params
+        referencia = antes_id if antes_id is not None else apos_id
+        if referencia is not None:
+            conditions.append(f"(b.rank, m.id) {'<' if antes_id is not None else '>'} "
+                              f"(SELECT rank, id FROM {busca} WHERE id = ?)")
+            params.extend([consulta] * len(esquemas) + [referencia])
+        ordem = "DESC" if antes_id is not None else "ASC"
+        query = (SELECT_MOVIMENTACOES.format(fonte=fonte) + f' JOIN {busca} b ON b.id = m.id'
+                 + self._clausula_where(conditions) + f' ORDER BY b.rank {ordem}, m.id {ordem} LIMIT ?')
+        linhas = self._fetch_all_em_cache(_com_saldo_acumulado(query, saldo_acumulado, fonte), params + [limite])
+        return linhas[::-1] if antes_id is not None else linhas
+
+    def adicionar_recorrencia(self, tipo, conta, valor, frequencia, data_inicio, intervalo=1,
+                              data_fim=None, observacoes=""):
+        valor = converter_valor(str(valor))
+        validar_campos(tipo=tipo, conta=conta, valor=valor)
+        if frequencia not in FREQUENCIAS:
+            raise ValueError(f"Frequência inválida: {frequencia!r}. Use {', '.join(FREQUENCIAS)}.")
+        if int(intervalo) < 1:
+            raise ValueError("O intervalo deve ser de pelo menos 1.")
+        data_inicio = converter_data_para_banco(data_inicio)
+        data_fim = converter_data_para_banco(data_fim) if data_fim else None
+        if data_fim and data_fim < data_inicio:
+            raise ValueError("A data final não pode ser anterior à inicial.")
+        with self.transaction():
+            conta_id = self._obter_conta_id(conta)
+            return self.execute_query('''
+                INSERT INTO recorrencias (tipo, conta_id, valor_centavos, observacoes, frequencia, intervalo,
+                                          data_inicio, data_fim)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (tipo, conta_id, converter_para_centavos(valor, tipo), observacoes, frequencia, int(intervalo),
+                  data_inicio, data_fim)).lastrowid
+
+    def buscar_recorrencias(self):
+        # id, tipo, conta, valor_centavos, observacoes, frequencia, intervalo, início, fim, materializada até
+        return self.fetch_all('''
+            SELECT r.id, r.tipo, c.nome, r.valor_centavos, r.observacoes, r.frequencia, r.intervalo,
+                   r.data_inicio, r.data_fim, r.materializada_ate
+            FROM recorrencias r JOIN contas c ON c.id = r.conta_id
+            ORDER BY r.id
+        ''')
+
+    def excluir_recorrencia(self, id):
+        # Os lançamentos já gerados continuam existindo, só perdem o vínculo com a regra
+        return self.execute_query('DELETE FROM recorrencias WHERE id = ?', (id,)).rowcount
+
+    def materializar_recorrencias(self, ate=None):
+        # Lança todas as ocorrências vencidas até a data (hoje, por padrão) numa única transação.
+        # Cada regra só gera datas posteriores a materializada_ate e o índice único em
+        # (recorrencia_id, data) descarta o que já existir, então a operação pode ser repetida.
+        # Devolve a quantidade de movimentações criadas.
+        ate = converter_data_para_banco(ate) if ate else date.today().isoformat()
+        fim_arquivado = self._fim_arquivado() or ""
+        with self.transaction():
+            linhas = []
+            regras = self.fetch_all('''
+                SELECT id, tipo, conta_id, valor_centavos, observacoes, frequencia, intervalo,
+                       data_inicio, MIN(COALESCE(data_fim, ?), ?), materializada_ate
+                FROM recorrencias
+                WHERE data_inicio <= ? AND (materializada_ate IS NULL OR materializada_ate < MIN(COALESCE(data_fim, ?), ?))
+            ''', (ate, ate, ate, ate, ate))
+            for (regra_id, tipo, conta_id, centavos, observacoes, frequencia, intervalo,
+                 inicio, limite, materializada_ate) in regras:
+                # Ocorrências em anos já arquivados não são lançadas
+                apos = max(materializada_ate or "", fim_arquivado) or None
+                for data in gerar_ocorrencias(frequencia, intervalo, inicio, limite, apos=apos):
+                    linhas.append((data, tipo, conta_id, centavos, observacoes, regra_id,
+                                   calcular_impressao(data, conta_id, centavos, observacoes)))
+                self.conn.execute('UPDATE recorrencias SET materializada_ate = ? WHERE id = ?', (limite, regra_id))
+            cursor = self.conn.executemany('''
+                INSERT OR IGNORE INTO movimentacoes (data, tipo, conta_id, valor_centavos, observacoes, recorrencia_id,
+                                                     impressao, ocorrencia)
+                VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7,
+                        (SELECT COALESCE(MAX(ocorrencia), 0) + 1 FROM movimentacoes WHERE impressao = ?7))
+            ''', linhas)
+            return cursor.rowcount if linhas else 0
+
+    def projetar_saldos(self, meses=12, conta=None, hoje=None):
+        # Saldo projetado ao fim de cada um dos próximos meses (incluindo o atual): o saldo de hoje
+        # mais as ocorrências das regras ainda não materializadas. Nada é gravado no banco.
+        hoje = converter_data_para_banco(hoje) if hoje else date.today().isoformat()
+        primeiro_mes = hoje[:7]
+        ultimo_mes = primeiro_mes
+        for _ in range(meses - 1):
+            ultimo_mes = _mes_seguinte(ultimo_mes)
+        fim = f"{ultimo_mes}-{calendar.monthrange(int(ultimo_mes[:4]), int(ultimo_mes[5:7]))[1]:02d}"
+        if conta:
+            saldo = dict(self.buscar_saldos()).get(conta, 0)
+            regras = [regra for regra in self.buscar_recorrencias() if regra[2] == conta]
+        else:
+            saldo = self.calcular_saldo()
+            regras = self.buscar_recorrencias()
+        por_mes = {}
+        for _, _, _, centavos, _, frequencia, intervalo, inicio, data_fim, materializada_ate in regras:
+            for data in gerar_ocorrencias(frequencia, intervalo, inicio, min(data_fim or fim, fim), apos=materializada_ate):
+                entradas, saidas = por_mes.get(data[:7], (0, 0))
+                por_mes[data[:7]] = (entradas + max(centavos, 0), saidas + max(-centavos, 0))
+        # Ocorrências vencidas e ainda não lançadas entram no primeiro mês da projeção
+        atrasadas = [mes for mes in por_mes if mes < primeiro_mes]
+        for mes in atrasadas:
+            entradas, saidas = por_mes.pop(mes)
+            atuais = por_mes.get(primeiro_mes, (0, 0))
+            por_mes[primeiro_mes] = (atuais[0] + entradas, atuais[1] + saidas)
+        projecao = []
+        mes = primeiro_mes
+        for _ in range(meses):
+            entradas, saidas = por_mes.get(mes, (0, 0))
+            saldo += entradas - saidas
+            projecao.append((mes, entradas, saidas, saldo))
+            mes = _mes_seguinte(mes)
+        return projecao
+
+    def arquivar_ano(self, ano, compactar=False):
+        # Move as movimentações de um ano encerrado para um arquivo SQLite próprio, ao lado do banco
+        # (financeiro-2019.db), e grava o fechamento acumulado de cada conta ao fim do ano. Saldos e
+        # resumos mensais continuam contando essas linhas; listagens com um período que alcance o
+        # ano passam a ler o arquivo (ver _esquemas). Os anos são arquivados do mais antigo em diante.
+        # Devolve a quantidade de movimentações arquivadas.
+        ano = int(ano)
+        if ano >= date.today().year:
+            raise ValueError("Só anos encerrados podem ser arquivados.")
+        primeira = self.fetch_all('SELECT MIN(data) FROM movimentacoes')[0][0]
+        if primeira is None or int(primeira[:4]) > ano:
+            raise ValueError(f"Não há movimentações de {ano} para arquivar.")
+        if int(primeira[:4]) < ano:
+            raise ValueError(f"Arquive antes os anos anteriores, a partir de {primeira[:4]}.")
+        inicio, fim = f"{ano:04d}-01-01", f"{ano:04d}-12-31"
+        caminho = f"{os.path.splitext(os.path.basename(self.db_name))[0]}-{ano}.db"
+        arquivo = os.path.join(self._pasta, caminho)
+        # Sobra de uma tentativa interrompida: o ano ainda não consta em arquivos
+        for sobra in (arquivo, arquivo + "-journal"):
+            if os.path.exists(sobra):
+                os.remove(sobra)
+        self.conn.execute('ATTACH DATABASE ? AS arquivo_novo', (arquivo,))
+        try:
+            # Primeiro o arquivo é gravado e confirmado; só então as linhas saem do banco principal.
+            # Uma interrupção entre os dois passos deixa as linhas no banco e o arquivo é refeito.
+            with self.transaction():
+                self._criar_arquivo("arquivo_novo")
+                quantidade = self.conn.execute(f'''
+                    INSERT INTO arquivo_novo.movimentacoes ({COLUNAS_MOVIMENTACOES}, recorrencia_id)
+                    SELECT {COLUNAS_MOVIMENTACOES}, recorrencia_id FROM main.movimentacoes
+                    WHERE data BETWEEN ? AND ?
+                ''', (inicio, fim)).rowcount
+                self.conn.execute('INSERT INTO arquivo_novo.contas SELECT id, nome FROM main.contas')
+                self.conn.execute("INSERT INTO arquivo_novo.movimentacoes_busca (movimentacoes_busca) VALUES ('rebuild')")
+            with self.transaction():
+                self.conn.execute('INSERT INTO arquivos (ano, caminho, quantidade, arquivado_em) VALUES (?, ?, ?, ?)',
+                                  (ano, caminho, quantidade, datetime.now().isoformat(timespec="seconds")))
+                self.conn.execute('''
+                    INSERT INTO fechamentos (ano, conta_id, entradas, saidas, quantidade)
+                    SELECT ?, conta_id, SUM(entradas), SUM(saidas), SUM(quantidade)
+                    FROM (
+                        SELECT conta_id, entradas, saidas, quantidade
+                        FROM fechamentos WHERE ano = (SELECT MAX(ano) FROM fechamentos)
+                        UNION ALL
+                        SELECT conta_id, MAX(valor_centavos, 0), MAX(-valor_centavos, 0), 1
+                        FROM arquivo_novo.movimentacoes
+                    )
+                    GROUP BY conta_id
+                ''', (ano,))
+                for gatilho in GATILHOS_EXCLUSAO:
+                    self.conn.execute(f'DROP TRIGGER IF EXISTS {gatilho}')
+                removidas = self.conn.execute('DELETE FROM main.movimentacoes WHERE data BETWEEN ? AND ?',
+                                              (inicio, fim)).rowcount
+                if removidas != quantidade:
+                    raise ErroBancoDados(f"{quantidade} linhas arquivadas, mas {removidas} removidas; nada foi alterado.")
+                self._criar_gatilhos()
+        except sqlite3.Error as e:
+            raise ErroBancoDados(str(e)) from e
+        finally:
+            self.conn.execute('DETACH DATABASE arquivo_novo')
+        if compactar:
+            self.conn.execute('VACUUM')
+        return quantidade
+
+    def _criar_arquivo(self, esquema):
+        # Mesmo formato de movimentacoes, sem as chaves estrangeiras, com uma cópia das contas
+        # para que o arquivo possa ser lido sozinho e o próprio índice de busca textual
+        self.conn.execute(f'''
+            CREATE TABLE {esquema}.movimentacoes (
+                id INTEGER PRIMARY KEY,
+                data TEXT NOT NULL,
+                tipo TEXT NOT NULL,
+                conta_id INTEGER NOT NULL,
+                valor_centavos INTEGER NOT NULL,
+                observacoes TEXT,
+                recorrencia_id INTEGER
+            )
+        ''')
+        self.conn.execute(f'CREATE INDEX {esquema}.idx_movimentacoes_data_conta_tipo ON movimentacoes (data, conta_id, tipo)')
+        self.conn.execute(f'CREATE INDEX {esquema}.idx_movimentacoes_conta_data ON movimentacoes (conta_id, data)')
+        self.conn.execute(f'CREATE TABLE {esquema}.contas (id INTEGER PRIMARY KEY, nome TEXT NOT NULL)')
+        self.conn.execute(f'''
+            CREATE VIRTUAL TABLE {esquema}.movimentacoes_busca USING fts5 (
+                observacoes,
+                content = 'movimentacoes',
+                content_rowid = 'id',
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+        ''')
+
+    def buscar_arquivos(self):
+        # ano, arquivo, quantidade de movimentações e saldo total acumulado ao fim do ano
+        return self._fetch_all_em_cache('''
+            SELECT a.ano, a.caminho, a.quantidade, COALESCE(SUM(f.entradas - f.saidas), 0)
+            FROM arquivos a LEFT JOIN fechamentos f ON f.ano = a.ano
+            GROUP BY a.ano
+            ORDER BY a.ano
+        ''')
+
+    def instancia(self):
+        # Identificador desta instância, gravado nas alterações exportadas
+        return self.fetch_all('SELECT id FROM instancia')[0][0]
+
+    def renovar_instancia(self):
+        # Para usar uma cópia do banco (ou um backup restaurado) como outra instância: o histórico
+        # existente passa a ser atribuído à instância original, que assim não o recebe de volta
+        with self.transaction():
+            anterior = self.instancia()
+            ultima = self._ultima_alteracao()
+            self.conn.execute('UPDATE alteracoes SET origem = ?, origem_seq = seq WHERE origem IS NULL', (anterior,))
+            # As movimentações existentes continuam identificadas pela chave da instância original
+            self.conn.execute('UPDATE movimentacoes SET origem = ?, origem_id = id WHERE origem IS NULL', (anterior,))
+            self.conn.execute('''
+                INSERT INTO sincronizacao (origem, ultima_seq) VALUES (?, ?)
+                ON CONFLICT (origem) DO UPDATE SET ultima_seq = MAX(ultima_seq, excluded.ultima_seq)
+            ''', (anterior, ultima))
+            nova = uuid.uuid4().hex
+            self.conn.execute('UPDATE instancia SET id = ?', (nova,))
+        return nova
+
+    def _ultima_alteracao(self):
+        # Pelo contador do AUTOINCREMENT, que continua valendo depois de podar_alteracoes
+        linhas = self.fetch_all("SELECT seq FROM sqlite_sequence WHERE name = 'alteracoes'")
+        return linhas[0][0] if linhas else 0
+
+    def exportar_alteracoes(self, caminho, desde=0):
+        # Grava as alterações com seq maior que desde e devolve (quantidade, última seq exportada),
+        # que é o desde da próxima exportação. O custo é proporcional ao número de alterações.
+        instancia = self.instancia()
+        ate = self._ultima_alteracao()
+        primeira = self.fetch_all('SELECT MIN(seq) FROM alteracoes')[0][0] or ate + 1
+        if desde < primeira - 1:
+            raise ErroBancoDados(f"As alterações até {primeira - 1} já foram removidas; parta de um backup completo.")
+        cursor = self.conn.execute('''
+            SELECT json_object('seq', seq, 'origem', COALESCE(origem, ?), 'origem_seq', COALESCE(origem_seq, seq),
+                               'tabela', tabela, 'operacao', operacao, 'registrada_em', registrada_em,
+                               'dados', json(dados))
+            FROM alteracoes WHERE seq > ? AND seq <= ? ORDER BY seq
+        ''', (instancia, desde, ate))
+        try:
+            quantidade = escrever_alteracoes(caminho, instancia, cursor)
+        finally:
+            cursor.close()
+        return quantidade, max(ate, desde)
+
+    def aplicar_alteracoes(self, caminho):
+        # Aplica numa única transação as alterações exportadas por outra instância, na ordem em que
+        # aconteceram: movimentações pela chave entre instâncias (origem, origem_id), contas pelo nome. Alterações já aplicadas antes (pela
+        # origem e origem_seq) são ignoradas, então o mesmo arquivo pode ser aplicado de novo. As da
+        # própria instância só entram se continuarem o histórico local sem lacunas, como ao restaurar
+        # um backup, e mantêm o seq original. Devolve (aplicadas, ignoradas).
+        try:
+            return self._aplicar_arquivo_alteracoes(caminho, self.instancia())
+        except sqlite3.Error as e:
+            raise ErroBancoDados(f"Não foi possível aplicar {caminho}: {e}") from e
+
+    def _aplicar_arquivo_alteracoes(self, caminho, instancia):
+        aplicadas = ignoradas = 0
+        with self.transaction():
+            ultimas = dict(self.fetch_all('SELECT origem, ultima_seq FROM sincronizacao'))
+            ultima_local = self._ultima_alteracao()
+            # Os gatilhos registrariam as alterações como locais; elas são registradas abaixo com a origem
+            for gatilho in GATILHOS_ALTERACOES:
+                self.conn.execute(f'DROP TRIGGER IF EXISTS {gatilho}')
+            for alteracao in ler_alteracoes(caminho):
+                origem, origem_seq = alteracao["origem"], alteracao["origem_seq"]
+                if origem == instancia:
+                    if origem_seq <= ultima_local:
+                        ignoradas += 1
+                        continue
+                    if origem_seq != ultima_local + 1:
+                        raise ErroBancoDados(f"Faltam as alterações {ultima_local + 1} a {origem_seq - 1} desta instância.")
+                elif origem_seq <= ultimas.get(origem, 0):
+                    ignoradas += 1
+                    continue
+                self._aplicar_alteracao(alteracao["tabela"], alteracao["operacao"], alteracao["dados"], instancia)
+                ultima_local = self.conn.execute('''
+                    INSERT INTO alteracoes (seq, tabela, operacao, dados, origem, origem_seq, registrada_em)
+                    VALUES (?, ?, ?, json(?), ?, ?, ?)
+                ''', (origem_seq if origem == instancia else None, alteracao["tabela"], alteracao["operacao"],
+                      json.dumps(alteracao["dados"], ensure_ascii=False),
+                      None if origem == instancia else origem, None if origem == instancia else origem_seq,
+                      alteracao["registrada_em"])).lastrowid
+                if origem != instancia:
+                    ultimas[origem] = origem_seq
+                aplicadas += 1
+            self.conn.executemany('''
+                INSERT INTO sincronizacao (origem, ultima_seq) VALUES (?, ?)
+                ON CONFLICT (origem) DO UPDATE SET ultima_seq = excluded.ultima_seq
+            ''', ultimas.items())
+            self._criar_gatilhos()
+        return aplicadas, ignoradas
+
+    def _aplicar_alteracao(self, tabela, operacao, dados, instancia):
+        # Movimentações criadas aqui são encontradas pelo id; as de outras instâncias, pela chave de lá
+        if tabela == "movimentacoes" and dados["origem"] == instancia:
+            chave = "origem IS NULL AND id = :origem_id"
+        else:
+            chave = "origem = :origem AND origem_id = :origem_id"
+        if tabela == "movimentacoes" and operacao in ("inserir", "editar"):
+            conta_id = self._obter_conta_id(dados["conta"])
+            campos = {**dados, "conta_id": conta_id,
+                      "impressao": calcular_impressao(dados["data"], conta_id, dados["valor_centavos"], dados["observacoes"])}
+            # UPDATE e INSERT separados, e não um UPSERT: o ON CONFLICT do comando externo substitui o
+            # OR IGNORE dos INSERT feitos pelos gatilhos de saldos, que então falham com UNIQUE.
+            # Mesma regra de ocorrência de editar_movimentacao quando a movimentação já existe.
+            atualizadas = self.conn.execute(f'''
+                UPDATE movimentacoes
+                SET data = :data, tipo = :tipo, conta_id = :conta_id, valor_centavos = :valor_centavos,
+                    observacoes = :observacoes,
+                    ocorrencia = CASE WHEN impressao IS :impressao THEN ocorrencia ELSE
+                        (SELECT COALESCE(MAX(ocorrencia), 0) + 1 FROM movimentacoes WHERE impressao = :impressao) END,
+                    impressao = :impressao
+                WHERE {chave}
+            ''', campos).rowcount
+            if not atualizadas:
+                # Uma movimentação desta instância volta com o id original (o AUTOINCREMENT não o
+                # reutiliza); as de outras instâncias recebem um id local novo
+                local = dados["origem"] == instancia
+                self.conn.execute('''
+                    INSERT INTO movimentacoes (id, data, tipo, conta_id, valor_centavos, observacoes, impressao, ocorrencia,
+                                               origem, origem_id)
+                    VALUES (:id, :data, :tipo, :conta_id, :valor_centavos, :observacoes, :impressao,
+                            (SELECT COALESCE(MAX(ocorrencia), 0) + 1 FROM movimentacoes WHERE impressao = :impressao),
+                            :origem, :origem_id)
+                ''', {**campos, "id": dados["origem_id"] if local else None,
+                      "origem": None if local else dados["origem"], "origem_id": None if local else dados["origem_id"]})
+        elif tabela == "movimentacoes" and operacao == "excluir":
+            self.conn.execute(f'DELETE FROM movimentacoes WHERE {chave}', dados)
+        elif tabela == "contas" and operacao == "inserir":
+            self.conn.execute('INSERT OR IGNORE INTO contas (nome) VALUES (?)', (dados["nome"],))
+        elif tabela == "contas" and operacao == "editar":
+            self.conn.execute('UPDATE OR IGNORE contas SET nome = ? WHERE nome = ?', (dados["nome"], dados["nome_anterior"]))
+        elif tabela == "contas" and operacao == "excluir":
+            try:
+                self.conn.execute('DELETE FROM contas WHERE nome = ?', (dados["nome"],))
+            except sqlite3.IntegrityError:
+                # Ainda usada aqui (por movimentações desta instância, por exemplo): a conta fica
+                pass
+        else:
+            raise ValueError(f"Alteração desconhecida: {operacao} em {tabela}.")
+
+    def podar_alteracoes(self, ate):
+        # Remove do registro as alterações até a seq informada, que devem estar num backup completo.
+        # Exportações que partam de antes disso passam a ser recusadas.
+        if not self.fetch_all('SELECT 1 FROM copias WHERE completa AND seq_ate >= ? LIMIT 1', (ate,)):
+            raise ValueError(f"Nenhum backup completo cobre as alterações até {ate}.")
+        return self.execute_query('DELETE FROM alteracoes WHERE seq <= ?', (ate,)).rowcount
+
+    def fazer_backup(self, pasta, completo=False, progresso=None):
+        # Backup online: a primeira cópia numa pasta (ou com completo=True) é o banco inteiro, copiado
+        # pela API de backup do SQLite em passos de PAGINAS_POR_PASSO_BACKUP páginas, sem bloquear as
+        # escritas; as seguintes gravam só as alterações desde a cópia anterior (ver copias_da_pasta).
+        # Os arquivos de anos arquivados, que não mudam mais, são copiados uma vez. progresso(restantes,
+        # total) recebe as páginas da cópia completa. Devolve o arquivo gravado, ou None sem alterações.
+        pasta = os.path.abspath(pasta)
+        os.makedirs(pasta, exist_ok=True)
+        base = os.path.splitext(os.path.basename(self.db_name))[0]
+        carimbo = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        anterior = self.fetch_all('SELECT arquivo, seq_ate FROM copias WHERE pasta = ? ORDER BY id DESC LIMIT 1', (pasta,))
+        if not completo and anterior and os.path.exists(os.path.join(pasta, anterior[0][0])):
+            desde = anterior[0][1]
+            if self._ultima_alteracao() <= desde:
+                return None
+            arquivo = f"{base}-{carimbo}-alteracoes.ndjson"
+            _, seq_ate = self.exportar_alteracoes(os.path.join(pasta, arquivo), desde)
+        else:
+            arquivo = f"{base}-{carimbo}.db"
+            caminho = os.path.join(pasta, arquivo)
+            destino = sqlite3.connect(caminho + ".tmp")
+            try:
+                self.conn.backup(destino, pages=PAGINAS_POR_PASSO_BACKUP,
+                                 progress=(lambda _, restantes, total: progresso(restantes, total)) if progresso else None)
+                # A seq vem da própria cópia, que reflete o banco no instante em que terminou
+                seq_ate = destino.execute("SELECT seq FROM sqlite_sequence WHERE name = 'alteracoes'").fetchone()
+                seq_ate = seq_ate[0] if seq_ate else 0
+            finally:
+                destino.close()
+            os.replace(caminho + ".tmp", caminho)
+            for _, caminho_arquivo in self._arquivos():
+                if not os.path.exists(os.path.join(pasta, caminho_arquivo)):
+                    shutil.copy2(os.path.join(self._pasta, caminho_arquivo), os.path.join(pasta, caminho_arquivo))
+        self.execute_query('INSERT INTO copias (pasta, arquivo, completa, seq_ate, criada_em) VALUES (?, ?, ?, ?, ?)',
+                           (pasta, arquivo, arquivo.endswith(".db"), seq_ate, datetime.now().isoformat(timespec="seconds")))
+        return os.path.join(pasta, arquivo)
+
+    def buscar_contas(self):
+        return self._fetch_all_em_cache('SELECT nome FROM contas ORDER BY nome')
+
+    def adicionar_conta(self, nome):
+        query = 'INSERT INTO contas (nome) VALUES (?)'
+        self.execute_query(query, (nome,))
+
+    def excluir_conta(self, nome):
+        # As chaves estrangeiras também impedem a exclusão; as verificações aqui só dão uma mensagem
+        # clara. Toda conta com movimentações num ano arquivado tem linha em fechamentos, então os
+        # arquivos não precisam ser anexados para isso.
+        if self.fetch_all('''SELECT 1 FROM contas c
+                             WHERE c.nome = ?
+                               AND (EXISTS (SELECT 1 FROM movimentacoes WHERE conta_id = c.id)
+                                    OR EXISTS (SELECT 1 FROM fechamentos WHERE conta_id = c.id))''', (nome,)):
+            raise ValueError("A conta possui movimentações e não pode ser excluída.")
+        if self.fetch_all('''SELECT 1 FROM recorrencias
+                             WHERE conta_id = (SELECT id FROM contas WHERE nome = ?) LIMIT 1''', (nome,)):
+            raise ValueError("A conta possui recorrências e não pode ser excluída.")
+        query = 'DELETE FROM contas WHERE nome=?'
+        self.execute_query(query, (nome,))
+
+    # Valores monetários saem do banco como centavos inteiros; a conversão para Decimal
+    # acontece só na exibição (ver formatar_valor)
+    def calcular_total(self, tipo):
+        query = 'SELECT ABS(SUM(total)) FROM resumo_mensal WHERE tipo=?'
+        result = self._fetch_all_em_cache(query, (tipo,))
+        return result[0][0] or 0
+
+    def buscar_saldos(self):
+        return self._fetch_all_em_cache('''
+            SELECT c.nome, s.entradas - s.saidas
+            FROM saldos s JOIN contas c ON c.id = s.conta_id
+            ORDER BY c.nome
+        ''')
+
+    def calcular_saldo(self):
+        # Com saídas negativas o saldo é uma única soma exata, sem somar entradas e saídas em separado
+        result = self._fetch_all_em_cache('SELECT SUM(entradas - saidas) FROM saldos')
+        return result[0][0] or 0
+
+    def exportar_csv(self, filename="movimentacoes.csv", filtros=None):
+        return self.exportar(filename, filtros)
+
+    def exportar(self, filename, filtros=None, formato=None, progresso=None, cancelar=None,
+                 tamanho_bloco=TAMANHO_BLOCO_EXPORTACAO):
+        # Percorre o cursor em blocos com fetchmany, então a memória usada não depende do tamanho
+        # da tabela. progresso(escritas, total) é chamado a cada bloco; cancelar é um
+        # threading.Event verificado entre os blocos e, se acionado, o arquivo parcial é removido.
+        escritor = criar_escritor(filename, formato)
+        conditions, params, fonte = self._montar_filtros(filtros)
+        where = self._clausula_where(conditions)
+        total = self.fetch_all(f'SELECT COUNT(*) FROM {fonte} m' + where, params)[0][0] if progresso else None
+        cursor = self.conn.execute(SELECT_MOVIMENTACOES.format(fonte=fonte) + where + ' ORDER BY m.id', params)
+        escritas = 0
+        try:
+            with escritor as escrever:
+                while True:
+                    if cancelar is not None and cancelar.is_set():
+                        raise ExportacaoCancelada()
+                    bloco = cursor.fetchmany(tamanho_bloco)
+                    if not bloco:
+                        break
+                    escrever(bloco)
+                    escritas += len(bloco)
+                    if progresso:
+                        progresso(escritas, total)
+        except BaseException:
+            cursor.close()
+            if os.path.exists(filename):
+                os.remove(filename)
+            raise
+        return filename
+
+
+def restaurar_backup(pasta, destino):
+    # Recria o banco em destino a partir da cópia completa mais recente da pasta, aplicando em
+    # ordem as alterações gravadas depois dela. Devolve a quantidade de alterações aplicadas.
+    # Numa falha, o destino e os arquivos de anos copiados para junto dele são removidos
+    if os.path.exists(destino):
+        raise FileExistsError(f"{destino} já existe")
+    completa, incrementais = copias_da_pasta(pasta)
+    copiados = [destino]
+    try:
+        shutil.copyfile(completa, destino)
+        db = DatabaseManager(destino)
+        try:
+            for _, caminho in db._arquivos():
+                if not os.path.exists(os.path.join(db._pasta, caminho)):
+                    shutil.copy2(os.path.join(pasta, caminho), os.path.join(db._pasta, caminho))
+                    copiados.append(os.path.join(db._pasta, caminho))
+            return sum(db.aplicar_alteracoes(caminho)[0] for caminho in incrementais)
+        finally:
+            db.conn.close()
+    except BaseException as e:
+        for caminho in copiados:
+            for sobra in (caminho, caminho + "-wal", caminho + "-shm", caminho + "-journal"):
+                if os.path.exists(sobra):
+                    os.remove(sobra)
+        if isinstance(e, sqlite3.Error):
+            raise ErroBancoDados(f"Não foi possível restaurar {pasta}: {e}") from e
+        raise
+
+
+def _mes_seguinte(mes):
+    ano, numero = int(mes[:4]), int(mes[5:7])
+    return f"{ano + numero // 12:04d}-{numero % 12 + 1:02d}"
+
+
+def _mes_anterior(mes):
+    ano, numero = int(mes[:4]), int(mes[5:7])
+    return f"{ano - (numero == 1):04d}-{(numero - 2) % 12 + 1:02d}"
+
+
+def _dia_seguinte(data):
+    return (date.fromisoformat(data) + timedelta(days=1)).isoformat() if data else "0001-01-01"
+
+
+def _json_movimentacao(linha):
+    # Linha de movimentacoes em JSON para o registro de alterações, com a conta pelo nome e a chave
+    # entre instâncias (origem, origem_id) no lugar do id local
+    return (f"json_object('origem', COALESCE({linha}.origem, (SELECT id FROM instancia)), "
+            f"'origem_id', COALESCE({linha}.origem_id, {linha}.id), 'data', {linha}.data, 'tipo', {linha}.tipo, "
+            f"'conta', (SELECT nome FROM contas WHERE id = {linha}.conta_id), "
+            f"'valor_centavos', {linha}.valor_centavos, 'observacoes', {linha}.observacoes)")
+
+
+def _fonte_movimentacoes(esquemas):
+    if esquemas == ["main"]:
+        return "movimentacoes"
+    return "(" + " UNION ALL ".join(f"SELECT {COLUNAS_MOVIMENTACOES} FROM {esquema}.movimentacoes"
+                                    for esquema in esquemas) + ")"
+
+
+def _fonte_busca(esquemas):
+    # Ids e rank das linhas que atendem à busca textual, um MATCH ? por esquema. Os ids não se
+    # repetem entre o banco e os arquivos, pois as linhas arquivadas mantêm o id original.
+    return "(" + " UNION ALL ".join(
+        f"SELECT rowid AS id, rank FROM {esquema}.movimentacoes_busca WHERE movimentacoes_busca MATCH ?"
+        for esquema in esquemas) + ")"
+
+
+def _com_saldo_acumulado(query, saldo_acumulado=True, fonte="movimentacoes"):
+    # Acrescenta às linhas de uma página (SELECT_MOVIMENTACOES ... LIMIT ?) o saldo da conta após
+    # cada uma, independente dos filtros da página. Cada linha faz a própria consulta SALDO_ANTERIOR
+    # por (conta_id, data, id): os meses anteriores vêm de resumo_mensal e só o começo do mês da linha
+    # é lido pelo índice (conta_id, data). O custo fica limitado pelo tamanho da página mesmo quando
+    # ela, ordenada por id, mistura datas de anos diferentes.
+    if not saldo_acumulado:
+        return query
+    return '''
+        WITH pagina AS (SELECT p.*, ROW_NUMBER() OVER () AS posicao FROM (''' + query + ''') p)
+        SELECT p.id, p.data, p.tipo, p.nome, p.valor_centavos, p.observacoes,
+               p.valor_centavos + ''' + SALDO_ANTERIOR.format(fonte=fonte, conta="c.id", data="p.data", id="p.id") + '''
+        FROM pagina p JOIN contas c ON c.nome = p.nome
+        ORDER BY p.posicao
+    '''
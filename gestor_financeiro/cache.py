@@ -0,0 +1,62 @@
+from collections import OrderedDict
+import threading
+
+MAX_ENTRADAS_CACHE = 256
+MAX_LINHAS_CACHE = 200_000
+
+
+class CacheResultados:
+    # Cache LRU de resultados de consultas. Cada valor é guardado junto com a geração de escrita em
+    # que foi calculado; ao observar uma geração diferente o cache inteiro é descartado, já que
+    # qualquer escrita pode mudar qualquer resultado. O tamanho é limitado pelo número de entradas
+    # e pelo total de linhas guardadas; resultados grandes demais nem chegam a entrar.
+    def __init__(self, max_entradas=MAX_ENTRADAS_CACHE, max_linhas=MAX_LINHAS_CACHE):
+        self.max_entradas = max_entradas
+        self.max_linhas = max_linhas
+        self.acertos = 0
+        self.faltas = 0
+        self._entradas = OrderedDict()
+        self._linhas = 0
+        self._geracao = None
+        self._lock = threading.Lock()
+
+    def obter(self, chave, geracao, calcular):
+        with self._lock:
+            if geracao != self._geracao:
+                self._limpar()
+                self._geracao = geracao
+            elif chave in self._entradas:
+                self._entradas.move_to_end(chave)
+                self.acertos += 1
+                return _copiar(self._entradas[chave][0])
+            self.faltas += 1
+        valor = calcular()
+        peso = len(valor) if isinstance(valor, list) else 1
+        with self._lock:
+            if geracao == self._geracao and peso <= self.max_linhas // 4:
+                anterior = self._entradas.pop(chave, None)
+                if anterior is not None:
+                    self._linhas -= anterior[1]
+                self._entradas[chave] = (valor, peso)
+                self._linhas += peso
+                while len(self._entradas) > self.max_entradas or self._linhas > self.max_linhas:
+                    self._linhas -= self._entradas.popitem(last=False)[1][1]
+        return _copiar(valor)
+
+    def limpar(self):
+        with self._lock:
+            self._limpar()
+
+    def _limpar(self):
+        self._entradas.clear()
+        self._linhas = 0
+
+    def estatisticas(self):
+        with self._lock:
+            return {"entradas": len(self._entradas), "linhas": self._linhas,
+                    "acertos": self.acertos, "faltas": self.faltas}
+
+
+def _copiar(valor):
+    # Listas são copiadas para que quem chama possa alterá-las sem afetar o cache
+    return list(valor) if isinstance(valor, list) else valor
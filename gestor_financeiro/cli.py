@@ -0,0 +1,356 @@
+import argparse
+import logging
+import sqlite3
+import sys
+
+from .banco import TAMANHO_PAGINA, TOLERANCIA_CENTAVOS, TOLERANCIA_DIAS, DatabaseManager, restaurar_backup
+from .conversoes import converter_data_para_exibicao, converter_para_centavos, converter_valor, formatar_valor, validar_campos
+from .erros import ErroGestorFinanceiro
+from .instrumentacao import LIMIAR_LENTO_MS, Instrumentacao
+from .recorrencias import FREQUENCIAS
+
+
+def _adicionar_argumentos_filtro(parser):
+    parser.add_argument("--de", help="data inicial (DD/MM/AAAA)")
+    parser.add_argument("--ate", help="data final (DD/MM/AAAA)")
+    parser.add_argument("--tipo", choices=["Entrada", "Saída"])
+    parser.add_argument("--conta")
+    parser.add_argument("--busca", help='texto nas observações; aceita "frases" e prefixos*')
+
+
+def _filtros(args):
+    # Um período com só uma das pontas fica aberto do outro lado
+    filtros = {}
+    if args.de or args.ate:
+        filtros["data_inicio"] = args.de or "0001-01-01"
+        filtros["data_fim"] = args.ate or "9999-12-31"
+    if args.tipo:
+        filtros["tipo"] = args.tipo
+    if args.conta:
+        filtros["conta"] = args.conta
+    if args.busca:
+        filtros["busca"] = args.busca
+    return filtros
+
+
+def _cmd_add(db, args):
+    valor = converter_valor(args.valor)
+    validar_campos(tipo=args.tipo, conta=args.conta, valor=valor)
+    mov_id = db.adicionar_movimentacao(
+        data=args.data, tipo=args.tipo, conta=args.conta, valor=valor, observacoes=args.observacoes
+    )
+    print(mov_id)
+
+
+def _cmd_import(db, args):
+    resultado = db.importar_arquivo(args.arquivo, conta=args.conta, tamanho_lote=args.lote,
+                                    ignorar_duplicadas=not args.manter_duplicadas)
+    for linha, motivo in resultado.erros:
+        print(f"linha {linha}: {motivo}", file=sys.stderr)
+    if resultado.linhas_duplicadas:
+        print(f"linhas duplicadas: {', '.join(map(str, resultado.linhas_duplicadas))}", file=sys.stderr)
+    print(f"{resultado.importadas} importadas, {resultado.rejeitadas} rejeitadas, {resultado.duplicadas} duplicadas")
+
+
+def _cmd_reconcile(db, args):
+    resultado = db.conciliar_arquivo(args.arquivo, conta=args.conta, dias=args.dias,
+                                     centavos=converter_para_centavos(converter_valor(args.tolerancia), "Entrada"))
+    for linha, motivo in resultado.erros:
+        print(f"linha {linha}: {motivo}", file=sys.stderr)
+    for linha, _, mov_id, dias, centavos in resultado.conciliadas:
+        diferenca = f"  ({dias:+d} dias, {formatar_valor(centavos)})" if dias or centavos else ""
+        print(f"linha {linha:>6}  conciliada com {mov_id}{diferenca}")
+    for linha, campos in resultado.pendentes:
+        print(f"linha {linha:>6}  sem movimentação: {campos.get('data')} {campos.get('conta')} "
+              f"{campos.get('tipo')} {campos.get('valor')}  {campos.get('observacoes') or ''}")
+    for mov_id, data, tipo, conta, centavos, observacoes in resultado.sem_extrato:
+        print(f"{mov_id:>8}  fora do extrato: {converter_data_para_exibicao(data)}  {tipo:<7} {conta:<20} "
+              f"{formatar_valor(centavos):>15}  {observacoes or ''}")
+    print(f"{len(resultado.conciliadas)} conciliadas, {len(resultado.pendentes)} pendentes no extrato, "
+          f"{len(resultado.sem_extrato)} fora do extrato, {resultado.rejeitadas} rejeitadas")
+
+
+def _cmd_duplicates(db, args):
+    for mov_id, data, tipo, conta, centavos, observacoes in db.buscar_duplicatas():
+        print(f"{mov_id:>8}  {converter_data_para_exibicao(data)}  {tipo:<7} {conta:<20} "
+              f"{formatar_valor(centavos):>15}  {observacoes or ''}")
+
+
+def _cmd_export(db, args):
+    print(db.exportar(args.arquivo, _filtros(args), formato=args.formato))
+
+
+def _cmd_balance(db, args):
+    saldos = db.buscar_saldos()
+    if args.conta:
+        saldos = [(conta, saldo) for conta, saldo in saldos if conta == args.conta]
+    for conta, saldo in saldos:
+        print(f"{conta:<30} {formatar_valor(saldo):>15}")
+    print(f"{'Saldo Total':<30} {formatar_valor(db.calcular_saldo()):>15}")
+
+
+def _cmd_report(db, args):
+    filtros = _filtros(args)
+    for mov_id, data, tipo, conta, centavos, observacoes in db.iterar_movimentacoes(filtros):
+        print(f"{mov_id:>8}  {converter_data_para_exibicao(data)}  {tipo:<7} {conta:<20} "
+              f"{formatar_valor(centavos):>15}  {observacoes or ''}")
+    quantidade, entradas, saidas = db.totalizar_movimentacoes(filtros)
+    print(f"{quantidade} movimentações  entradas {formatar_valor(entradas)}  "
+          f"saídas {formatar_valor(saidas)}  saldo {formatar_valor(entradas - saidas)}")
+
+
+def _cmd_statement(db, args):
+    # Percorre o extrato página a página pelo par (data, id) da última linha
+    apos_id = None
+    while True:
+        pagina = db.extrato_conta(args.conta, args.de, args.ate, apos_id=apos_id)
+        for mov_id, data, tipo, centavos, observacoes, saldo in pagina:
+            print(f"{mov_id:>8}  {converter_data_para_exibicao(data)}  {tipo:<7} {formatar_valor(centavos):>15} "
+                  f"{formatar_valor(saldo):>15}  {observacoes or ''}")
+        if len(pagina) < TAMANHO_PAGINA:
+            break
+        apos_id = pagina[-1][0]
+
+
+def _cmd_cashflow(db, args):
+    print(f"{'Período':<10} {'Entradas':>15} {'Saídas':>15} {'Resultado':>15} {'Saldo':>15}")
+    for periodo, *valores in db.fluxo_de_caixa(args.por, args.conta, args.de, args.ate):
+        print(f"{periodo:<10} " + " ".join(f"{formatar_valor(valor):>15}" for valor in valores))
+
+
+def _cmd_rollups(db, args):
+    if args.acao == "rebuild":
+        db.reconstruir_resumo()
+        print("resumo mensal reconstruído")
+        return
+    divergencias = db.verificar_resumo()
+    for conta, mes, tipo in divergencias:
+        print(f"divergência: {conta} {mes} {tipo}")
+    if divergencias:
+        raise ErroGestorFinanceiro(f"{len(divergencias)} totais divergentes; use 'rollups rebuild'")
+    print("resumo mensal consistente")
+
+
+def _cmd_recurring(db, args):
+    if args.acao == "add":
+        print(db.adicionar_recorrencia(args.tipo, args.conta, args.valor, args.frequencia, args.inicio,
+                                       args.intervalo, args.fim, args.observacoes))
+    elif args.acao == "list":
+        for (regra_id, tipo, conta, centavos, observacoes, frequencia, intervalo,
+             inicio, fim, materializada_ate) in db.buscar_recorrencias():
+            periodo = f"{converter_data_para_exibicao(inicio)} a {converter_data_para_exibicao(fim) if fim else '-'}"
+            lancada = converter_data_para_exibicao(materializada_ate) if materializada_ate else "-"
+            print(f"{regra_id:>6}  {tipo:<7} {conta:<20} {formatar_valor(abs(centavos)):>15}  "
+                  f"{frequencia}/{intervalo:<3} {periodo:<25} lançada até {lancada}  {observacoes or ''}")
+    elif args.acao == "remove":
+        if not db.excluir_recorrencia(args.id):
+            raise ErroGestorFinanceiro(f"recorrência {args.id} não encontrada")
+    elif args.acao == "run":
+        print(f"{db.materializar_recorrencias(args.ate)} movimentações lançadas")
+    else:
+        print(f"{'Mês':<10} {'Entradas':>15} {'Saídas':>15} {'Saldo':>15}")
+        for mes, entradas, saidas, saldo in db.projetar_saldos(args.meses, args.conta):
+            print(f"{mes:<10} {formatar_valor(entradas):>15} {formatar_valor(saidas):>15} {formatar_valor(saldo):>15}")
+
+
+def _cmd_archive(db, args):
+    if args.ano is not None:
+        quantidade = db.arquivar_ano(args.ano, compactar=args.vacuum)
+        print(f"{quantidade} movimentações de {args.ano} arquivadas")
+        return
+    for ano, caminho, quantidade, saldo in db.buscar_arquivos():
+        print(f"{ano}  {caminho:<30} {quantidade:>10} movimentações  saldo ao fim do ano {formatar_valor(saldo):>15}")
+
+
+def _cmd_export_changes(db, args):
+    quantidade, ate = db.exportar_alteracoes(args.arquivo, args.since)
+    # A última seq é o --since da próxima exportação
+    print(f"{quantidade} alterações exportadas até a seq {ate}")
+
+
+def _cmd_apply_changes(db, args):
+    aplicadas, ignoradas = db.aplicar_alteracoes(args.arquivo)
+    print(f"{aplicadas} alterações aplicadas, {ignoradas} já aplicadas antes")
+
+
+def _cmd_prune_changes(db, args):
+    print(f"{db.podar_alteracoes(args.ate)} alterações removidas do registro")
+
+
+def _cmd_instance(db, args):
+    print(db.renovar_instancia() if args.new else db.instancia())
+
+
+def _cmd_backup(db, args):
+    caminho = db.fazer_backup(args.pasta, completo=args.full)
+    print(caminho or "nenhuma alteração desde o último backup")
+
+
+def _cmd_restore(db, args):
+    print(f"{restaurar_backup(args.pasta, args.destino)} alterações aplicadas sobre a cópia completa")
+
+
+def _cmd_serve(db, args):
+    from .servidor import servir
+
+    db.conn.close()
+    print(f"servindo {args.db} em http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        servir(args.db, args.host, args.port, args.leitores)
+    except KeyboardInterrupt:
+        pass
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(prog="gestor_financeiro", description="Gestão financeira sem interface gráfica.")
+    parser.add_argument("--db", default="financeiro.db", help="arquivo do banco de dados (padrão: financeiro.db)")
+    parser.add_argument("--estatisticas", action="store_true",
+                        help="mostra no stderr, ao final, o tempo e as linhas de cada comando SQL")
+    parser.add_argument("--limiar-lento", type=float, metavar="MS",
+                        help=f"registra no stderr os comandos mais lentos que MS com o plano de execução "
+                             f"(padrão com --estatisticas: {LIMIAR_LENTO_MS})")
+    # Comandos que não usam o banco de --db (como restore) desligam abrir_banco e recebem db=None
+    parser.set_defaults(abrir_banco=True)
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    add = comandos.add_parser("add", help="adiciona uma movimentação")
+    add.add_argument("--data", required=True, help="DD/MM/AAAA")
+    add.add_argument("--tipo", required=True, choices=["Entrada", "Saída"])
+    add.add_argument("--conta", required=True)
+    add.add_argument("--valor", required=True, help="valor positivo em reais")
+    add.add_argument("--observacoes", default="")
+    add.set_defaults(funcao=_cmd_add)
+
+    importar = comandos.add_parser("import", help="importa um extrato CSV ou OFX")
+    importar.add_argument("arquivo")
+    importar.add_argument("--conta", help="conta de destino para extratos OFX")
+    importar.add_argument("--lote", type=int, default=5000, help="linhas por executemany")
+    importar.add_argument("--manter-duplicadas", action="store_true",
+                          help="importa também as linhas que repetem movimentações existentes (só as conta)")
+    importar.set_defaults(funcao=_cmd_import)
+
+    reconcile = comandos.add_parser("reconcile", help="concilia um extrato CSV ou OFX com as movimentações, sem gravar")
+    reconcile.add_argument("arquivo")
+    reconcile.add_argument("--conta", help="conta do extrato OFX")
+    reconcile.add_argument("--dias", type=int, default=TOLERANCIA_DIAS,
+                           help=f"diferença máxima de datas (padrão: {TOLERANCIA_DIAS})")
+    reconcile.add_argument("--tolerancia", default=formatar_valor(TOLERANCIA_CENTAVOS),
+                           help="diferença máxima de valor em reais (padrão: %(default)s)")
+    reconcile.set_defaults(funcao=_cmd_reconcile)
+
+    duplicates = comandos.add_parser("duplicates", help="lista as movimentações com conteúdo repetido")
+    duplicates.set_defaults(funcao=_cmd_duplicates)
+
+    exportar = comandos.add_parser("export", help="exporta movimentações para CSV, Parquet ou Arrow")
+    exportar.add_argument("arquivo")
+    exportar.add_argument("--formato", choices=["csv", "parquet", "arrow"])
+    _adicionar_argumentos_filtro(exportar)
+    exportar.set_defaults(funcao=_cmd_export)
+
+    balance = comandos.add_parser("balance", help="mostra o saldo por conta e o saldo total")
+    balance.add_argument("--conta")
+    balance.set_defaults(funcao=_cmd_balance)
+
+    report = comandos.add_parser("report", help="lista movimentações filtradas com os totais")
+    _adicionar_argumentos_filtro(report)
+    report.set_defaults(funcao=_cmd_report)
+
+    statement = comandos.add_parser("statement", help="extrato de uma conta com o saldo após cada movimentação")
+    statement.add_argument("--conta", required=True)
+    statement.add_argument("--de", help="data inicial (DD/MM/AAAA)")
+    statement.add_argument("--ate", help="data final (DD/MM/AAAA)")
+    statement.set_defaults(funcao=_cmd_statement)
+
+    cashflow = comandos.add_parser("cashflow", help="fluxo de caixa mensal ou anual com saldo acumulado")
+    cashflow.add_argument("--por", choices=["mes", "ano"], default="mes")
+    cashflow.add_argument("--conta")
+    cashflow.add_argument("--de", help="primeiro período (AAAA-MM ou AAAA)")
+    cashflow.add_argument("--ate", help="último período (AAAA-MM ou AAAA)")
+    cashflow.set_defaults(funcao=_cmd_cashflow)
+
+    rollups = comandos.add_parser("rollups", help="reconstrói ou verifica os totais mensais pré-agregados")
+    rollups.add_argument("acao", choices=["rebuild", "verify"])
+    rollups.set_defaults(funcao=_cmd_rollups)
+
+    recurring = comandos.add_parser("recurring", help="regras de lançamentos recorrentes e projeção de saldo")
+    acoes = recurring.add_subparsers(dest="acao", required=True)
+    recurring_add = acoes.add_parser("add", help="cria uma regra de recorrência")
+    recurring_add.add_argument("--tipo", required=True, choices=["Entrada", "Saída"])
+    recurring_add.add_argument("--conta", required=True)
+    recurring_add.add_argument("--valor", required=True, help="valor positivo em reais")
+    recurring_add.add_argument("--frequencia", required=True, choices=FREQUENCIAS)
+    recurring_add.add_argument("--intervalo", type=int, default=1, help="a cada N dias, semanas ou meses")
+    recurring_add.add_argument("--inicio", required=True, help="primeira ocorrência (DD/MM/AAAA)")
+    recurring_add.add_argument("--fim", help="última data possível (DD/MM/AAAA)")
+    recurring_add.add_argument("--observacoes", default="")
+    acoes.add_parser("list", help="lista as regras")
+    recurring_remove = acoes.add_parser("remove", help="exclui uma regra (os lançamentos gerados ficam)")
+    recurring_remove.add_argument("id", type=int)
+    recurring_run = acoes.add_parser("run", help="lança as ocorrências vencidas numa única transação")
+    recurring_run.add_argument("--ate", help="data limite (DD/MM/AAAA; padrão: hoje)")
+    recurring_project = acoes.add_parser("project", help="projeta o saldo dos próximos meses sem gravar nada")
+    recurring_project.add_argument("--meses", type=int, default=12)
+    recurring_project.add_argument("--conta")
+    recurring.set_defaults(funcao=_cmd_recurring)
+
+    archive = comandos.add_parser("archive", help="move um ano encerrado para um arquivo separado ou lista os arquivados")
+    archive.add_argument("ano", type=int, nargs="?", help="ano a arquivar (sem ele, lista os anos arquivados)")
+    archive.add_argument("--vacuum", action="store_true", help="compacta o banco principal depois de arquivar")
+    archive.set_defaults(funcao=_cmd_archive)
+
+    export_changes = comandos.add_parser("export-changes", help="exporta as alterações registradas depois de uma seq")
+    export_changes.add_argument("arquivo")
+    export_changes.add_argument("--since", type=int, default=0, metavar="SEQ",
+                                help="exporta só as alterações posteriores a SEQ (padrão: 0, todas)")
+    export_changes.set_defaults(funcao=_cmd_export_changes)
+
+    apply_changes = comandos.add_parser("apply-changes", help="aplica alterações exportadas por outra instância")
+    apply_changes.add_argument("arquivo")
+    apply_changes.set_defaults(funcao=_cmd_apply_changes)
+
+    prune_changes = comandos.add_parser("prune-changes", help="remove do registro as alterações já cobertas por um backup completo")
+    prune_changes.add_argument("ate", type=int, metavar="SEQ")
+    prune_changes.set_defaults(funcao=_cmd_prune_changes)
+
+    instance = comandos.add_parser("instance", help="mostra o identificador desta instância")
+    instance.add_argument("--new", action="store_true",
+                          help="gera um novo identificador, para usar uma cópia do banco como outra instância")
+    instance.set_defaults(funcao=_cmd_instance)
+
+    backup = comandos.add_parser("backup", help="backup online: cópia completa ou só as alterações desde o anterior")
+    backup.add_argument("pasta")
+    backup.add_argument("--full", action="store_true", help="força uma cópia completa")
+    backup.set_defaults(funcao=_cmd_backup)
+
+    restore = comandos.add_parser("restore", help="recria um banco a partir dos backups de uma pasta")
+    restore.add_argument("pasta")
+    restore.add_argument("destino", help="arquivo do banco a criar")
+    restore.set_defaults(funcao=_cmd_restore, abrir_banco=False)
+
+    serve = comandos.add_parser("serve", help="inicia a API HTTP/JSON local")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8000)
+    serve.add_argument("--leitores", type=int, default=4, help="conexões de leitura simultâneas")
+    serve.set_defaults(funcao=_cmd_serve)
+    return parser
+
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+    instrumentacao = None
+    if args.estatisticas or args.limiar_lento is not None:
+        logging.basicConfig(format="%(message)s")
+        instrumentacao = Instrumentacao(LIMIAR_LENTO_MS if args.limiar_lento is None else args.limiar_lento)
+    try:
+        db = DatabaseManager(args.db, instrumentacao=instrumentacao) if args.abrir_banco else None
+        args.funcao(db, args)
+    except (ErroGestorFinanceiro, ValueError, OSError) as e:
+        print(f"erro: {e}", file=sys.stderr)
+        return 1
+    except sqlite3.Error as e:
+        print(f"erro no banco de dados: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if args.estatisticas:
+            print(instrumentacao.formatar(), file=sys.stderr)
+    return 0
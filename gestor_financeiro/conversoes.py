@@ -0,0 +1,103 @@
+from datetime import date, datetime
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+import hashlib
+import re
+import unicodedata
+
+FORMATO_DATA_EXIBICAO = "%d/%m/%Y"
+FORMATO_DATA_BANCO = "%Y-%m-%d"
+
+_TERMOS_BUSCA = re.compile(r'"([^"]*)"|(\S+)')
+_FORA_DA_DESCRICAO = re.compile(r"[^0-9a-z]+")
+# "1200.50" ou "1200", e o formato brasileiro com milhares opcionais: "1.200,50", "1200,50", "1.200.000"
+_VALOR_SIMPLES = re.compile(r"[+-]?(?:\d+(?:\.\d*)?|\.\d+)")
+_VALOR_BRASILEIRO = re.compile(r"[+-]?(?:\d{1,3}(?:\.\d{3})+|\d+)(?:,\d*)?|[+-]?,\d+")
+
+
+@lru_cache(maxsize=4096)
+def converter_data_para_banco(data):
+    # Aceita DD/MM/AAAA (formato da interface) ou AAAA-MM-DD e devolve ISO, que ordena corretamente.
+    # O cache evita reconverter as mesmas datas, que se repetem muito em importações em lote.
+    try:
+        # Caminho rápido para as datas com zeros à esquerda, o caso comum na importação em lote
+        if len(data) == 10 and data[2] == "/" and data[5] == "/":
+            return date(int(data[6:]), int(data[3:5]), int(data[:2])).isoformat()
+        if len(data) == 10 and data[4] == "-" and data[7] == "-":
+            return date(int(data[:4]), int(data[5:7]), int(data[8:])).isoformat()
+    except ValueError:
+        raise ValueError("Formato de data inválido. Use DD/MM/AAAA") from None
+    for formato in (FORMATO_DATA_EXIBICAO, FORMATO_DATA_BANCO):
+        try:
+            return datetime.strptime(data, formato).strftime(FORMATO_DATA_BANCO)
+        except ValueError:
+            continue
+    raise ValueError("Formato de data inválido. Use DD/MM/AAAA")
+
+
+def converter_data_para_exibicao(data):
+    return datetime.strptime(data, FORMATO_DATA_BANCO).strftime(FORMATO_DATA_EXIBICAO)
+
+
+def converter_valor(texto):
+    # Aceita "1200.50" e o formato brasileiro "1.200,50"; devolve Decimal para não perder centavos.
+    # Separadores em qualquer outra combinação ("1,200.50", "1.20,5") são recusados em vez de adivinhados
+    texto = texto.strip()
+    if _VALOR_SIMPLES.fullmatch(texto):
+        return Decimal(texto)
+    if _VALOR_BRASILEIRO.fullmatch(texto):
+        return Decimal(texto.replace(".", "").replace(",", "."))
+    raise ValueError(f"Valor inválido: {texto!r}")
+
+
+def converter_para_centavos(valor, tipo):
+    # Valor positivo em reais -> centavos inteiros com sinal: entradas positivas, saídas negativas
+    if not isinstance(valor, Decimal):
+        valor = converter_valor(str(valor))
+    centavos = int(valor.scaleb(2).to_integral_value(ROUND_HALF_UP))
+    return -centavos if tipo == "Saída" else centavos
+
+
+def formatar_valor(centavos):
+    return f"{Decimal(centavos).scaleb(-2):.2f}"
+
+
+def validar_campos(**kwargs):
+    if kwargs["tipo"] not in ["Entrada", "Saída"]:
+        raise ValueError("O tipo deve ser 'Entrada' ou 'Saída'.")
+    if not kwargs["conta"]:
+        raise ValueError("A conta não pode estar vazia.")
+    if kwargs["valor"] <= 0:
+        raise ValueError("O valor deve ser maior que zero.")
+
+
+def converter_busca(texto):
+    # Converte o texto digitado numa consulta FTS5 que nunca dá erro de sintaxe: "trechos entre
+    # aspas" viram frases, termos terminados em * viram prefixos e todos os termos são obrigatórios
+    termos = []
+    for frase, termo in _TERMOS_BUSCA.findall(texto):
+        if frase.strip():
+            termos.append(f'"{frase}"')
+        elif termo:
+            prefixo = "*" if termo.endswith("*") else ""
+            termo = termo.replace('"', "").rstrip("*")
+            if termo:
+                termos.append(f'"{termo}"{prefixo}')
+    return " ".join(termos)
+
+
+@lru_cache(maxsize=4096)
+def normalizar_descricao(texto):
+    # Minúsculas, sem acentos nem pontuação e com os espaços colapsados: "PAG*Padaria  São João"
+    # e "pag padaria sao joao" viram o mesmo texto
+    texto = unicodedata.normalize("NFKD", texto or "").encode("ascii", "ignore").decode("ascii")
+    return _FORA_DA_DESCRICAO.sub(" ", texto.lower()).strip()
+
+
+def calcular_impressao(data, conta_id, valor_centavos, observacoes):
+    # Impressão digital do conteúdo de uma movimentação (data ISO, conta, valor com sinal e
+    # descrição normalizada). Lançamentos idênticos têm a mesma impressão e se distinguem pela
+    # coluna ocorrencia (1, 2, ...), que forma com ela o índice único idx_movimentacoes_impressao.
+    # O resumo de 64 bits vira um INTEGER do SQLite, que ocupa bem menos no índice que um texto
+    conteudo = f"{data}|{conta_id}|{valor_centavos}|{normalizar_descricao(observacoes)}"
+    return int.from_bytes(hashlib.blake2b(conteudo.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
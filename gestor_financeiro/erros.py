@@ -0,0 +1,10 @@
+class ErroGestorFinanceiro(Exception):
+    pass
+
+
+class ErroBancoDados(ErroGestorFinanceiro):
+    pass
+
+
+class ExportacaoCancelada(ErroGestorFinanceiro):
+    pass
@@ -0,0 +1,131 @@
+from concurrent.futures import Future
+import queue
+import threading
+
+from .banco import DatabaseManager
+
+
+class ExecutorConsultas:
+    # Thread de trabalho com a própria conexão SQLite. Cada tarefa recebe o DatabaseManager da
+    # thread e devolve um Future. Uma nova tarefa com a mesma chave substitui a anterior: se ela
+    # ainda estiver na fila é cancelada, se já estiver rodando a consulta é interrompida.
+    def __init__(self, db_name="financeiro.db", **opcoes_conexao):
+        self.db_name = db_name
+        self.opcoes_conexao = opcoes_conexao
+        self._fila = queue.Queue()
+        self._lock = threading.Lock()
+        self._por_chave = {}
+        self._em_execucao = None
+        self._db = None
+        self._thread = threading.Thread(target=self._executar, name="executor-consultas", daemon=True)
+        self._thread.start()
+
+    def submeter(self, tarefa, chave=None):
+        future = Future()
+        with self._lock:
+            if chave is not None:
+                anterior = self._por_chave.get(chave)
+                if anterior is not None and not anterior.cancel() and anterior is self._em_execucao:
+                    self._db.conn.interrupt()
+                self._por_chave[chave] = future
+        self._fila.put((future, tarefa, chave))
+        return future
+
+    def encerrar(self):
+        self._fila.put(None)
+
+    def _executar(self):
+        self._db = DatabaseManager(self.db_name, **self.opcoes_conexao)
+        while True:
+            item = self._fila.get()
+            if item is None:
+                break
+            future, tarefa, chave = item
+            with self._lock:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self._em_execucao = future
+            try:
+                resultado = tarefa(self._db)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(resultado)
+            finally:
+                with self._lock:
+                    self._em_execucao = None
+                    if self._por_chave.get(chave) is future:
+                        del self._por_chave[chave]
+        self._db.conn.close()
+
+
+class EscritorAgrupado:
+    # Thread única de escrita com a própria conexão. As operações que chegam enquanto um lote está
+    # sendo gravado formam o lote seguinte, confirmado num único commit (group commit). Cada
+    # operação roda num savepoint, então a falha de uma não desfaz as outras do mesmo lote, e os
+    # Futures só são resolvidos depois do commit.
+    def __init__(self, db_name="financeiro.db", max_lote=500, **opcoes_conexao):
+        self.db_name = db_name
+        self.max_lote = max_lote
+        self.opcoes_conexao = opcoes_conexao
+        self.lotes = 0
+        self.operacoes = 0
+        self._fila = queue.Queue()
+        self._thread = threading.Thread(target=self._executar, name="escritor-agrupado", daemon=True)
+        self._thread.start()
+
+    def submeter(self, tarefa):
+        future = Future()
+        self._fila.put((future, tarefa))
+        return future
+
+    def encerrar(self):
+        self._fila.put(None)
+        self._thread.join()
+
+    def _proximo_lote(self):
+        item = self._fila.get()
+        if item is None:
+            return None
+        lote = [item]
+        while len(lote) < self.max_lote:
+            try:
+                item = self._fila.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Reenfileira o sinal de encerramento para depois deste lote
+                self._fila.put(None)
+                break
+            lote.append(item)
+        return lote
+
+    def _executar(self):
+        db = DatabaseManager(self.db_name, **self.opcoes_conexao)
+        while True:
+            lote = self._proximo_lote()
+            if lote is None:
+                break
+            resultados = []
+            try:
+                with db.transaction():
+                    for future, tarefa in lote:
+                        if not future.set_running_or_notify_cancel():
+                            continue
+                        try:
+                            with db.transaction():
+                                resultados.append((future, tarefa(db), None))
+                        except Exception as e:
+                            resultados.append((future, None, e))
+            except BaseException as e:
+                for future, _, erro in resultados:
+                    future.set_exception(erro or e)
+                continue
+            self.lotes += 1
+            self.operacoes += len(resultados)
+            for future, resultado, erro in resultados:
+                if erro is None:
+                    future.set_result(resultado)
+                else:
+                    future.set_exception(erro)
+        db.conn.close()
@@ -0,0 +1,81 @@
+import csv
+import importlib.util
+import os
+
+from .conversoes import formatar_valor
+
+TAMANHO_BLOCO_EXPORTACAO = 10000
+CABECALHO_CSV = ["Data", "Tipo", "Conta", "Valor", "Observações"]
+
+
+def pyarrow_disponivel():
+    # Verifica sem importar: o pyarrow só é carregado quando uma exportação colunar começa
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def linha_csv(row):
+    # Mantém o CSV no formato DD/MM/AAAA, como era antes da migração para ISO
+    return (f"{row[1][8:10]}/{row[1][5:7]}/{row[1][:4]}", row[2], row[3], formatar_valor(abs(row[4])), row[5])
+
+
+class _EscritorCSV:
+    def __init__(self, filename):
+        self.filename = filename
+
+    def __enter__(self):
+        self.csvfile = open(self.filename, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.csvfile)
+        self.writer.writerow(CABECALHO_CSV)
+        return self.escrever
+
+    def escrever(self, bloco):
+        self.writer.writerows(map(linha_csv, bloco))
+
+    def __exit__(self, *exc):
+        self.csvfile.close()
+
+
+class _EscritorArrow:
+    # Grava blocos de linhas como record batches, em Parquet ou no formato IPC do Arrow
+    def __init__(self, filename, parquet):
+        self.filename = filename
+        self.parquet = parquet
+
+    def __enter__(self):
+        import pyarrow.ipc
+        import pyarrow.parquet
+
+        self.pa = pa = pyarrow
+        self.schema = pa.schema([
+            ("id", pa.int64()),
+            ("data", pa.string()),
+            ("tipo", pa.string()),
+            ("conta", pa.string()),
+            ("valor_centavos", pa.int64()),
+            ("observacoes", pa.string()),
+        ])
+        if self.parquet:
+            self.writer = pa.parquet.ParquetWriter(self.filename, self.schema)
+        else:
+            self.writer = pa.ipc.new_file(self.filename, self.schema)
+        return self.escrever
+
+    def escrever(self, bloco):
+        pa = self.pa
+        colunas = [pa.array(coluna, type=campo.type) for coluna, campo in zip(zip(*bloco), self.schema)]
+        self.writer.write_batch(pa.record_batch(colunas, schema=self.schema))
+
+    def __exit__(self, *exc):
+        self.writer.close()
+
+
+def criar_escritor(filename, formato=None):
+    # O formato vem da extensão do arquivo quando não é informado
+    formato = formato or os.path.splitext(filename)[1].lower().lstrip(".") or "csv"
+    if formato == "csv":
+        return _EscritorCSV(filename)
+    if formato not in ("parquet", "arrow"):
+        raise ValueError(f"Formato de exportação não suportado: {formato}")
+    if not pyarrow_disponivel():
+        raise RuntimeError("A exportação em Parquet/Arrow requer o pacote pyarrow.")
+    return _EscritorArrow(filename, parquet=formato == "parquet")
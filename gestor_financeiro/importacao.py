@@ -0,0 +1,117 @@
+import csv
+import os
+import re
+
+TAMANHO_LOTE_IMPORTACAO = 5000
+MAX_ERROS_IMPORTACAO = 100
+
+# Cabeçalhos aceitos na importação de CSV, incluindo o formato gerado por exportar_csv
+COLUNAS_CSV = {
+    "data": "data",
+    "tipo": "tipo",
+    "conta": "conta",
+    "valor": "valor",
+    "observações": "observacoes",
+    "observacoes": "observacoes",
+    "detalhes": "observacoes",
+}
+
+
+def ler_csv(caminho):
+    # Lê o arquivo linha a linha, sem carregá-lo inteiro, gerando (número da linha, campos)
+    with open(caminho, newline="", encoding="utf-8-sig") as csvfile:
+        reader = csv.reader(csvfile)
+        cabecalho = next(reader, None)
+        if cabecalho is None:
+            return
+        colunas = [COLUNAS_CSV.get(nome.strip().lower()) for nome in cabecalho]
+        faltando = {"data", "tipo", "conta", "valor"} - set(colunas)
+        if faltando:
+            raise ValueError(f"Colunas ausentes no CSV: {', '.join(sorted(faltando))}")
+        for numero, row in enumerate(reader, start=2):
+            if not any(row):
+                continue
+            campos = {coluna: valor for coluna, valor in zip(colunas, row) if coluna}
+            campos.setdefault("observacoes", "")
+            yield numero, campos
+
+
+def ler_arquivo(caminho, conta=None):
+    # OFX pela extensão; qualquer outro arquivo é lido como CSV
+    if os.path.splitext(caminho)[1].lower() == ".ofx":
+        return ler_ofx(caminho, conta)
+    return ler_csv(caminho)
+
+
+def ler_ofx(caminho, conta=None):
+    # Extrai os blocos STMTTRN de extratos OFX 1.x (SGML, tags sem fechamento) ou 2.x (XML).
+    # Sem conta informada, usa o ACCTID do próprio extrato.
+    padrao_tag = re.compile(r"<(/?)([A-Z0-9.]+)>([^<\r\n]*)")
+    transacao = None
+    inicio_transacao = 0
+    conta_extrato = conta
+    with open(caminho, encoding="latin-1") as arquivo:
+        for numero, linha in enumerate(arquivo, start=1):
+            for fechamento, tag, texto in padrao_tag.findall(linha):
+                if tag == "STMTTRN":
+                    if not fechamento:
+                        transacao = {}
+                        inicio_transacao = numero
+                    elif transacao is not None:
+                        yield inicio_transacao, _campos_transacao_ofx(transacao, conta_extrato)
+                        transacao = None
+                elif not fechamento and texto.strip():
+                    if tag == "ACCTID" and conta_extrato is None:
+                        conta_extrato = texto.strip()
+                    elif transacao is not None:
+                        transacao[tag] = texto.strip()
+
+
+def _campos_transacao_ofx(transacao, conta):
+    data = transacao.get("DTPOSTED", "")[:8]
+    valor = transacao.get("TRNAMT", "").replace(",", ".")
+    return {
+        "data": f"{data[:4]}-{data[4:6]}-{data[6:8]}",
+        "tipo": "Saída" if valor.startswith("-") else "Entrada",
+        "conta": conta or "",
+        "valor": valor.lstrip("+-"),
+        "observacoes": transacao.get("MEMO") or transacao.get("NAME", ""),
+    }
+
+
+class ResultadoImportacao:
+    def __init__(self):
+        self.importadas = 0
+        self.rejeitadas = 0
+        self.duplicadas = 0
+        self.erros = []
+        # Linhas que repetem uma movimentação já existente (importadas ou não, conforme a opção)
+        self.linhas_duplicadas = []
+
+    def marcar_duplicada(self, linha):
+        self.duplicadas += 1
+        if len(self.linhas_duplicadas) < MAX_ERROS_IMPORTACAO:
+            self.linhas_duplicadas.append(linha)
+
+    def rejeitar(self, linha, motivo):
+        self.rejeitadas += 1
+        # Guarda só as primeiras mensagens para não acumular milhões de erros em memória
+        if len(self.erros) < MAX_ERROS_IMPORTACAO:
+            self.erros.append((linha, motivo))
+
+
+class ResultadoConciliacao:
+    def __init__(self):
+        # (linha do extrato, campos, id da movimentação, diferença em dias, diferença em centavos)
+        self.conciliadas = []
+        # (linha do extrato, campos) sem movimentação correspondente
+        self.pendentes = []
+        # Movimentações do período e das contas do extrato que nenhuma linha dele cobriu
+        self.sem_extrato = []
+        self.rejeitadas = 0
+        self.erros = []
+
+    def rejeitar(self, linha, motivo):
+        self.rejeitadas += 1
+        if len(self.erros) < MAX_ERROS_IMPORTACAO:
+            self.erros.append((linha, motivo))
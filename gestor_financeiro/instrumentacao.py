@@ -0,0 +1,123 @@
+from collections import deque
+import logging
+import re
+import sqlite3
+import threading
+
+LIMIAR_LENTO_MS = 100
+# Limites superiores (ms) das faixas do histograma de latência; a última faixa é aberta
+FAIXAS_MS = (1, 5, 10, 50, 100, 500, 1000)
+MAX_CONSULTAS_LENTAS = 100
+
+logger = logging.getLogger("gestor_financeiro.consultas")
+
+_ESPACOS = re.compile(r"\s+")
+_SEM_PLANO = ("PRAGMA", "BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE", "CREATE", "DROP", "ALTER")
+
+
+class EstatisticaComando:
+    def __init__(self):
+        self.chamadas = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.linhas = 0
+        self.histograma = [0] * (len(FAIXAS_MS) + 1)
+        self.lentas = 0
+
+    def registrar(self, duracao_ms, linhas):
+        self.chamadas += 1
+        self.total_ms += duracao_ms
+        self.max_ms = max(self.max_ms, duracao_ms)
+        self.linhas += max(linhas, 0)
+        faixa = 0
+        while faixa < len(FAIXAS_MS) and duracao_ms > FAIXAS_MS[faixa]:
+            faixa += 1
+        self.histograma[faixa] += 1
+
+    def como_dict(self):
+        return {
+            "chamadas": self.chamadas,
+            "total_ms": round(self.total_ms, 3),
+            "media_ms": round(self.total_ms / self.chamadas, 3) if self.chamadas else 0,
+            "max_ms": round(self.max_ms, 3),
+            "linhas": self.linhas,
+            "lentas": self.lentas,
+            "histograma": dict(zip([f"<={limite}ms" for limite in FAIXAS_MS] + [f">{FAIXAS_MS[-1]}ms"], self.histograma)),
+        }
+
+
+class Instrumentacao:
+    # Coletor opcional passado ao DatabaseManager (e compartilhável entre conexões/threads).
+    # Agrupa as estatísticas pelo texto do comando com os espaços normalizados; comandos acima do
+    # limiar são registrados no log junto com o EXPLAIN QUERY PLAN, onde aparecem os "SCAN" sem índice.
+    def __init__(self, limiar_lento_ms=LIMIAR_LENTO_MS, max_consultas_lentas=MAX_CONSULTAS_LENTAS):
+        self.limiar_lento_ms = limiar_lento_ms
+        self.estatisticas = {}
+        self.lentas = deque(maxlen=max_consultas_lentas)
+        self._lock = threading.Lock()
+
+    def registrar(self, conn, query, params, duracao, linhas):
+        comando = _ESPACOS.sub(" ", query).strip()
+        duracao_ms = duracao * 1000
+        lenta = duracao_ms >= self.limiar_lento_ms
+        plano = self._plano(conn, comando, params) if lenta else None
+        with self._lock:
+            estatistica = self.estatisticas.get(comando)
+            if estatistica is None:
+                estatistica = self.estatisticas[comando] = EstatisticaComando()
+            estatistica.registrar(duracao_ms, linhas)
+            if lenta:
+                estatistica.lentas += 1
+                self.lentas.append((comando, round(duracao_ms, 3), linhas, plano))
+        if lenta:
+            logger.warning("consulta lenta (%.1f ms, %d linhas): %s\n%s", duracao_ms, linhas, comando,
+                           "\n".join(plano or ["(sem plano)"]))
+
+    @staticmethod
+    def _plano(conn, comando, params):
+        if comando.upper().startswith(_SEM_PLANO):
+            return None
+        try:
+            linhas = conn.execute("EXPLAIN QUERY PLAN " + comando, params).fetchall()
+        except sqlite3.Error:
+            return None
+        # Cada linha é (id, pai, não usado, detalhe); a indentação reproduz a árvore do plano
+        profundidade = {0: 0}
+        plano = []
+        for id_, pai, _, detalhe in linhas:
+            profundidade[id_] = profundidade.get(pai, 0) + 1
+            plano.append("  " * profundidade[id_] + detalhe)
+        return plano
+
+    def limpar(self):
+        with self._lock:
+            self.estatisticas.clear()
+            self.lentas.clear()
+
+    def relatorio(self):
+        with self._lock:
+            comandos = sorted(self.estatisticas.items(), key=lambda item: item[1].total_ms, reverse=True)
+            return {
+                "limiar_lento_ms": self.limiar_lento_ms,
+                "comandos": [{"sql": comando, **estatistica.como_dict()} for comando, estatistica in comandos],
+                "lentas": [
+                    {"sql": comando, "duracao_ms": duracao, "linhas": linhas, "plano": plano}
+                    for comando, duracao, linhas, plano in self.lentas
+                ],
+            }
+
+    def formatar(self, limite=20):
+        relatorio = self.relatorio()
+        linhas = [f"{'chamadas':>9} {'total ms':>10} {'média ms':>9} {'máx ms':>9} {'linhas':>9}  comando"]
+        for item in relatorio["comandos"][:limite]:
+            linhas.append(f"{item['chamadas']:>9} {item['total_ms']:>10.1f} {item['media_ms']:>9.2f} "
+                          f"{item['max_ms']:>9.1f} {item['linhas']:>9}  {item['sql'][:120]}")
+            linhas.append(" " * 11 + "  ".join(f"{faixa}: {quantidade}" for faixa, quantidade
+                                              in item["histograma"].items() if quantidade))
+        if relatorio["lentas"]:
+            linhas.append("")
+            linhas.append(f"Consultas acima de {relatorio['limiar_lento_ms']} ms (mais recentes por último):")
+            for item in relatorio["lentas"]:
+                linhas.append(f"{item['duracao_ms']:>10.1f} ms  {item['sql'][:120]}")
+                linhas.extend(" " * 14 + passo for passo in item["plano"] or [])
+        return "\n".join(linhas)
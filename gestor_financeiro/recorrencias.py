@@ -0,0 +1,38 @@
+import calendar
+from datetime import date, timedelta
+
+FREQUENCIAS = ("diaria", "semanal", "mensal")
+
+
+def _somar_meses(inicio, meses):
+    # O dia de início é mantido quando existe no mês; senão usa o último dia (31/01 -> 28/02 -> 31/03)
+    total = inicio.month - 1 + meses
+    ano, mes = inicio.year + total // 12, total % 12 + 1
+    return date(ano, mes, min(inicio.day, calendar.monthrange(ano, mes)[1]))
+
+
+def gerar_ocorrencias(frequencia, intervalo, inicio, fim, apos=None):
+    # Datas ISO das ocorrências entre inicio e fim (inclusive), a cada `intervalo` dias, semanas ou
+    # meses. Com apos, só as posteriores a essa data. Cada ocorrência é calculada a partir do
+    # início, e não da anterior, para que o ajuste de fim de mês não se acumule.
+    if frequencia not in FREQUENCIAS:
+        raise ValueError(f"Frequência inválida: {frequencia!r}. Use {', '.join(FREQUENCIAS)}.")
+    if intervalo < 1:
+        raise ValueError("O intervalo deve ser de pelo menos 1.")
+    inicio, fim = date.fromisoformat(inicio), date.fromisoformat(fim)
+    apos = date.fromisoformat(apos) if apos else None
+    passo = 0
+    if apos is not None and apos >= inicio and frequencia != "mensal":
+        # Pula direto para a primeira ocorrência depois de apos
+        dias = 7 * intervalo if frequencia == "semanal" else intervalo
+        passo = (apos - inicio).days // dias
+    while True:
+        if frequencia == "mensal":
+            ocorrencia = _somar_meses(inicio, passo * intervalo)
+        else:
+            ocorrencia = inicio + timedelta(days=passo * intervalo * (7 if frequencia == "semanal" else 1))
+        if ocorrencia > fim:
+            return
+        if apos is None or ocorrencia > apos:
+            yield ocorrencia.isoformat()
+        passo += 1
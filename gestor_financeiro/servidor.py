@@ -0,0 +1,300 @@
+import asyncio
+import csv
+from http import HTTPStatus
+import io
+from itertools import cycle, islice
+import json
+import logging
+from urllib.parse import parse_qsl, urlsplit
+
+from .banco import TAMANHO_PAGINA, DatabaseManager
+from .conversoes import converter_valor, formatar_valor, validar_campos
+from .erros import ErroBancoDados
+from .executor import EscritorAgrupado, ExecutorConsultas
+from .exportacao import CABECALHO_CSV, TAMANHO_BLOCO_EXPORTACAO, linha_csv
+
+LEITORES_PADRAO = 4
+MAX_LOTE_ESCRITA = 500
+LIMITE_PAGINA_MAXIMO = 1000
+TAMANHO_MAXIMO_CORPO = 1 << 20
+FILTROS = ("data_inicio", "data_fim", "tipo", "conta", "busca")
+
+logger = logging.getLogger("gestor_financeiro.servidor")
+
+
+class ErroHTTP(Exception):
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+
+
+def _movimentacao_json(row):
+    mov_id, data, tipo, conta, centavos, observacoes = row
+    return {
+        "id": mov_id, "data": data, "tipo": tipo, "conta": conta,
+        "valor_centavos": centavos, "valor": formatar_valor(abs(centavos)), "observacoes": observacoes,
+    }
+
+
+def _campos_movimentacao(corpo):
+    try:
+        dados = json.loads(corpo or b"null")
+    except ValueError:
+        raise ErroHTTP(400, "corpo JSON inválido") from None
+    if not isinstance(dados, dict):
+        raise ErroHTTP(400, "o corpo deve ser um objeto JSON")
+    for campo in ("data", "tipo", "conta", "valor"):
+        if campo not in dados:
+            raise ErroHTTP(400, f"campo obrigatório ausente: {campo}")
+    if dados.get("observacoes") is None:
+        dados["observacoes"] = ""
+    # Os valores seguem direto para o SQLite, que recusa listas e objetos com um erro próprio
+    for campo in ("data", "tipo", "conta", "observacoes"):
+        if not isinstance(dados[campo], str):
+            raise ErroHTTP(400, f"{campo} deve ser um texto")
+    if isinstance(dados["valor"], bool) or not isinstance(dados["valor"], (str, int, float)):
+        raise ErroHTTP(400, "valor deve ser um número ou um texto")
+    campos = {
+        "data": dados["data"],
+        "tipo": dados["tipo"],
+        "conta": dados["conta"],
+        "valor": converter_valor(str(dados["valor"])),
+        "observacoes": dados["observacoes"],
+    }
+    validar_campos(**campos)
+    return campos
+
+
+def _filtros(consulta):
+    filtros = {campo: consulta[campo] for campo in FILTROS if consulta.get(campo)}
+    if ("data_inicio" in filtros) != ("data_fim" in filtros):
+        raise ErroHTTP(400, "informe data_inicio e data_fim juntos")
+    return filtros or None
+
+
+def _inteiro(consulta, campo, padrao=None):
+    if campo not in consulta:
+        return padrao
+    try:
+        return int(consulta[campo])
+    except ValueError:
+        raise ErroHTTP(400, f"{campo} deve ser um número inteiro") from None
+
+
+class ServidorAPI:
+    # API HTTP/JSON local. As leituras são distribuídas entre várias conexões (uma thread cada, ver
+    # ExecutorConsultas) e todas as escritas passam por um único EscritorAgrupado, que confirma as
+    # operações simultâneas num só commit. Em WAL os leitores não esperam pelo escritor.
+    def __init__(self, db_name="financeiro.db", leitores=LEITORES_PADRAO, max_lote=MAX_LOTE_ESCRITA, **opcoes_conexao):
+        # Aplica as migrações antes de abrir as demais conexões
+        DatabaseManager(db_name, **opcoes_conexao).conn.close()
+        self.leitores = [ExecutorConsultas(db_name, **opcoes_conexao) for _ in range(leitores)]
+        self._proximo_leitor = cycle(self.leitores)
+        self.escritor = EscritorAgrupado(db_name, max_lote=max_lote, **opcoes_conexao)
+        self.servidor = None
+
+    async def iniciar(self, host="127.0.0.1", port=8000):
+        self.servidor = await asyncio.start_server(self._atender, host, port)
+        return self.servidor
+
+    async def encerrar(self):
+        if self.servidor is not None:
+            self.servidor.close()
+            await self.servidor.wait_closed()
+        for leitor in self.leitores:
+            leitor.encerrar()
+        await asyncio.to_thread(self.escritor.encerrar)
+
+    async def _ler(self, tarefa, leitor=None):
+        return await asyncio.wrap_future((leitor or next(self._proximo_leitor)).submeter(tarefa))
+
+    async def _escrever(self, tarefa):
+        return await asyncio.wrap_future(self.escritor.submeter(tarefa))
+
+    async def _atender(self, reader, writer):
+        try:
+            while True:
+                try:
+                    requisicao = await self._ler_requisicao(reader)
+                except ErroHTTP as e:
+                    await self._responder(writer, e.status, {"erro": str(e)}, fechar=True)
+                    break
+                if requisicao is None:
+                    break
+                metodo, caminho, consulta, cabecalhos, corpo = requisicao
+                fechar = cabecalhos.get("connection", "").lower() == "close"
+                try:
+                    await self._despachar(writer, metodo, caminho, consulta, corpo, fechar)
+                except ErroHTTP as e:
+                    await self._responder(writer, e.status, {"erro": str(e)}, fechar)
+                except ValueError as e:
+                    await self._responder(writer, 400, {"erro": str(e)}, fechar)
+                except ErroBancoDados as e:
+                    await self._responder(writer, 409, {"erro": str(e)}, fechar)
+                except Exception:
+                    # Sem isto a conexão ficaria sem resposta; o estado dela é incerto, então é fechada
+                    logger.exception("erro ao atender %s %s", metodo, caminho)
+                    await self._responder(writer, 500, {"erro": "erro interno do servidor"}, fechar=True)
+                    break
+                if fechar:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _ler_requisicao(self, reader):
+        linha = await reader.readline()
+        if not linha.strip():
+            return None
+        try:
+            metodo, alvo, _ = linha.decode("latin-1").split()
+        except ValueError:
+            raise ErroHTTP(400, "linha de requisição inválida") from None
+        cabecalhos = {}
+        while True:
+            linha = await reader.readline()
+            if linha in (b"\r\n", b"\n", b""):
+                break
+            nome, _, valor = linha.decode("latin-1").partition(":")
+            cabecalhos[nome.strip().lower()] = valor.strip()
+        try:
+            tamanho = int(cabecalhos.get("content-length", 0))
+        except ValueError:
+            raise ErroHTTP(400, "Content-Length inválido") from None
+        if tamanho > TAMANHO_MAXIMO_CORPO:
+            raise ErroHTTP(413, "corpo da requisição muito grande")
+        corpo = await reader.readexactly(tamanho) if tamanho else b""
+        url = urlsplit(alvo)
+        return metodo.upper(), url.path, dict(parse_qsl(url.query)), cabecalhos, corpo
+
+    async def _despachar(self, writer, metodo, caminho, consulta, corpo, fechar):
+        partes = caminho.strip("/").split("/")
+        if partes == ["movimentacoes"]:
+            if metodo == "GET":
+                return await self._responder(writer, 200, await self._listar(consulta), fechar)
+            if metodo == "POST":
+                campos = _campos_movimentacao(corpo)
+                mov_id = await self._escrever(lambda db: db.adicionar_movimentacao(**campos))
+                return await self._responder(writer, 201, {"id": mov_id}, fechar)
+        elif len(partes) == 2 and partes[0] == "movimentacoes" and partes[1].isdigit():
+            mov_id = int(partes[1])
+            if metodo == "PUT":
+                campos = _campos_movimentacao(corpo)
+                if not await self._escrever(lambda db: db.editar_movimentacao(mov_id, **campos)):
+                    raise ErroHTTP(404, "movimentação não encontrada")
+                return await self._responder(writer, 200, {"id": mov_id}, fechar)
+            if metodo == "DELETE":
+                if not await self._escrever(lambda db: db.excluir_movimentacao(mov_id)):
+                    raise ErroHTTP(404, "movimentação não encontrada")
+                return await self._responder(writer, 204, None, fechar)
+        elif partes == ["saldos"]:
+            if metodo == "GET":
+                return await self._responder(writer, 200, await self._saldos(), fechar)
+        elif partes == ["exportar"]:
+            if metodo == "GET":
+                return await self._exportar(writer, consulta)
+        else:
+            raise ErroHTTP(404, "recurso não encontrado")
+        raise ErroHTTP(405, "método não permitido")
+
+    async def _listar(self, consulta):
+        filtros = _filtros(consulta)
+        apos_id = _inteiro(consulta, "apos_id")
+        antes_id = _inteiro(consulta, "antes_id")
+        limite = min(max(_inteiro(consulta, "limite", TAMANHO_PAGINA), 1), LIMITE_PAGINA_MAXIMO)
+        linhas = await self._ler(lambda db: db.buscar_pagina_movimentacoes(filtros, apos_id, antes_id, limite))
+        return {
+            "movimentacoes": [_movimentacao_json(row) for row in linhas],
+            # Para a próxima página, repita a consulta com apos_id igual a este valor
+            "proximo": linhas[-1][0] if len(linhas) == limite else None,
+        }
+
+    async def _saldos(self):
+        saldos, total = await self._ler(lambda db: (db.buscar_saldos(), db.calcular_saldo()))
+        return {
+            "contas": [{"conta": conta, "saldo_centavos": centavos, "saldo": formatar_valor(centavos)}
+                       for conta, centavos in saldos],
+            "total_centavos": total,
+            "total": formatar_valor(total),
+        }
+
+    async def _exportar(self, writer, consulta):
+        # Resposta em chunks: cada bloco é lido do cursor na thread do leitor e só o próximo é
+        # pedido depois que o cliente consumiu o anterior (drain), então a memória fica constante
+        formato = consulta.get("formato", "csv")
+        if formato not in ("csv", "ndjson"):
+            raise ErroHTTP(400, "formato deve ser csv ou ndjson")
+        filtros = _filtros(consulta)
+        leitor = next(self._proximo_leitor)
+
+        def abrir(db):
+            # Os filtros só são validados (e os arquivos de anos anexados) quando o gerador começa a
+            # rodar: o primeiro bloco é lido antes dos cabeçalhos para que esses erros ainda possam
+            # virar uma resposta 400/409 normal
+            iterador = db.iterar_movimentacoes(filtros)
+            try:
+                return iterador, list(islice(iterador, TAMANHO_BLOCO_EXPORTACAO))
+            except BaseException:
+                iterador.close()
+                raise
+
+        iterador, bloco = await self._ler(abrir, leitor)
+        tipo = "text/csv; charset=utf-8" if formato == "csv" else "application/x-ndjson"
+        writer.write(
+            f"HTTP/1.1 200 OK\r\nContent-Type: {tipo}\r\nTransfer-Encoding: chunked\r\n"
+            f"Content-Disposition: attachment; filename=movimentacoes.{formato}\r\n\r\n".encode()
+        )
+        try:
+            primeiro = True
+            while bloco:
+                if formato == "csv":
+                    texto = io.StringIO()
+                    escritor = csv.writer(texto)
+                    if primeiro:
+                        escritor.writerow(CABECALHO_CSV)
+                    escritor.writerows(map(linha_csv, bloco))
+                    dados = texto.getvalue().encode("utf-8")
+                else:
+                    dados = "".join(json.dumps(_movimentacao_json(row), ensure_ascii=False) + "\n"
+                                    for row in bloco).encode("utf-8")
+                primeiro = False
+                writer.write(f"{len(dados):X}\r\n".encode() + dados + b"\r\n")
+                await writer.drain()
+                bloco = await self._ler(lambda db: list(islice(iterador, TAMANHO_BLOCO_EXPORTACAO)), leitor)
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        except ConnectionError:
+            raise
+        except Exception as e:
+            # O 200 já foi enviado: outra resposta no meio do corpo corromperia a conexão. Ela é
+            # derrubada sem o chunk final, e o cliente vê a transferência incompleta.
+            logger.exception("exportação interrompida")
+            writer.transport.abort()
+            raise ConnectionAbortedError("exportação interrompida") from e
+        finally:
+            # O gerador pertence à conexão do leitor e precisa ser fechado na thread dele
+            leitor.submeter(lambda db: iterador.close())
+
+    async def _responder(self, writer, status, dados, fechar=False):
+        corpo = b"" if dados is None else json.dumps(dados, ensure_ascii=False).encode("utf-8")
+        cabecalhos = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}", f"Content-Length: {len(corpo)}"]
+        if dados is not None:
+            cabecalhos.append("Content-Type: application/json; charset=utf-8")
+        if fechar:
+            cabecalhos.append("Connection: close")
+        writer.write(("\r\n".join(cabecalhos) + "\r\n\r\n").encode() + corpo)
+        await writer.drain()
+
+
+def servir(db_name="financeiro.db", host="127.0.0.1", port=8000, leitores=LEITORES_PADRAO):
+    async def executar():
+        api = ServidorAPI(db_name, leitores)
+        servidor = await api.iniciar(host, port)
+        try:
+            async with servidor:
+                await servidor.serve_forever()
+        finally:
+            await api.encerrar()
+
+    asyncio.run(executar())
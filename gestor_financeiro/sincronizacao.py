@@ -0,0 +1,78 @@
+import json
+import os
+import re
+
+FORMATO_ALTERACOES = "gestor_financeiro.alteracoes"
+# Na versão 1 as movimentações eram identificadas só pelo id; ver ler_alteracoes
+VERSAO_ALTERACOES = 2
+# Páginas copiadas por passo no backup online; entre um passo e outro as escritas seguem normalmente
+PAGINAS_POR_PASSO_BACKUP = 1024
+
+# Nomes dos arquivos de backup: financeiro-20240105-230000-123456.db (cópia completa) e
+# financeiro-20240106-230000-123456-alteracoes.ndjson (alterações desde o backup anterior)
+_COPIA_COMPLETA = re.compile(r"^(.+)-(\d{8}-\d{6}-\d{6})\.db$")
+_COPIA_INCREMENTAL = re.compile(r"^(.+)-(\d{8}-\d{6}-\d{6})-alteracoes\.ndjson$")
+
+
+def escrever_alteracoes(caminho, instancia, linhas):
+    # NDJSON: um cabeçalho e depois uma alteração por linha, na ordem em que aconteceram. As linhas
+    # já chegam como texto JSON montado pelo SQLite (ver DatabaseManager.exportar_alteracoes).
+    # O arquivo só aparece com o nome final depois de gravado por inteiro.
+    temporario = caminho + ".tmp"
+    quantidade = 0
+    try:
+        with open(temporario, "w", encoding="utf-8") as arquivo:
+            arquivo.write(json.dumps({"formato": FORMATO_ALTERACOES, "versao": VERSAO_ALTERACOES,
+                                      "instancia": instancia}) + "\n")
+            for (linha,) in linhas:
+                arquivo.write(linha + "\n")
+                quantidade += 1
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+    return quantidade
+
+
+def ler_alteracoes(caminho):
+    # Gera as alterações de um arquivo gravado por escrever_alteracoes, sem carregá-lo inteiro
+    with open(caminho, encoding="utf-8") as arquivo:
+        try:
+            cabecalho = json.loads(next(arquivo, "") or "null")
+        except ValueError:
+            cabecalho = None
+        if not isinstance(cabecalho, dict) or cabecalho.get("formato") != FORMATO_ALTERACOES:
+            raise ValueError(f"{caminho} não é um arquivo de alterações.")
+        versao = cabecalho.get("versao")
+        if versao not in (1, VERSAO_ALTERACOES):
+            raise ValueError(f"Versão do arquivo de alterações não suportada: {versao}")
+        for numero, linha in enumerate(arquivo, start=2):
+            if not linha.strip():
+                continue
+            try:
+                alteracao = json.loads(linha)
+            except ValueError:
+                raise ValueError(f"Linha {numero} inválida em {caminho}.") from None
+            if versao == 1 and alteracao.get("tabela") == "movimentacoes":
+                # O id era o mesmo em todas as instâncias: a chave é a instância de origem e esse id
+                dados = alteracao["dados"]
+                dados["origem"], dados["origem_id"] = alteracao["origem"], dados.pop("id")
+            yield alteracao
+
+
+def copias_da_pasta(pasta):
+    # (carimbo, caminho) da cópia completa mais recente e das alterações gravadas depois dela,
+    # em ordem cronológica; os carimbos têm largura fixa, então a ordem do texto é a do tempo
+    completas = {}
+    incrementais = {}
+    for nome in os.listdir(pasta):
+        for padrao, destino in ((_COPIA_COMPLETA, completas), (_COPIA_INCREMENTAL, incrementais)):
+            encontrado = padrao.match(nome)
+            if encontrado:
+                destino[encontrado.group(2)] = (encontrado.group(1), os.path.join(pasta, nome))
+    if not completas:
+        raise ValueError(f"Nenhuma cópia completa em {pasta}.")
+    carimbo = max(completas)
+    base, caminho = completas[carimbo]
+    return caminho, [incrementais[c][1] for c in sorted(incrementais) if c > carimbo and incrementais[c][0] == base]
@@ -1,112 +1,180 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
-try:
-    from tkcalendar import Calendar, DateEntry
-except ImportError:
-    import subprocess
-    import sys
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "tkcalendar"])
-    from tkcalendar import Calendar, DateEntry
+from tkinter import ttk, messagebox, filedialog, simpledialog
 from datetime import datetime
-import sqlite3
-import csv
-
-class DatabaseManager:
-    def __init__(self, db_name="financeiro.db"):
-        self.conn = sqlite3.connect(db_name)
-        self.cursor = self.conn.cursor()
-        self._initialize_database()
-
-    def _initialize_database(self):
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS movimentacoes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                data TEXT NOT NULL,
-                tipo TEXT NOT NULL,
-                conta TEXT NOT NULL,
-                valor REAL NOT NULL,
-                observacoes TEXT
-            )
-        ''')
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS contas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome TEXT NOT NULL
-            )
-        ''')
-        self.conn.commit()
-
-    def execute_query(self, query, params=()):
-        try:
-            self.cursor.execute(query, params)
-            self.conn.commit()
-        except sqlite3.Error as e:
-            messagebox.showerror("Erro no Banco de Dados", str(e))
-
-    def fetch_all(self, query, params=()):
-        self.cursor.execute(query, params)
-        return self.cursor.fetchall()
+import json
+import logging
+import os
+import threading
+import time
+
+from gestor_financeiro import (
+    FREQUENCIAS,
+    DatabaseManager,
+    ErroBancoDados,
+    ExecutorConsultas,
+    ExportacaoCancelada,
+    Instrumentacao,
+    converter_data_para_exibicao,
+    converter_valor,
+    formatar_valor,
+    pyarrow_disponivel,
+    validar_campos,
+)
+from gestor_financeiro.banco import TAMANHO_PAGINA
+
+INTERVALO_VERIFICACAO_MS = 20
+# Com esta variável de ambiente definida os comandos SQL e a abertura da janela são medidos e F12
+# abre as estatísticas
+VARIAVEL_INSTRUMENTACAO = "GESTOR_FINANCEIRO_INSTRUMENTAR"
+INICIO_PROCESSO = time.perf_counter()
+
+logger = logging.getLogger("gestor_financeiro.interface")
+
+
+class _CampoData(ttk.Entry):
+    # Usado no lugar do DateEntry quando o tkcalendar não está instalado: a data é digitada como
+    # DD/MM/AAAA, com o mesmo get/set_date que os diálogos usam
+    def __init__(self, master):
+        super().__init__(master, width=12)
+        self.set_date(datetime.now())
+
+    def set_date(self, data):
+        self.delete(0, tk.END)
+        self.insert(0, data.strftime("%d/%m/%Y"))
+
+
+def _campo_data(master):
+    # O tkcalendar só é carregado quando o primeiro diálogo com data é aberto
+    try:
+        from tkcalendar import DateEntry
+    except ImportError:
+        return _CampoData(master)
+    return DateEntry(master, date_pattern='dd/mm/yyyy')
+
+
+def _caminho_resumo_salvo(db_name):
+    return os.path.splitext(db_name)[0] + "-resumo.json"
+
+
+def _ler_resumo_salvo(db_name):
+    # Saldos da última sessão, exibidos enquanto os atuais são buscados em segundo plano
+    try:
+        with open(_caminho_resumo_salvo(db_name), encoding="utf-8") as arquivo:
+            dados = json.load(arquivo)
+        return [tuple(item) for item in dados["saldos"]], dados["total"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _salvar_resumo(db_name, resumo):
+    saldos, total = resumo
+    caminho = _caminho_resumo_salvo(db_name)
+    try:
+        with open(caminho + ".tmp", "w", encoding="utf-8") as arquivo:
+            json.dump({"saldos": saldos, "total": total}, arquivo, ensure_ascii=False)
+        os.replace(caminho + ".tmp", caminho)
+    except OSError as e:
+        logger.warning("não foi possível salvar o resumo em %s: %s", caminho, e)
+
+
+class GradeVirtual:
+    # Treeview que mantém apenas uma janela de linhas ao redor da área visível. Novas páginas são
+    # buscadas por id conforme a rolagem se aproxima das bordas e as mais distantes são descartadas.
+    def __init__(self, master, columns, buscar_pagina, formatar_linha=None,
+                 tamanho_pagina=TAMANHO_PAGINA, paginas_em_memoria=3):
+        self.buscar_pagina = buscar_pagina
+        self.formatar_linha = formatar_linha or (lambda row: row)
+        self.tamanho_pagina = tamanho_pagina
+        self.max_linhas = tamanho_pagina * paginas_em_memoria
+        self._inicio_alcancado = True
+        self._fim_alcancado = True
+        self._carregamento_agendado = False
+
+        self.frame = ttk.Frame(master)
+        self.tree = ttk.Treeview(self.frame, columns=columns, show="headings")
+        self.scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self._ao_rolar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.tree.pack(side="left", fill="both", expand=True)
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def recarregar(self, manter_posicao=False):
+        children = self.tree.get_children()
+        apos_id = int(children[0]) - 1 if manter_posicao and children else None
+        self.exibir_pagina_inicial(self.buscar_pagina(apos_id=apos_id, limite=self.tamanho_pagina), apos_id)
+
+    def exibir_pagina_inicial(self, linhas, apos_id=None):
+        # Substitui o conteúdo pela primeira página, que pode ter sido buscada em segundo plano
+        selecao = self.tree.selection()
+        self.tree.delete(*self.tree.get_children())
+        self._inserir(linhas, "end")
+        self._inicio_alcancado = apos_id is None
+        self._fim_alcancado = len(linhas) < self.tamanho_pagina
+        self.tree.selection_set([iid for iid in selecao if self.tree.exists(iid)])
+
+    def _inserir(self, linhas, posicao):
+        for row in (linhas if posicao == "end" else reversed(linhas)):
+            self.tree.insert("", posicao, iid=str(row[0]), values=self.formatar_linha(row))
+
+    def _ao_rolar(self, primeiro, ultimo):
+        self.scrollbar.set(primeiro, ultimo)
+        if self._carregamento_agendado:
+            return
+        if float(ultimo) >= 0.9 and not self._fim_alcancado:
+            self._carregamento_agendado = True
+            self.tree.after_idle(self._carregar_proxima)
+        elif float(primeiro) <= 0.1 and not self._inicio_alcancado:
+            self._carregamento_agendado = True
+            self.tree.after_idle(self._carregar_anterior)
+
+    def _carregar_proxima(self):
+        self._carregamento_agendado = False
+        children = self.tree.get_children()
+        if not children:
+            return
+        linhas = self.buscar_pagina(apos_id=int(children[-1]), limite=self.tamanho_pagina)
+        self._fim_alcancado = len(linhas) < self.tamanho_pagina
+        self._inserir(linhas, "end")
+        self._descartar_excesso(do_inicio=True)
+
+    def _carregar_anterior(self):
+        self._carregamento_agendado = False
+        children = self.tree.get_children()
+        if not children:
+            return
+        primeiro_visivel = self.tree.yview()[0] * len(children)
+        linhas = self.buscar_pagina(antes_id=int(children[0]), limite=self.tamanho_pagina)
+        self._inicio_alcancado = len(linhas) < self.tamanho_pagina
+        self._inserir(linhas, 0)
+        # Mantém na tela as mesmas linhas que estavam visíveis antes da inserção
+        self.tree.yview_moveto((primeiro_visivel + len(linhas)) / len(self.tree.get_children()))
+        self._descartar_excesso(do_inicio=False)
+
+    def _descartar_excesso(self, do_inicio):
+        children = self.tree.get_children()
+        excesso = len(children) - self.max_linhas
+        if excesso <= 0:
+            return
+        if do_inicio:
+            primeiro_visivel = self.tree.yview()[0] * len(children)
+            self.tree.delete(*children[:excesso])
+            self.tree.yview_moveto(max(primeiro_visivel - excesso, 0) / self.max_linhas)
+            self._inicio_alcancado = False
+        else:
+            self.tree.delete(*children[-excesso:])
+            self._fim_alcancado = False
 
-    def adicionar_movimentacao(self, **kwargs):
-        # Validar formato da data antes de inserir
-        try:
-            datetime.strptime(kwargs['data'], "%d/%m/%Y")
-        except ValueError:
-            raise ValueError("Formato de data inválido. Use DD/MM/AAAA")
-        query = '''INSERT INTO movimentacoes (data, tipo, conta, valor, observacoes)
-                   VALUES (:data, :tipo, :conta, :valor, :observacoes)'''
-        self.execute_query(query, kwargs)
-
-    def editar_movimentacao(self, id, **kwargs):
-        query = '''UPDATE movimentacoes
-                   SET data=:data, tipo=:tipo, conta=:conta, valor=:valor, observacoes=:observacoes
-                   WHERE id=:id'''
-        self.execute_query(query, {**kwargs, "id": id})
-
-    def excluir_movimentacao(self, id):
-        query = 'DELETE FROM movimentacoes WHERE id=?'
-        self.execute_query(query, (id,))
-
-    def buscar_movimentacoes(self, filtro=None):
-        if filtro:
-            return self.fetch_all('SELECT * FROM movimentacoes WHERE conta=?', (filtro,))
-        return self.fetch_all('SELECT * FROM movimentacoes')
-
-    def buscar_contas(self):
-        return self.fetch_all('SELECT nome FROM contas')
-
-    def adicionar_conta(self, nome):
-        query = 'INSERT INTO contas (nome) VALUES (?)'
-        self.execute_query(query, (nome,))
-
-    def excluir_conta(self, nome):
-        query = 'DELETE FROM contas WHERE nome=?'
-        self.execute_query(query, (nome,))
-
-    def calcular_total(self, tipo):
-        query = f'SELECT SUM(valor) FROM movimentacoes WHERE tipo=?'
-        result = self.fetch_all(query, (tipo,))
-        return result[0][0] or 0.0
-
-    def calcular_saldo(self):
-        entradas = self.calcular_total("Entrada")
-        saidas = self.calcular_total("Saída")
-        return entradas - saidas
-
-    def exportar_csv(self, filename="movimentacoes.csv"):
-        try:
-            data = self.fetch_all('SELECT data, tipo, conta, valor, observacoes FROM movimentacoes')
-            with open(filename, "w", newline="", encoding="utf-8") as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow(["Data", "Tipo", "Conta", "Valor", "Observações"])
-                writer.writerows(data)
-            messagebox.showinfo("Exportação", f"Dados exportados com sucesso para {filename}")
-        except Exception as e:
-            messagebox.showerror("Erro na Exportação", str(e))
 
 class UIManager:
-    def __init__(self, root):
-        self.db_manager = DatabaseManager()
+    def __init__(self, root, db_name="financeiro.db"):
+        self.instrumentacao = Instrumentacao() if os.environ.get(VARIAVEL_INSTRUMENTACAO) else None
+        self.db_manager = DatabaseManager(db_name, instrumentacao=self.instrumentacao)
+        self.executor = ExecutorConsultas(db_name, instrumentacao=self.instrumentacao)
+        self._tarefas_atuais = {}
+        self.tempos_inicializacao = []
+        self._primeiro_resumo = True
         self.root = root
         self.root.title("Gestão Financeira")
         self.root.geometry("900x700")
@@ -153,14 +221,71 @@ class UIManager:
 
         self.frame_resumo = ttk.Frame(self.notebook)
         self.frame_movimentacao = ttk.Frame(self.notebook)
+        self.frame_relatorios = ttk.Frame(self.notebook)
 
         self.notebook.add(self.frame_resumo, text="Resumo Financeiro")
         self.notebook.add(self.frame_movimentacao, text="Movimentação")
-
+        self.notebook.add(self.frame_relatorios, text="Relatórios")
+
+        # Só o resumo é montado agora; as outras abas são construídas (e consultam o banco) na
+        # primeira vez em que forem selecionadas
+        self.filtros_movimentacoes = None
+        self.grade_movimentacoes = None
+        self._abas_pendentes = {
+            str(self.frame_movimentacao): self._build_movimentacao_ui,
+            str(self.frame_relatorios): self._build_relatorios_ui,
+        }
         self._build_resumo_ui()
-        self._build_movimentacao_ui()
+        self.notebook.bind("<<NotebookTabChanged>>", self._ao_trocar_aba)
 
-        self.root.bind("<Escape>", self._limpar_filtros_movimentacao)
+        if self.instrumentacao is not None:
+            self.root.bind("<F12>", self._abrir_estatisticas)
+        self.root.bind("<Map>", self._ao_exibir_janela)
+
+    def _ao_exibir_janela(self, event):
+        if event.widget is not self.root:
+            return
+        self.root.unbind("<Map>")
+        # after_idle entra na fila depois do desenho da janela, então as consultas só começam com
+        # ela já na tela
+        self.root.after_idle(self._carregar_dados_iniciais)
+
+    def _carregar_dados_iniciais(self):
+        self._registrar_tempo("janela exibida")
+        self._atualizar_resumo()
+        # Lança em segundo plano as ocorrências recorrentes que venceram desde a última abertura
+        self._em_segundo_plano(lambda db: db.materializar_recorrencias(), self._concluir_materializacao)
+
+    def _registrar_tempo(self, evento, inicio=INICIO_PROCESSO):
+        if self.instrumentacao is None:
+            return
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+        self.tempos_inicializacao.append((evento, duracao_ms))
+        logger.info("%s: %.1f ms", evento, duracao_ms)
+
+    def _abrir_estatisticas(self, event=None):
+        janela = tk.Toplevel(self.root)
+        janela.title("Estatísticas SQL")
+        janela.geometry("900x500")
+        texto = tk.Text(janela, font=("Courier", 10), wrap="none")
+
+        def atualizar():
+            texto.configure(state="normal")
+            texto.delete("1.0", tk.END)
+            tempos = "".join(f"{duracao_ms:>10.1f} ms  {evento}\n" for evento, duracao_ms in self.tempos_inicializacao)
+            texto.insert("1.0", f"Abertura (desde a carga do programa):\n{tempos}\n{self.instrumentacao.formatar()}")
+            texto.configure(state="disabled")
+
+        def limpar():
+            self.instrumentacao.limpar()
+            atualizar()
+
+        frame_buttons = ttk.Frame(janela)
+        frame_buttons.pack(fill="x", padx=10, pady=10)
+        ttk.Button(frame_buttons, text="Atualizar", command=atualizar).pack(side="left", padx=10)
+        ttk.Button(frame_buttons, text="Limpar", command=limpar).pack(side="left", padx=10)
+        texto.pack(fill="both", expand=True, padx=10, pady=10)
+        atualizar()
 
     def _build_resumo_ui(self):
         frame_top = ttk.Frame(self.frame_resumo, style="Resumo.TFrame")
@@ -169,13 +294,69 @@ class UIManager:
         self.label_saldo_total = ttk.Label(frame_top, text="Saldo Total: R$ 0.00", font=("Arial", 16), style="Resumo.TLabel")
         self.label_saldo_total.pack(side="left", padx=10)
 
+        ttk.Button(frame_top, text="Recalcular Saldos", command=self._recalcular_saldos).pack(side="right", padx=10)
+        ttk.Button(frame_top, text="Arquivar Ano", command=self._arquivar_ano).pack(side="right", padx=10)
+
         self.tree_resumo = ttk.Treeview(self.frame_resumo, columns=("Conta", "Valor"), show="headings")
         for col in self.tree_resumo["columns"]:
             self.tree_resumo.heading(col, text=col)
             self.tree_resumo.column(col, width=150)
         self.tree_resumo.pack(fill="both", expand=True, padx=10, pady=10)
 
+        # Os saldos da sessão anterior aparecem de imediato; os atuais chegam depois que a janela é
+        # exibida (ver _carregar_dados_iniciais)
+        resumo = _ler_resumo_salvo(self.db_manager.db_name)
+        if resumo is not None:
+            self._exibir_resumo(resumo, salvar=False)
+            self.label_saldo_total.config(text=self.label_saldo_total.cget("text") + " (atualizando...)")
+
+    def _em_segundo_plano(self, tarefa, ao_concluir, chave=None):
+        # Executa a tarefa fora da thread do Tk; o resultado volta pela fila de eventos via after.
+        # A chave é só para leituras que atualizam a tela: a mais recente substitui (e interrompe) a
+        # anterior. Escritas vão sem chave, rodam em ordem na fila do executor e sempre dão retorno.
+        future = self.executor.submeter(tarefa, chave)
+        if chave is not None:
+            self._tarefas_atuais[chave] = future
+        self.root.after(INTERVALO_VERIFICACAO_MS, self._aguardar_tarefa, future, chave, ao_concluir)
+
+    def _aguardar_tarefa(self, future, chave, ao_concluir):
+        if not future.done():
+            self.root.after(INTERVALO_VERIFICACAO_MS, self._aguardar_tarefa, future, chave, ao_concluir)
+            return
+        # Resultados de tarefas substituídas por uma mais recente são descartados
+        if chave is not None:
+            if future.cancelled() or self._tarefas_atuais.get(chave) is not future:
+                return
+            del self._tarefas_atuais[chave]
+        try:
+            resultado = future.result()
+        except Exception as e:
+            messagebox.showerror("Erro no Banco de Dados", str(e))
+            return
+        ao_concluir(resultado)
+
+    def _recalcular_saldos(self):
+        def recalcular(db):
+            db.reconstruir_saldos()
+            db.reconstruir_resumo()
+
+        self._em_segundo_plano(recalcular, lambda _: self._atualizar_resumo())
+
+    def _arquivar_ano(self):
+        ano = simpledialog.askinteger(
+            "Arquivar Ano",
+            "Ano a mover para um arquivo separado.\n"
+            "As movimentações dele só aparecerão ao filtrar um período que o inclua:",
+            parent=self.root, minvalue=1900, maxvalue=datetime.now().year - 1,
+        )
+        if ano is None:
+            return
+        self._em_segundo_plano(lambda db: db.arquivar_ano(ano), lambda quantidade: self._concluir_arquivamento(ano, quantidade))
+
+    def _concluir_arquivamento(self, ano, quantidade):
+        messagebox.showinfo("Arquivar Ano", f"{quantidade} movimentações de {ano} arquivadas.")
         self._atualizar_resumo()
+        self._atualizar_movimentacoes(self.filtros_movimentacoes)
 
     def _abrir_filtros(self):
         self.filtros_toplevel = tk.Toplevel(self.root)
@@ -185,10 +366,10 @@ class UIManager:
         self.filtros_toplevel.grab_set()
 
         ttk.Label(self.filtros_toplevel, text="Período:").grid(row=0, column=0, padx=10, pady=10)
-        self.entry_data_inicio = DateEntry(self.filtros_toplevel, date_pattern='dd/mm/yyyy')
+        self.entry_data_inicio = _campo_data(self.filtros_toplevel)
         self.entry_data_inicio.grid(row=0, column=1, padx=10, pady=10)
 
-        self.entry_data_fim = DateEntry(self.filtros_toplevel, date_pattern='dd/mm/yyyy')
+        self.entry_data_fim = _campo_data(self.filtros_toplevel)
         self.entry_data_fim.grid(row=0, column=2, padx=10, pady=10)
 
         ttk.Label(self.filtros_toplevel, text="Tipo:").grid(row=1, column=0, padx=10, pady=10)
@@ -237,44 +418,148 @@ class UIManager:
         self.filtros_toplevel.destroy()
 
     def _atualizar_resumo(self):
-        movimentacoes = self.db_manager.buscar_movimentacoes()
-        resumo = {}
-        for mov in movimentacoes:
-            conta = mov[3]
-            tipo = mov[2]
-            valor = mov[4]
-            if conta not in resumo:
-                resumo[conta] = {"Entrada": 0, "Saída": 0}
-            resumo[conta][tipo] += valor
-
-        data = [(conta, resumo[conta]["Entrada"] - resumo[conta]["Saída"]) for conta in resumo]
+        self._em_segundo_plano(lambda db: (db.buscar_saldos(), db.calcular_saldo()), self._exibir_resumo, chave="resumo")
+
+    def _exibir_resumo(self, resumo, salvar=True):
+        data, saldo = resumo
+        data = [(conta, formatar_valor(centavos)) for conta, centavos in data]
         self._preencher_treeview(self.tree_resumo, data, [0, 1])
-        saldo = self.db_manager.calcular_saldo()
-        self.label_saldo_total.config(text=f"Saldo Total: R$ {saldo:.2f}")
+        self.label_saldo_total.config(text=f"Saldo Total: R$ {formatar_valor(saldo)}")
+        if salvar:
+            if self._primeiro_resumo:
+                self._primeiro_resumo = False
+                self._registrar_tempo("resumo atualizado")
+            _salvar_resumo(self.db_manager.db_name, resumo)
 
     def _build_movimentacao_ui(self):
         frame_buttons = ttk.Frame(self.frame_movimentacao, style="Movimentacao.TFrame")
         frame_buttons.pack(fill="x", padx=10, pady=10)
 
         ttk.Button(frame_buttons, text="Novo Registro", command=self._abrir_tela_registro).pack(side="left", padx=10)
-        ttk.Button(frame_buttons, text="Exportar CSV", command=self._exportar_csv).pack(side="right", padx=10)
+        ttk.Button(frame_buttons, text="Exportar", command=self._exportar).pack(side="right", padx=10)
+        ttk.Button(frame_buttons, text="Importar", command=self._importar_arquivo).pack(side="right", padx=10)
+        ttk.Button(frame_buttons, text="Conciliar", command=self._conciliar_extrato).pack(side="right", padx=10)
         ttk.Button(frame_buttons, text="Filtros", command=self._abrir_filtros).pack(side="right", padx=10)
         ttk.Button(frame_buttons, text="Adicionar Contas", command=self._abrir_tela_contas).pack(side="right", padx=10)
+        ttk.Button(frame_buttons, text="Recorrências", command=self._abrir_tela_recorrencias).pack(side="right", padx=10)
         ttk.Button(frame_buttons, text="Editar Registro", command=self._abrir_tela_editar_registro).pack(side="left", padx=10)
         ttk.Button(frame_buttons, text="Excluir Registro", command=self._excluir_movimentacao).pack(side="left", padx=10)
 
-        self.tree_movimentacoes = ttk.Treeview(self.frame_movimentacao, columns=("ID", "Data", "Tipo", "Conta", "Valor", "Observações"), show="headings")
+        frame_busca = ttk.Frame(self.frame_movimentacao, style="Movimentacao.TFrame")
+        frame_busca.pack(fill="x", padx=10)
+        ttk.Label(frame_busca, text="Buscar:").pack(side="left", padx=10)
+        # Cada tecla dispara uma nova busca; o executor descarta a anterior se ela ainda não terminou
+        self.busca_var = tk.StringVar()
+        self.busca_var.trace_add("write", lambda *args: self._atualizar_movimentacoes(self.filtros_movimentacoes))
+        ttk.Entry(frame_busca, textvariable=self.busca_var).pack(side="left", fill="x", expand=True, padx=10)
+        # O saldo acumulado vem calculado na própria consulta da página (ver _com_saldo_acumulado)
+        self.saldo_acumulado_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(frame_busca, text="Saldo acumulado", variable=self.saldo_acumulado_var,
+                        command=self._alternar_saldo_acumulado).pack(side="left", padx=10)
+        ttk.Button(frame_busca, text="Extrato", command=self._abrir_extrato).pack(side="right", padx=10)
+
+        self.filtros_movimentacoes = None
+        self.grade_movimentacoes = GradeVirtual(
+            self.frame_movimentacao,
+            columns=("ID", "Data", "Tipo", "Conta", "Valor", "Observações", "Saldo acumulado"),
+            buscar_pagina=self._buscar_pagina_movimentacoes,
+            formatar_linha=self._formatar_movimentacao,
+        )
+        self.tree_movimentacoes = self.grade_movimentacoes.tree
         for col in self.tree_movimentacoes["columns"]:
             self.tree_movimentacoes.heading(col, text=col)
             self.tree_movimentacoes.column(col, width=100)
-        self.tree_movimentacoes.pack(fill="both", expand=True, padx=10, pady=10)
+        self.tree_movimentacoes["displaycolumns"] = self.tree_movimentacoes["columns"][:-1]
+        self.grade_movimentacoes.pack(fill="both", expand=True, padx=10, pady=10)
 
         self.tree_movimentacoes.bind("<Double-1>", self._on_tree_select)
         self.frame_movimentacao.bind("<Escape>", self._limpar_filtros_movimentacao)
+        self.root.bind("<Escape>", self._limpar_filtros_movimentacao)
 
         self._atualizar_movimentacoes()
 
+    def _build_relatorios_ui(self):
+        frame_top = ttk.Frame(self.frame_relatorios, style="Movimentacao.TFrame")
+        frame_top.pack(fill="x", padx=10, pady=10)
+
+        self.agrupamento_var = tk.StringVar(value="mes")
+        ttk.Radiobutton(frame_top, text="Mensal", variable=self.agrupamento_var, value="mes", command=self._atualizar_relatorio).pack(side="left", padx=10)
+        ttk.Radiobutton(frame_top, text="Anual", variable=self.agrupamento_var, value="ano", command=self._atualizar_relatorio).pack(side="left", padx=10)
+        ttk.Label(frame_top, text="Conta:", style="Movimentacao.TLabel").pack(side="left", padx=10)
+        self.combo_conta_relatorio = ttk.Combobox(frame_top)
+        self.combo_conta_relatorio.pack(side="left", padx=10)
+        self.combo_conta_relatorio.bind("<<ComboboxSelected>>", self._atualizar_relatorio)
+        ttk.Button(frame_top, text="Atualizar", command=self._atualizar_relatorio).pack(side="right", padx=10)
+
+        self.tree_relatorio = ttk.Treeview(
+            self.frame_relatorios, columns=("Período", "Entradas", "Saídas", "Resultado", "Saldo Acumulado"), show="headings", height=8
+        )
+        for col in self.tree_relatorio["columns"]:
+            self.tree_relatorio.heading(col, text=col)
+            self.tree_relatorio.column(col, width=120)
+        self.tree_relatorio.pack(fill="x", padx=10, pady=10)
+
+        self.linhas_relatorio = []
+        self.canvas_relatorio = tk.Canvas(self.frame_relatorios, background="#ecf0f1", highlightthickness=0)
+        self.canvas_relatorio.pack(fill="both", expand=True, padx=10, pady=10)
+        self.canvas_relatorio.bind("<Configure>", self._desenhar_grafico)
+
+    def _ao_trocar_aba(self, event=None):
+        aba = self.notebook.select()
+        construir = self._abas_pendentes.pop(aba, None)
+        if construir is not None:
+            inicio = time.perf_counter()
+            construir()
+            self._registrar_tempo(f"aba {self.notebook.tab(aba, 'text')} construída", inicio)
+        if aba == str(self.frame_relatorios):
+            self._atualizar_relatorio()
+
+    def _atualizar_relatorio(self, event=None):
+        # Os totais vêm de resumo_mensal, então o custo não cresce com o número de movimentações
+        self.combo_conta_relatorio["values"] = [""] + [conta[0] for conta in self.db_manager.buscar_contas()]
+        agrupamento = self.agrupamento_var.get()
+        conta = self.combo_conta_relatorio.get() or None
+        self._em_segundo_plano(lambda db: db.fluxo_de_caixa(agrupamento, conta), self._exibir_relatorio, chave="relatorio")
+
+    def _exibir_relatorio(self, linhas):
+        self.linhas_relatorio = linhas
+        data = [(periodo,) + tuple(formatar_valor(valor) for valor in valores) for periodo, *valores in linhas]
+        self._preencher_treeview(self.tree_relatorio, data, [0, 1, 2, 3, 4])
+        self._desenhar_grafico()
+
+    def _desenhar_grafico(self, event=None):
+        # Barras de entradas (verde) e saídas (vermelho) por período e a linha do saldo acumulado (azul)
+        canvas = self.canvas_relatorio
+        canvas.delete("all")
+        linhas = self.linhas_relatorio
+        if not linhas:
+            return
+        largura, altura, margem = canvas.winfo_width(), canvas.winfo_height(), 30
+        maximo = max(max(entradas, saidas, saldo) for _, entradas, saidas, _, saldo in linhas)
+        minimo = min(0, min(saldo for *_, saldo in linhas))
+        escala = (altura - 2 * margem) / ((maximo - minimo) or 1)
+
+        def y(valor):
+            return altura - margem - (valor - minimo) * escala
+
+        passo = (largura - 2 * margem) / len(linhas)
+        barra = max(passo / 3, 1)
+        pontos = []
+        for i, (periodo, entradas, saidas, _, saldo) in enumerate(linhas):
+            x = margem + i * passo
+            canvas.create_rectangle(x, y(entradas), x + barra, y(0), fill="#1abc9c", width=0)
+            canvas.create_rectangle(x + barra, y(saidas), x + 2 * barra, y(0), fill="#e74c3c", width=0)
+            pontos.extend([x + barra, y(saldo)])
+        if len(pontos) >= 4:
+            canvas.create_line(*pontos, fill="#3498db", width=2)
+        canvas.create_line(margem, y(0), largura - margem, y(0), fill="#2c3e50")
+        canvas.create_text(margem, altura - margem / 2, text=linhas[0][0], anchor="w", fill="#2c3e50")
+        canvas.create_text(largura - margem, altura - margem / 2, text=linhas[-1][0], anchor="e", fill="#2c3e50")
+        canvas.create_text(margem, margem / 2, anchor="w", fill="#2c3e50",
+                           text=f"Entradas x Saídas  |  Saldo acumulado: R$ {formatar_valor(linhas[-1][4])}")
+
     def _limpar_filtros_movimentacao(self, event=None):
+        self.busca_var.set("")
         self._atualizar_movimentacoes()
 
     def _abrir_tela_registro(self):
@@ -285,7 +570,7 @@ class UIManager:
         self.toplevel.grab_set()
 
         ttk.Label(self.toplevel, text="Data:").grid(row=0, column=0, padx=10, pady=10)
-        self.entry_data = DateEntry(self.toplevel, date_pattern='dd/mm/yyyy')
+        self.entry_data = _campo_data(self.toplevel)
         self.entry_data.grid(row=0, column=1, padx=10, pady=10)
 
         self.tipo_var = tk.StringVar()
@@ -345,7 +630,11 @@ class UIManager:
     def _adicionar_conta(self):
         nome_conta = self.entry_nome_conta.get()
         if nome_conta:
-            self.db_manager.adicionar_conta(nome_conta)
+            try:
+                self.db_manager.adicionar_conta(nome_conta)
+            except ErroBancoDados as e:
+                messagebox.showerror("Erro no Banco de Dados", str(e))
+                return
             self._atualizar_lista_contas()
             self.entry_nome_conta.delete(0, tk.END)
 
@@ -357,7 +646,11 @@ class UIManager:
 
         item = self.tree_contas.item(selected_item)
         nome_conta = item["values"][0]
-        self.db_manager.excluir_conta(nome_conta)
+        try:
+            self.db_manager.excluir_conta(nome_conta)
+        except (ValueError, ErroBancoDados) as e:
+            messagebox.showerror("Erro", str(e))
+            return
         self._atualizar_lista_contas()
 
     def _atualizar_lista_contas(self):
@@ -365,13 +658,152 @@ class UIManager:
         self._preencher_treeview(self.tree_contas, contas, [0])
         self.combo_conta["values"] = [conta[0] for conta in contas]
 
+    def _abrir_tela_recorrencias(self):
+        self.recorrencias_toplevel = tk.Toplevel(self.root)
+        self.recorrencias_toplevel.title("Recorrências")
+        self.recorrencias_toplevel.geometry("850x500")
+        self.recorrencias_toplevel.transient(self.root)
+        self.recorrencias_toplevel.grab_set()
+
+        colunas = ("ID", "Tipo", "Conta", "Valor", "Frequência", "Início", "Fim", "Lançada até", "Observações")
+        self.tree_recorrencias = ttk.Treeview(self.recorrencias_toplevel, columns=colunas, show="headings")
+        for col in colunas:
+            self.tree_recorrencias.heading(col, text=col)
+            self.tree_recorrencias.column(col, width=40 if col == "ID" else 90)
+        self.tree_recorrencias.pack(fill="both", expand=True, padx=10, pady=10)
+
+        frame_campos = ttk.Frame(self.recorrencias_toplevel)
+        frame_campos.pack(fill="x", padx=10)
+
+        self.tipo_recorrencia_var = tk.StringVar(value="Saída")
+        ttk.Radiobutton(frame_campos, text="Entrada", variable=self.tipo_recorrencia_var, value="Entrada").grid(row=0, column=0, padx=5, pady=5)
+        ttk.Radiobutton(frame_campos, text="Saída", variable=self.tipo_recorrencia_var, value="Saída").grid(row=0, column=1, padx=5, pady=5)
+
+        ttk.Label(frame_campos, text="Conta:").grid(row=0, column=2, padx=5, pady=5)
+        self.combo_conta_recorrencia = ttk.Combobox(frame_campos, values=[conta[0] for conta in self.db_manager.buscar_contas()])
+        self.combo_conta_recorrencia.grid(row=0, column=3, padx=5, pady=5)
+
+        ttk.Label(frame_campos, text="Valor (R$):").grid(row=0, column=4, padx=5, pady=5)
+        self.entry_valor_recorrencia = ttk.Entry(frame_campos, width=12)
+        self.entry_valor_recorrencia.grid(row=0, column=5, padx=5, pady=5)
+
+        ttk.Label(frame_campos, text="Frequência:").grid(row=1, column=0, padx=5, pady=5)
+        self.combo_frequencia = ttk.Combobox(frame_campos, values=FREQUENCIAS, state="readonly", width=10)
+        self.combo_frequencia.set("mensal")
+        self.combo_frequencia.grid(row=1, column=1, padx=5, pady=5)
+
+        ttk.Label(frame_campos, text="A cada:").grid(row=1, column=2, padx=5, pady=5)
+        self.spin_intervalo = ttk.Spinbox(frame_campos, from_=1, to=365, width=5)
+        self.spin_intervalo.set(1)
+        self.spin_intervalo.grid(row=1, column=3, padx=5, pady=5, sticky="w")
+
+        ttk.Label(frame_campos, text="Início:").grid(row=2, column=0, padx=5, pady=5)
+        self.entry_inicio_recorrencia = _campo_data(frame_campos)
+        self.entry_inicio_recorrencia.grid(row=2, column=1, padx=5, pady=5)
+
+        ttk.Label(frame_campos, text="Fim (opcional):").grid(row=2, column=2, padx=5, pady=5)
+        self.entry_fim_recorrencia = ttk.Entry(frame_campos, width=12)
+        self.entry_fim_recorrencia.grid(row=2, column=3, padx=5, pady=5, sticky="w")
+
+        ttk.Label(frame_campos, text="Observações:").grid(row=2, column=4, padx=5, pady=5)
+        self.entry_observacoes_recorrencia = ttk.Entry(frame_campos)
+        self.entry_observacoes_recorrencia.grid(row=2, column=5, padx=5, pady=5)
+
+        frame_buttons = ttk.Frame(self.recorrencias_toplevel)
+        frame_buttons.pack(fill="x", padx=10, pady=10)
+
+        ttk.Button(frame_buttons, text="Salvar", command=self._adicionar_recorrencia).pack(side="left", padx=10)
+        ttk.Button(frame_buttons, text="Excluir", command=self._excluir_recorrencia).pack(side="left", padx=10)
+        ttk.Button(frame_buttons, text="Projeção", command=self._abrir_projecao).pack(side="right", padx=10)
+        ttk.Button(frame_buttons, text="Gerar Lançamentos", command=self._materializar_recorrencias).pack(side="right", padx=10)
+
+        self._atualizar_lista_recorrencias()
+
+    def _atualizar_lista_recorrencias(self):
+        dados = [
+            (regra_id, tipo, conta, formatar_valor(abs(centavos)),
+             frequencia if intervalo == 1 else f"{frequencia} (a cada {intervalo})",
+             converter_data_para_exibicao(inicio), converter_data_para_exibicao(fim) if fim else "",
+             converter_data_para_exibicao(materializada_ate) if materializada_ate else "", observacoes)
+            for (regra_id, tipo, conta, centavos, observacoes, frequencia, intervalo,
+                 inicio, fim, materializada_ate) in self.db_manager.buscar_recorrencias()
+        ]
+        self._preencher_treeview(self.tree_recorrencias, dados, range(9))
+
+    def _adicionar_recorrencia(self):
+        try:
+            self.db_manager.adicionar_recorrencia(
+                tipo=self.tipo_recorrencia_var.get(),
+                conta=self.combo_conta_recorrencia.get(),
+                valor=converter_valor(self.entry_valor_recorrencia.get()),
+                frequencia=self.combo_frequencia.get(),
+                data_inicio=self.entry_inicio_recorrencia.get(),
+                intervalo=int(self.spin_intervalo.get()),
+                data_fim=self.entry_fim_recorrencia.get() or None,
+                observacoes=self.entry_observacoes_recorrencia.get(),
+            )
+        except ValueError as e:
+            messagebox.showerror("Erro de Valor", f"Entrada inválida: {e}", parent=self.recorrencias_toplevel)
+            return
+        except ErroBancoDados as e:
+            messagebox.showerror("Erro no Banco de Dados", str(e), parent=self.recorrencias_toplevel)
+            return
+        self._atualizar_lista_recorrencias()
+
+    def _excluir_recorrencia(self):
+        selected_item = self.tree_recorrencias.selection()
+        if not selected_item:
+            messagebox.showerror("Erro", "Nenhuma recorrência selecionada.", parent=self.recorrencias_toplevel)
+            return
+        regra_id = self.tree_recorrencias.item(selected_item)["values"][0]
+        if not messagebox.askyesno("Confirmação", "Excluir a recorrência? Os lançamentos já gerados serão mantidos.",
+                                   parent=self.recorrencias_toplevel):
+            return
+        try:
+            self.db_manager.excluir_recorrencia(regra_id)
+        except ErroBancoDados as e:
+            messagebox.showerror("Erro no Banco de Dados", str(e), parent=self.recorrencias_toplevel)
+            return
+        self._atualizar_lista_recorrencias()
+
+    def _materializar_recorrencias(self):
+        self._em_segundo_plano(lambda db: db.materializar_recorrencias(), self._concluir_materializacao)
+
+    def _concluir_materializacao(self, quantidade):
+        if quantidade:
+            self._atualizar_resumo()
+            self._atualizar_movimentacoes(self.filtros_movimentacoes)
+        if getattr(self, "recorrencias_toplevel", None) is not None and self.recorrencias_toplevel.winfo_exists():
+            self._atualizar_lista_recorrencias()
+            messagebox.showinfo("Recorrências", f"{quantidade} movimentações lançadas.", parent=self.recorrencias_toplevel)
+
+    def _abrir_projecao(self):
+        janela = tk.Toplevel(self.recorrencias_toplevel)
+        janela.title("Projeção de Saldo")
+        janela.geometry("500x350")
+        colunas = ("Mês", "Entradas", "Saídas", "Saldo")
+        tree = ttk.Treeview(janela, columns=colunas, show="headings")
+        for col in colunas:
+            tree.heading(col, text=col)
+            tree.column(col, width=110)
+        tree.pack(fill="both", expand=True, padx=10, pady=10)
+
+        def exibir(projecao):
+            if not janela.winfo_exists():
+                return
+            dados = [(mes, formatar_valor(entradas), formatar_valor(saidas), formatar_valor(saldo))
+                     for mes, entradas, saidas, saldo in projecao]
+            self._preencher_treeview(tree, dados, range(4))
+
+        self._em_segundo_plano(lambda db: db.projetar_saldos(), exibir)
+
     def _salvar_registro(self):
         try:
             data = self.entry_data.get()
             datetime.strptime(data, "%d/%m/%Y")
             tipo = self.tipo_var.get()
             conta = self.combo_conta.get()
-            valor = float(self.entry_valor.get())
+            valor = converter_valor(self.entry_valor.get())
             observacoes = self.entry_observacoes.get()
             self._validar_campos(data=data, tipo=tipo, conta=conta, valor=valor)
             self.db_manager.adicionar_movimentacao(data=data, tipo=tipo, conta=conta, valor=valor, observacoes=observacoes)
@@ -380,6 +812,8 @@ class UIManager:
             self.toplevel.destroy()
         except ValueError as e:
             messagebox.showerror("Erro de Valor", f"Entrada inválida: {e}")
+        except ErroBancoDados as e:
+            messagebox.showerror("Erro no Banco de Dados", str(e))
         except Exception as e:
             messagebox.showerror("Erro Inesperado", f"Ocorreu um erro: {e}")
 
@@ -399,7 +833,7 @@ class UIManager:
         self.toplevel.grab_set()
 
         ttk.Label(self.toplevel, text="Data:").grid(row=0, column=0, padx=10, pady=10)
-        self.entry_data = DateEntry(self.toplevel, date_pattern='dd/mm/yyyy')
+        self.entry_data = _campo_data(self.toplevel)
         self.entry_data.grid(row=0, column=1, padx=10, pady=10)
         self.entry_data.set_date(datetime.strptime(mov[1], "%d/%m/%Y"))
 
@@ -435,7 +869,7 @@ class UIManager:
             datetime.strptime(data, "%d/%m/%Y")
             tipo = self.tipo_var.get()
             conta = self.combo_conta.get()
-            valor = float(self.entry_valor.get())
+            valor = converter_valor(self.entry_valor.get())
             observacoes = self.entry_observacoes.get()
             self._validar_campos(data=data, tipo=tipo, conta=conta, valor=valor)
             self.db_manager.editar_movimentacao(mov_id, data=data, tipo=tipo, conta=conta, valor=valor, observacoes=observacoes)
@@ -444,6 +878,8 @@ class UIManager:
             self.toplevel.destroy()
         except ValueError as e:
             messagebox.showerror("Erro de Valor", f"Entrada inválida: {e}")
+        except ErroBancoDados as e:
+            messagebox.showerror("Erro no Banco de Dados", str(e))
         except Exception as e:
             messagebox.showerror("Erro Inesperado", f"Ocorreu um erro: {e}")
 
@@ -461,7 +897,7 @@ class UIManager:
             data = self.entry_data.get()
             tipo = self.tipo_var.get()
             conta = self.combo_conta.get()
-            valor = float(self.entry_valor.get())
+            valor = converter_valor(self.entry_valor.get())
             observacoes = self.entry_observacoes.get()
 
             # Validar campos
@@ -477,6 +913,8 @@ class UIManager:
             self.toplevel.destroy()
         except ValueError as e:
             messagebox.showerror("Erro de Valor", f"Entrada inválida: {e}")
+        except ErroBancoDados as e:
+            messagebox.showerror("Erro no Banco de Dados", str(e))
         except Exception as e:
             messagebox.showerror("Erro Inesperado", f"Ocorreu um erro: {e}")
 
@@ -495,6 +933,8 @@ class UIManager:
                 self.db_manager.excluir_movimentacao(mov_id)
                 self._atualizar_resumo()
                 self._atualizar_movimentacoes()
+        except ErroBancoDados as e:
+            messagebox.showerror("Erro no Banco de Dados", str(e))
         except Exception as e:
             messagebox.showerror("Erro Inesperado", f"Ocorreu um erro: {e}")
 
@@ -516,26 +956,63 @@ class UIManager:
         self.entry_observacoes.insert(0, mov[5])
 
     def _atualizar_movimentacoes(self, filtros=None):
-        query = 'SELECT * FROM movimentacoes'
-        params = []
-
-        if filtros:
-            conditions = []
-            if "data_inicio" in filtros and "data_fim" in filtros:
-                conditions.append("data BETWEEN ? AND ?")
-                params.extend([filtros["data_inicio"], filtros["data_fim"]])
-            if "tipo" in filtros:
-                conditions.append("tipo = ?")
-                params.append(filtros["tipo"])
-            if "conta" in filtros:
-                conditions.append("conta = ?")
-                params.append(filtros["conta"])
-
-            if conditions:
-                query += " WHERE " + " AND ".join(conditions)
-
-        movimentacoes = self.db_manager.fetch_all(query, params)
-        self._preencher_treeview(self.tree_movimentacoes, movimentacoes, [0, 1, 2, 3, 4, 5])
+        # Antes da aba ser aberta não há o que atualizar; ela busca a primeira página ao ser construída
+        if self.grade_movimentacoes is None:
+            return
+        # O texto da caixa de busca é combinado com os filtros de período, tipo e conta
+        filtros = {k: v for k, v in (filtros or {}).items() if k != "busca"}
+        if self.busca_var.get().strip():
+            filtros["busca"] = self.busca_var.get()
+        filtros = filtros or None
+        self.filtros_movimentacoes = filtros
+        saldo_acumulado = self.saldo_acumulado_var.get()
+        self._em_segundo_plano(
+            lambda db: db.buscar_pagina_movimentacoes(filtros, limite=TAMANHO_PAGINA, saldo_acumulado=saldo_acumulado),
+            self.grade_movimentacoes.exibir_pagina_inicial,
+            chave="movimentacoes",
+        )
+
+    def _buscar_pagina_movimentacoes(self, **kwargs):
+        return self.db_manager.buscar_pagina_movimentacoes(
+            self.filtros_movimentacoes, saldo_acumulado=self.saldo_acumulado_var.get(), **kwargs
+        )
+
+    def _alternar_saldo_acumulado(self):
+        colunas = self.tree_movimentacoes["columns"]
+        self.tree_movimentacoes["displaycolumns"] = colunas if self.saldo_acumulado_var.get() else colunas[:-1]
+        self._atualizar_movimentacoes(self.filtros_movimentacoes)
+
+    def _formatar_movimentacao(self, mov):
+        saldo = formatar_valor(mov[6]) if len(mov) > 6 else ""
+        return (mov[0], converter_data_para_exibicao(mov[1]), mov[2], mov[3], formatar_valor(abs(mov[4])), mov[5], saldo)
+
+    def _abrir_extrato(self):
+        janela = tk.Toplevel(self.root)
+        janela.title("Extrato por Conta")
+        janela.geometry("700x500")
+
+        frame_top = ttk.Frame(janela)
+        frame_top.pack(fill="x", padx=10, pady=10)
+        ttk.Label(frame_top, text="Conta:").pack(side="left", padx=10)
+        combo_conta = ttk.Combobox(frame_top, state="readonly",
+                                   values=[conta[0] for conta in self.db_manager.buscar_contas()])
+        combo_conta.pack(side="left", padx=10)
+
+        # A grade pagina pelo par (data, id) da primeira/última linha visível, como o extrato no banco
+        grade = GradeVirtual(
+            janela,
+            columns=("Data", "Tipo", "Valor", "Saldo", "Observações"),
+            buscar_pagina=lambda **kwargs: self.db_manager.extrato_conta(combo_conta.get(), **kwargs),
+            formatar_linha=lambda mov: (converter_data_para_exibicao(mov[1]), mov[2], formatar_valor(mov[3]),
+                                        formatar_valor(mov[5]), mov[4]),
+        )
+        for col in grade.tree["columns"]:
+            grade.tree.heading(col, text=col)
+            grade.tree.column(col, width=120)
+        grade.pack(fill="both", expand=True, padx=10, pady=10)
+
+        combo_conta.bind("<<ComboboxSelected>>", lambda event: grade.exibir_pagina_inicial(
+            self.db_manager.extrato_conta(combo_conta.get())))
 
     def _preencher_treeview(self, treeview, data, columns):
         for item in treeview.get_children():
@@ -554,18 +1031,134 @@ class UIManager:
         self.entry_valor.delete(0, tk.END)
         self.entry_observacoes.delete(0, tk.END)
 
-    def _exportar_csv(self):
-        self.db_manager.exportar_csv()
+    def _exportar(self):
+        tipos = [("CSV", "*.csv")]
+        if pyarrow_disponivel():
+            tipos += [("Parquet", "*.parquet"), ("Arrow IPC", "*.arrow")]
+        filename = filedialog.asksaveasfilename(
+            parent=self.root, title="Exportar Movimentações", initialfile="movimentacoes.csv",
+            defaultextension=".csv", filetypes=tipos,
+        )
+        if not filename:
+            return
+
+        janela = tk.Toplevel(self.root)
+        janela.title("Exportação")
+        janela.transient(self.root)
+        barra = ttk.Progressbar(janela, length=300, mode="determinate")
+        barra.pack(padx=10, pady=10)
+        cancelar = threading.Event()
+        ttk.Button(janela, text="Cancelar", command=cancelar.set).pack(pady=10)
+
+        # O callback de progresso roda na thread de trabalho; a barra é atualizada pelo Tk via after
+        estado = {"escritas": 0, "total": 0}
+
+        def progresso(escritas, total):
+            estado["escritas"], estado["total"] = escritas, total
+
+        def atualizar_barra():
+            if not janela.winfo_exists():
+                return
+            barra["maximum"] = max(estado["total"], 1)
+            barra["value"] = estado["escritas"]
+            janela.after(100, atualizar_barra)
+
+        def concluir(filename):
+            janela.destroy()
+            messagebox.showinfo("Exportação", f"Dados exportados com sucesso para {filename}")
+
+        filtros = self.filtros_movimentacoes
+        future = self.executor.submeter(lambda db: db.exportar(filename, filtros, progresso=progresso, cancelar=cancelar))
+        self._tarefas_atuais["exportacao"] = future
+        atualizar_barra()
+        self.root.after(INTERVALO_VERIFICACAO_MS, self._aguardar_exportacao, future, janela, concluir)
+
+    def _aguardar_exportacao(self, future, janela, concluir):
+        if not future.done():
+            self.root.after(INTERVALO_VERIFICACAO_MS, self._aguardar_exportacao, future, janela, concluir)
+            return
+        try:
+            filename = future.result()
+        except ExportacaoCancelada:
+            janela.destroy()
+            return
+        except Exception as e:
+            janela.destroy()
+            messagebox.showerror("Erro na Exportação", str(e))
+            return
+        concluir(filename)
+
+    def _escolher_extrato(self, titulo):
+        # Devolve (caminho, conta) ou None se o usuário cancelar
+        caminho = filedialog.askopenfilename(
+            parent=self.root,
+            title=titulo,
+            filetypes=[("Extratos", "*.csv *.ofx"), ("CSV", "*.csv"), ("OFX", "*.ofx")],
+        )
+        if not caminho:
+            return None
+        conta = None
+        if caminho.lower().endswith(".ofx"):
+            conta = simpledialog.askstring(
+                titulo, "Conta do extrato (em branco para usar a conta informada no arquivo):", parent=self.root
+            ) or None
+        return caminho, conta
+
+    def _importar_arquivo(self):
+        escolha = self._escolher_extrato("Importar Movimentações")
+        if escolha is None:
+            return
+        caminho, conta = escolha
+        self._em_segundo_plano(lambda db: db.importar_arquivo(caminho, conta), self._concluir_importacao)
+
+    def _conciliar_extrato(self):
+        escolha = self._escolher_extrato("Conciliar Extrato")
+        if escolha is None:
+            return
+        caminho, conta = escolha
+        self._em_segundo_plano(lambda db: db.conciliar_arquivo(caminho, conta), self._exibir_conciliacao)
+
+    def _exibir_conciliacao(self, resultado):
+        janela = tk.Toplevel(self.root)
+        janela.title("Conciliação")
+        janela.geometry("900x500")
+        ttk.Label(janela, text=f"{len(resultado.conciliadas)} conciliadas, {len(resultado.pendentes)} pendentes no extrato, "
+                               f"{len(resultado.sem_extrato)} fora do extrato, {resultado.rejeitadas} rejeitadas"
+                  ).pack(padx=10, pady=5, anchor="w")
+        colunas = ("Situação", "Linha", "ID", "Data", "Conta", "Valor", "Observações")
+        tree = ttk.Treeview(janela, columns=colunas, show="headings")
+        for col in colunas:
+            tree.heading(col, text=col)
+            tree.column(col, width=110)
+        tree.pack(fill="both", expand=True, padx=10, pady=10)
+        dados = []
+        for linha, campos, mov_id, dias, centavos in resultado.conciliadas:
+            situacao = "Conciliada" if not (dias or centavos) else f"Conciliada ({dias:+d} dias, {formatar_valor(centavos)})"
+            dados.append((situacao, linha, mov_id, campos["data"], campos["conta"], campos["valor"], campos["observacoes"]))
+        for linha, campos in resultado.pendentes:
+            dados.append(("Sem movimentação", linha, "", campos.get("data", ""), campos.get("conta", ""),
+                          campos.get("valor", ""), campos.get("observacoes", "")))
+        for mov_id, data, _, conta, centavos, observacoes in resultado.sem_extrato:
+            dados.append(("Fora do extrato", "", mov_id, converter_data_para_exibicao(data), conta,
+                          formatar_valor(centavos), observacoes))
+        self._preencher_treeview(tree, dados, range(7))
+
+    def _concluir_importacao(self, resultado):
+        mensagem = f"{resultado.importadas} movimentações importadas, {resultado.rejeitadas} rejeitadas."
+        if resultado.duplicadas:
+            mensagem += f"\n{resultado.duplicadas} linhas já existentes foram ignoradas."
+        if resultado.erros:
+            mensagem += "\n\n" + "\n".join(f"Linha {linha}: {motivo}" for linha, motivo in resultado.erros[:10])
+        messagebox.showinfo("Importação", mensagem)
+        self._atualizar_resumo()
+        self._atualizar_movimentacoes()
 
     def _validar_campos(self, **kwargs):
-        if kwargs["tipo"] not in ["Entrada", "Saída"]:
-            raise ValueError("O tipo deve ser 'Entrada' ou 'Saída'.")
-        if not kwargs["conta"]:
-            raise ValueError("A conta não pode estar vazia.")
-        if kwargs["valor"] <= 0:
-            raise ValueError("O valor deve ser maior que zero.")
+        validar_campos(**kwargs)
 
 if __name__ == "__main__":
+    if os.environ.get(VARIAVEL_INSTRUMENTACAO):
+        logging.basicConfig(format="%(message)s", level=logging.INFO)
     root = tk.Tk()
     app = UIManager(root)
     root.mainloop()
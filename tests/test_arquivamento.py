@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+
+from gestor_financeiro import DatabaseManager, ErroBancoDados
+
+
+class TesteArquivamento(unittest.TestCase):
+    def setUp(self):
+        self._pasta = tempfile.TemporaryDirectory()
+        self.pasta = self._pasta.name
+        self.db = DatabaseManager(os.path.join(self.pasta, "financeiro.db"))
+        self.adicionar("10/03/2020", 100, "salário 2020")
+        self.adicionar("20/11/2020", 30, "mercado 2020", tipo="Saída")
+        self.adicionar("05/02/2021", 50, "salário 2021")
+        self.adicionar("06/02/2021", 10, "farmácia", conta="Carteira", tipo="Saída")
+        self.adicionar("15/07/2022", 40, "bônus 2022")
+
+    def tearDown(self):
+        self.db.conn.close()
+        self._pasta.cleanup()
+
+    def adicionar(self, data, valor, observacoes, conta="Banco", tipo="Entrada"):
+        return self.db.adicionar_movimentacao(data=data, tipo=tipo, conta=conta, valor=valor, observacoes=observacoes)
+
+    def observacoes(self, filtros=None):
+        return sorted(linha[5] for linha in self.db.filtrar_movimentacoes(filtros))
+
+    def test_arquivar_move_as_linhas_e_mantem_saldos_e_resumo(self):
+        saldos = self.db.buscar_saldos()
+        resumo = self.db.fetch_all('SELECT * FROM resumo_mensal ORDER BY conta_id, mes, tipo')
+        self.assertEqual(self.db.arquivar_ano(2020), 2)
+        self.assertTrue(os.path.exists(os.path.join(self.pasta, "financeiro-2020.db")))
+        self.assertEqual(self.db.fetch_all("SELECT COUNT(*) FROM movimentacoes WHERE data < '2021-01-01'"), [(0,)])
+        self.assertEqual(self.db.buscar_saldos(), saldos)
+        self.assertEqual(self.db.fetch_all('SELECT * FROM resumo_mensal ORDER BY conta_id, mes, tipo'), resumo)
+        self.assertEqual(self.db.verificar_resumo(), [])
+        self.assertEqual(self.db.buscar_arquivos(), [(2020, "financeiro-2020.db", 2, 7000)])
+
+    def test_anos_devem_ser_arquivados_em_ordem(self):
+        with self.assertRaises(ValueError):
+            self.db.arquivar_ano(2021)
+        self.db.arquivar_ano(2020)
+        with self.assertRaises(ValueError):
+            self.db.arquivar_ano(2020)
+
+    def test_gatilho_recusa_datas_de_ano_arquivado(self):
+        self.db.arquivar_ano(2020)
+        with self.assertRaises(ErroBancoDados):
+            self.adicionar("31/12/2020", 1, "lançamento atrasado")
+        mov_id = self.db.fetch_all("SELECT id FROM movimentacoes WHERE observacoes = 'salário 2021'")[0][0]
+        with self.assertRaises(ErroBancoDados):
+            self.db.editar_movimentacao(mov_id, data="01/06/2020", tipo="Entrada", conta="Banco", valor=50,
+                                        observacoes="salário 2021")
+        # O primeiro dia depois do ano arquivado continua aceito
+        self.adicionar("01/01/2021", 1, "primeiro dia")
+        self.assertEqual(self.db.fetch_all("SELECT COUNT(*) FROM movimentacoes"), [(4,)])
+
+    def test_listagens_com_e_sem_periodo(self):
+        self.db.arquivar_ano(2020)
+        self.db.arquivar_ano(2021)
+        # Sem período só o banco principal é lido
+        self.assertEqual(self.observacoes(), ["bônus 2022"])
+        # Um período que alcança anos arquivados anexa os arquivos deles
+        self.assertEqual(self.observacoes({"data_inicio": "01/01/2020", "data_fim": "31/12/2022"}),
+                         ["bônus 2022", "farmácia", "mercado 2020", "salário 2020", "salário 2021"])
+        self.assertEqual(self.observacoes({"data_inicio": "01/06/2020", "data_fim": "28/02/2021", "conta": "Banco"}),
+                         ["mercado 2020", "salário 2021"])
+        self.assertEqual(self.observacoes({"data_inicio": "01/01/2021", "data_fim": "31/12/2021", "busca": "farmacia"}),
+                         ["farmácia"])
+        self.assertEqual(self.db.extrato_conta("Banco", "01/01/2020", "31/12/2022")[-1][-1], 16000)
+
+    def test_conta_com_movimentacoes_arquivadas_nao_e_excluida(self):
+        self.db.arquivar_ano(2020)
+        self.db.arquivar_ano(2021)
+        with self.assertRaisesRegex(ValueError, "possui movimentações"):
+            self.db.excluir_conta("Carteira")
+        self.assertIn(("Carteira", -1000), self.db.buscar_saldos())
+
+
+if __name__ == "__main__":
+    unittest.main()
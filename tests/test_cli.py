@@ -0,0 +1,51 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from gestor_financeiro.cli import main
+
+
+class TesteCLI(unittest.TestCase):
+    def setUp(self):
+        self._pasta = tempfile.TemporaryDirectory()
+        self.pasta = self._pasta.name
+        self.db = os.path.join(self.pasta, "financeiro.db")
+
+    def tearDown(self):
+        self._pasta.cleanup()
+
+    def executar(self, *argumentos):
+        erro = io.StringIO()
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(erro):
+            codigo = main(["--db", self.db, *argumentos])
+        return codigo, erro.getvalue()
+
+    def test_restore_sem_backup_nao_cria_o_banco(self):
+        os.mkdir(os.path.join(self.pasta, "vazia"))
+        codigo, erro = self.executar("restore", os.path.join(self.pasta, "vazia"), os.path.join(self.pasta, "novo.db"))
+        self.assertEqual(codigo, 1)
+        self.assertIn("Nenhuma cópia completa", erro)
+        self.assertEqual(sorted(os.listdir(self.pasta)), ["vazia"])
+
+    def test_backup_e_restore(self):
+        self.assertEqual(self.executar("add", "--data", "01/01/2024", "--tipo", "Entrada", "--conta", "Banco",
+                                       "--valor", "10,00")[0], 0)
+        backups = os.path.join(self.pasta, "backups")
+        self.assertEqual(self.executar("backup", backups)[0], 0)
+        self.assertEqual(self.executar("add", "--data", "02/01/2024", "--tipo", "Entrada", "--conta", "Banco",
+                                       "--valor", "5,00")[0], 0)
+        self.assertEqual(self.executar("backup", backups)[0], 0)
+        self.assertEqual(self.executar("restore", backups, os.path.join(self.pasta, "restaurado.db")), (0, ""))
+
+    def test_erro_do_sqlite_vira_mensagem(self):
+        with open(self.db, "w") as arquivo:
+            arquivo.write("isto não é um banco SQLite " * 100)
+        codigo, erro = self.executar("balance")
+        self.assertEqual(codigo, 1)
+        self.assertTrue(erro.startswith("erro"))
+
+
+if __name__ == "__main__":
+    unittest.main()
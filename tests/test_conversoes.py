@@ -0,0 +1,50 @@
+from decimal import Decimal
+import unittest
+
+from gestor_financeiro import converter_para_centavos, converter_valor, formatar_valor
+
+
+class TesteConversoes(unittest.TestCase):
+    def test_converter_valor(self):
+        casos = {
+            "1200.50": "1200.50",
+            "1200": "1200",
+            " 7,5 ": "7.5",
+            ".5": "0.5",
+            "1.200,50": "1200.50",
+            "1200,50": "1200.50",
+            "1.200.000": "1200000",
+            "1.234.567,89": "1234567.89",
+            "-5,30": "-5.30",
+        }
+        for texto, esperado in casos.items():
+            with self.subTest(texto=texto):
+                self.assertEqual(converter_valor(texto), Decimal(esperado))
+
+    def test_converter_valor_recusa_separadores_ambiguos(self):
+        for texto in ("1,200.50", "1.20,5", "1.2.3", "12,34,5", "1.2345,00", "", "abc", "1e3", "nan", "R$ 10"):
+            with self.subTest(texto=texto):
+                with self.assertRaises(ValueError):
+                    converter_valor(texto)
+
+    def test_converter_para_centavos_arredonda_para_cima_no_meio(self):
+        casos = [
+            ("10,005", "Entrada", 1001),
+            ("10,004", "Entrada", 1000),
+            ("0,125", "Saída", -13),
+            (Decimal("2.675"), "Saída", -268),
+            (3, "Entrada", 300),
+        ]
+        for valor, tipo, esperado in casos:
+            with self.subTest(valor=valor, tipo=tipo):
+                self.assertEqual(converter_para_centavos(valor, tipo), esperado)
+
+    def test_formatar_valor(self):
+        casos = {0: "0.00", 5: "0.05", 1050: "10.50", -1999: "-19.99", 123456789: "1234567.89"}
+        for centavos, esperado in casos.items():
+            with self.subTest(centavos=centavos):
+                self.assertEqual(formatar_valor(centavos), esperado)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import csv
+import os
+import tempfile
+import unittest
+
+from gestor_financeiro import DatabaseManager
+
+
+class TesteImportacao(unittest.TestCase):
+    def setUp(self):
+        self._pasta = tempfile.TemporaryDirectory()
+        self.pasta = self._pasta.name
+        self.db = DatabaseManager(os.path.join(self.pasta, "financeiro.db"))
+
+    def tearDown(self):
+        self.db.conn.close()
+        self._pasta.cleanup()
+
+    def extrato(self, nome, *linhas):
+        caminho = os.path.join(self.pasta, nome)
+        with open(caminho, "w", newline="", encoding="utf-8") as arquivo:
+            escritor = csv.writer(arquivo)
+            escritor.writerow(["Data", "Tipo", "Conta", "Valor", "Observações"])
+            escritor.writerows(linhas)
+        return caminho
+
+    def observacoes(self):
+        return sorted(linha[5] for linha in self.db.filtrar_movimentacoes())
+
+    def test_reimportar_extrato_sobreposto_pula_as_duplicatas(self):
+        primeiro = self.extrato("marco.csv",
+                                ("01/03/2024", "Saída", "Banco", "5,00", "Café"),
+                                ("01/03/2024", "Saída", "Banco", "5,00", "Café"),
+                                ("02/03/2024", "Saída", "Banco", "1.000,00", "Aluguel"))
+        resultado = self.db.importar_arquivo(primeiro)
+        self.assertEqual((resultado.importadas, resultado.duplicadas), (3, 0))
+
+        # O segundo extrato repete o começo do primeiro (com outra grafia) e traz um terceiro café
+        segundo = self.extrato("marco-2.csv",
+                               ("01/03/2024", "Saída", "Banco", "5,00", "CAFE"),
+                               ("01/03/2024", "Saída", "Banco", "5.00", "café"),
+                               ("02/03/2024", "Saída", "Banco", "1000", "aluguel"),
+                               ("01/03/2024", "Saída", "Banco", "5,00", "Café"),
+                               ("05/03/2024", "Entrada", "Banco", "3.000,00", "Salário"))
+        resultado = self.db.importar_arquivo(segundo)
+        self.assertEqual((resultado.importadas, resultado.duplicadas, resultado.rejeitadas), (2, 3, 0))
+        self.assertEqual(resultado.linhas_duplicadas, [2, 3, 4])
+        self.assertEqual(self.observacoes(), ["Aluguel", "Café", "Café", "Café", "Salário"])
+        self.assertEqual(self.db.buscar_saldos(), [("Banco", 198500)])
+        self.assertEqual(self.db.verificar_resumo(), [])
+
+        # O mesmo arquivo de novo não traz nada
+        resultado = self.db.importar_arquivo(segundo)
+        self.assertEqual((resultado.importadas, resultado.duplicadas), (0, 5))
+
+    def test_duplicatas_podem_ser_importadas_e_so_contadas(self):
+        caminho = self.extrato("extrato.csv", ("01/03/2024", "Entrada", "Banco", "10,00", "Pix"))
+        self.db.importar_arquivo(caminho)
+        resultado = self.db.importar_arquivo(caminho, ignorar_duplicadas=False)
+        self.assertEqual((resultado.importadas, resultado.duplicadas), (1, 1))
+        self.assertEqual(len(self.db.buscar_duplicatas()), 2)
+
+    def test_conciliar_casa_e_sinaliza_as_linhas_certas(self):
+        def adicionar(data, valor, observacoes, tipo="Saída"):
+            return self.db.adicionar_movimentacao(data=data, tipo=tipo, conta="Banco", valor=valor,
+                                                  observacoes=observacoes)
+
+        mercado = adicionar("10/03/2024", 50, "Mercado")
+        farmacia = adicionar("11/03/2024", 50, "Farmácia")
+        luz = adicionar("12/03/2024", 120, "Conta de luz")
+        sem_extrato = adicionar("13/03/2024", 30, "Padaria")
+        caminho = self.extrato("extrato.csv",
+                               # Mesmo conteúdo de "Farmácia": é preferida a "Mercado", um dia mais perto
+                               ("11/03/2024", "Saída", "Banco", "50,00", "FARMACIA"),
+                               # Sobra "Mercado", dois dias antes e dentro da tolerância
+                               ("12/03/2024", "Saída", "Banco", "50,00", "Débito"),
+                               # Lançada com dois dias de atraso
+                               ("14/03/2024", "Saída", "Banco", "120,00", "Energia"),
+                               # Valor diferente de qualquer movimentação
+                               ("13/03/2024", "Saída", "Banco", "31,00", "Padaria"),
+                               ("data ruim", "Saída", "Banco", "1,00", "x"))
+        resultado = self.db.conciliar_arquivo(caminho)
+        self.assertEqual([(linha, mov_id, dias, centavos) for linha, _, mov_id, dias, centavos in resultado.conciliadas],
+                         [(2, farmacia, 0, 0), (3, mercado, -2, 0), (4, luz, -2, 0)])
+        self.assertEqual([linha for linha, _ in resultado.pendentes], [5])
+        self.assertEqual([row[0] for row in resultado.sem_extrato], [sem_extrato])
+        self.assertEqual(resultado.rejeitadas, 1)
+        # Com tolerância de valor a padaria também casa
+        resultado = self.db.conciliar_arquivo(caminho, centavos=100)
+        self.assertIn((5, sem_extrato, 0, 100), [(linha, mov_id, dias, centavos)
+                                                  for linha, _, mov_id, dias, centavos in resultado.conciliadas])
+        # Conciliar não grava nada
+        self.assertEqual(len(self.observacoes()), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from gestor_financeiro import DatabaseManager
+
+
+class TesteMigracao(unittest.TestCase):
+    def setUp(self):
+        self._pasta = tempfile.TemporaryDirectory()
+        self.caminho = os.path.join(self._pasta.name, "financeiro.db")
+
+    def tearDown(self):
+        self._pasta.cleanup()
+
+    def criar_banco_antigo(self, linhas):
+        # Esquema anterior a todas as migrações: datas DD/MM/AAAA, conta em texto e valor REAL
+        conn = sqlite3.connect(self.caminho)
+        conn.execute('''
+            CREATE TABLE movimentacoes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                data TEXT NOT NULL,
+                tipo TEXT NOT NULL,
+                conta TEXT NOT NULL,
+                valor REAL NOT NULL,
+                observacoes TEXT
+            )
+        ''')
+        conn.execute('CREATE TABLE contas (id INTEGER PRIMARY KEY AUTOINCREMENT, nome TEXT NOT NULL)')
+        conn.executemany('INSERT INTO movimentacoes (data, tipo, conta, valor, observacoes) VALUES (?, ?, ?, ?, ?)',
+                         linhas)
+        conn.commit()
+        conn.close()
+
+    def test_valor_real_vira_centavos_com_sinal(self):
+        self.criar_banco_antigo([
+            ("05/01/2023", "Entrada", "Banco", 10.5, "salário"),
+            ("06/01/2023", "Saída", "Banco", 19.99, "mercado"),
+            ("07/01/2023", "Entrada", "Banco", 1.005, "meio centavo"),
+            ("08/01/2023", "Saída", "Carteira", 0.285, "meio centavo"),
+            ("09/01/2023", "Entrada", "Carteira", 0.1 + 0.2, "soma de REAL"),
+            ("10/02/2023", "Saída", "Banco", 1234.565, "aluguel"),
+        ])
+        db = DatabaseManager(self.caminho)
+        try:
+            self.assertEqual(db.fetch_all('''
+                SELECT m.id, m.data, c.nome, m.valor_centavos FROM movimentacoes m JOIN contas c ON c.id = m.conta_id
+                ORDER BY m.id
+            '''), [
+                (1, "2023-01-05", "Banco", 1050),
+                (2, "2023-01-06", "Banco", -1999),
+                (3, "2023-01-07", "Banco", 101),
+                (4, "2023-01-08", "Carteira", -29),
+                (5, "2023-01-09", "Carteira", 30),
+                (6, "2023-02-10", "Banco", -123457),
+            ])
+            self.assertEqual(db.buscar_saldos(), [("Banco", -124305), ("Carteira", 1)])
+            self.assertEqual(db.verificar_resumo(), [])
+            self.assertGreater(db.fetch_all('PRAGMA user_version')[0][0], 0)
+        finally:
+            db.conn.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
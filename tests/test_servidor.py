@@ -0,0 +1,79 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from gestor_financeiro.banco import DatabaseManager
+from gestor_financeiro.exportacao import TAMANHO_BLOCO_EXPORTACAO
+from gestor_financeiro.servidor import ServidorAPI
+
+
+async def _enviar(porta, metodo, caminho, dados=None):
+    # Devolve a resposta inteira, lida até o servidor fechar a conexão
+    reader, writer = await asyncio.open_connection("127.0.0.1", porta)
+    corpo = b"" if dados is None else json.dumps(dados).encode()
+    writer.write(f"{metodo} {caminho} HTTP/1.1\r\nContent-Length: {len(corpo)}\r\nConnection: close\r\n\r\n".encode()
+                 + corpo)
+    await writer.drain()
+    try:
+        return await asyncio.wait_for(reader.read(), 5)
+    finally:
+        writer.close()
+
+
+async def _requisitar(porta, metodo, caminho, dados=None):
+    cabecalho, _, corpo = (await _enviar(porta, metodo, caminho, dados)).partition(b"\r\n\r\n")
+    return int(cabecalho.split()[1]), json.loads(corpo) if corpo else None
+
+
+class TesteServidor(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self._pasta = tempfile.TemporaryDirectory()
+        self.api = ServidorAPI(os.path.join(self._pasta.name, "financeiro.db"), leitores=1)
+        servidor = await self.api.iniciar(port=0)
+        self.porta = servidor.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        await self.api.encerrar()
+        self._pasta.cleanup()
+
+    async def test_campos_com_tipo_errado_sao_recusados(self):
+        valido = {"data": "01/01/2024", "tipo": "Entrada", "conta": "Banco", "valor": "10,00", "observacoes": "x"}
+        for campo, valor in (("conta", []), ("tipo", {}), ("observacoes", 5), ("data", None), ("valor", [1])):
+            with self.subTest(campo=campo):
+                status, resposta = await _requisitar(self.porta, "POST", "/movimentacoes", {**valido, campo: valor})
+                self.assertEqual(status, 400)
+                self.assertIn(campo, resposta["erro"])
+        status, resposta = await _requisitar(self.porta, "POST", "/movimentacoes", {**valido, "observacoes": None})
+        self.assertEqual(status, 201)
+
+    async def test_erro_inesperado_responde_500(self):
+        with mock.patch.object(ServidorAPI, "_listar", side_effect=RuntimeError("falha")), \
+                self.assertLogs("gestor_financeiro.servidor", "ERROR"):
+            status, resposta = await _requisitar(self.porta, "GET", "/movimentacoes")
+        self.assertEqual(status, 500)
+        self.assertEqual(resposta, {"erro": "erro interno do servidor"})
+
+    async def test_exportar_com_filtro_invalido_responde_400_antes_do_corpo(self):
+        resposta = await _enviar(self.porta, "GET", "/exportar?data_inicio=xx&data_fim=yy")
+        self.assertTrue(resposta.startswith(b"HTTP/1.1 400 "))
+        self.assertEqual(resposta.count(b"HTTP/1.1"), 1)
+
+    async def test_exportar_com_falha_no_meio_derruba_a_conexao(self):
+        def iterar(db, filtros=None):
+            for numero in range(TAMANHO_BLOCO_EXPORTACAO):
+                yield (numero + 1, "2024-01-01", "Entrada", "Banco", 100, "")
+            raise RuntimeError("falha no meio")
+
+        with mock.patch.object(DatabaseManager, "iterar_movimentacoes", iterar), \
+                self.assertLogs("gestor_financeiro.servidor", "ERROR"):
+            resposta = await _enviar(self.porta, "GET", "/exportar")
+        self.assertTrue(resposta.startswith(b"HTTP/1.1 200 "))
+        self.assertEqual(resposta.count(b"HTTP/1.1"), 1)
+        self.assertFalse(resposta.endswith(b"0\r\n\r\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from gestor_financeiro import DatabaseManager, ErroBancoDados, restaurar_backup
+
+
+def _conteudo(db):
+    return db.fetch_all('''
+        SELECT m.data, m.tipo, c.nome, m.valor_centavos, m.observacoes
+        FROM movimentacoes m JOIN contas c ON c.id = m.conta_id
+        ORDER BY m.data, m.valor_centavos, m.observacoes
+    ''')
+
+
+class TesteSincronizacao(unittest.TestCase):
+    def setUp(self):
+        self._pasta = tempfile.TemporaryDirectory()
+        self.pasta = self._pasta.name
+        self.abertos = []
+
+    def tearDown(self):
+        for db in self.abertos:
+            db.conn.close()
+        self._pasta.cleanup()
+
+    def abrir(self, nome):
+        db = DatabaseManager(os.path.join(self.pasta, nome))
+        self.abertos.append(db)
+        return db
+
+    def adicionar(self, db, data, valor, observacoes, conta="Banco", tipo="Entrada"):
+        return db.adicionar_movimentacao(data=data, tipo=tipo, conta=conta, valor=valor, observacoes=observacoes)
+
+    def editar(self, db, mov_id, data, valor, observacoes, conta="Banco", tipo="Entrada"):
+        return db.editar_movimentacao(mov_id, data=data, tipo=tipo, conta=conta, valor=valor, observacoes=observacoes)
+
+    def exportar(self, db, nome, desde=0):
+        caminho = os.path.join(self.pasta, nome)
+        return caminho, db.exportar_alteracoes(caminho, desde)[1]
+
+    def test_exportar_e_aplicar_entre_instancias(self):
+        a = self.abrir("a.db")
+        b = self.abrir("b.db")
+        self.adicionar(a, "01/01/2024", 10, "salário")
+        self.adicionar(a, "02/01/2024", 5, "café", tipo="Saída")
+        caminho, _ = self.exportar(a, "a.ndjson")
+        self.assertEqual(b.aplicar_alteracoes(caminho), (3, 0))
+        self.assertEqual(_conteudo(b), _conteudo(a))
+        self.assertEqual(b.buscar_saldos(), a.buscar_saldos())
+        # O mesmo arquivo aplicado de novo não muda nada
+        self.assertEqual(b.aplicar_alteracoes(caminho), (0, 3))
+        self.assertEqual(_conteudo(b), _conteudo(a))
+
+    def test_reaplicar_edicao_em_conta_com_varias_movimentacoes(self):
+        a = self.abrir("a.db")
+        b = self.abrir("b.db")
+        primeira = self.adicionar(a, "01/01/2024", 10, "salário")
+        self.adicionar(a, "02/01/2024", 20, "bônus")
+        caminho, ate = self.exportar(a, "a1.ndjson")
+        b.aplicar_alteracoes(caminho)
+        self.editar(a, primeira, "03/01/2024", 15, "salário corrigido")
+        caminho, _ = self.exportar(a, "a2.ndjson", ate)
+        self.assertEqual(b.aplicar_alteracoes(caminho), (1, 0))
+        self.assertEqual(_conteudo(b), _conteudo(a))
+        self.assertEqual(b.buscar_saldos(), [("Banco", 3500)])
+        self.assertEqual(b.verificar_resumo(), [])
+
+    def test_copias_com_instancia_nova_nao_confundem_ids(self):
+        a = self.abrir("a.db")
+        self.adicionar(a, "01/01/2024", 10, "salário")
+        a.conn.close()
+        shutil.copyfile(os.path.join(self.pasta, "a.db"), os.path.join(self.pasta, "b.db"))
+        a = self.abrir("a.db")
+        b = self.abrir("b.db")
+        b.renovar_instancia()
+        # Cada cópia cria uma movimentação diferente com o mesmo id local
+        id_a = self.adicionar(a, "02/01/2024", 20, "aluguel recebido")
+        id_b = self.adicionar(b, "03/01/2024", 7, "farmácia", tipo="Saída")
+        self.assertEqual(id_a, id_b)
+        caminho_a, ate_a = self.exportar(a, "a.ndjson")
+        caminho_b, ate_b = self.exportar(b, "b.ndjson")
+        b.aplicar_alteracoes(caminho_a)
+        a.aplicar_alteracoes(caminho_b)
+        self.assertEqual(len(_conteudo(a)), 3)
+        self.assertEqual(_conteudo(a), _conteudo(b))
+
+        # Edições e exclusões voltam para a movimentação certa nas duas direções
+        id_b_em_a = a.fetch_all("SELECT id FROM movimentacoes WHERE observacoes = 'farmácia'")[0][0]
+        self.editar(a, id_b_em_a, "03/01/2024", 8, "farmácia", tipo="Saída")
+        b.excluir_movimentacao(b.fetch_all("SELECT id FROM movimentacoes WHERE observacoes = 'aluguel recebido'")[0][0])
+        caminho_a, _ = self.exportar(a, "a2.ndjson", ate_a)
+        caminho_b, _ = self.exportar(b, "b2.ndjson", ate_b)
+        b.aplicar_alteracoes(caminho_a)
+        a.aplicar_alteracoes(caminho_b)
+        self.assertEqual(_conteudo(a), [("2024-01-01", "Entrada", "Banco", 1000, "salário"),
+                                        ("2024-01-03", "Saída", "Banco", -800, "farmácia")])
+        self.assertEqual(_conteudo(b), _conteudo(a))
+        self.assertEqual(b.buscar_saldos(), a.buscar_saldos())
+
+    def test_arquivo_invalido_nao_altera_o_banco(self):
+        b = self.abrir("b.db")
+        caminho = os.path.join(self.pasta, "invalido.ndjson")
+        with open(caminho, "w", encoding="utf-8") as arquivo:
+            arquivo.write("{}\n")
+        with self.assertRaises(ValueError):
+            b.aplicar_alteracoes(caminho)
+        self.assertEqual(_conteudo(b), [])
+
+    def test_backup_duas_vezes_e_restaurar(self):
+        a = self.abrir("a.db")
+        backups = os.path.join(self.pasta, "backups")
+        primeira = self.adicionar(a, "01/01/2024", 10, "salário")
+        self.assertTrue(a.fazer_backup(backups).endswith(".db"))
+        self.adicionar(a, "02/01/2024", 20, "bônus")
+        self.editar(a, primeira, "01/01/2024", 12, "salário")
+        self.assertTrue(a.fazer_backup(backups).endswith(".ndjson"))
+        self.adicionar(a, "03/01/2024", 3, "café", tipo="Saída")
+        a.excluir_movimentacao(primeira)
+        self.assertTrue(a.fazer_backup(backups).endswith(".ndjson"))
+        self.assertIsNone(a.fazer_backup(backups))
+
+        destino = os.path.join(self.pasta, "restaurado.db")
+        self.assertEqual(restaurar_backup(backups, destino), 4)
+        restaurado = self.abrir("restaurado.db")
+        self.assertEqual(_conteudo(restaurado), _conteudo(a))
+        self.assertEqual(restaurado.buscar_saldos(), a.buscar_saldos())
+        self.assertEqual(restaurado.fetch_all('SELECT seq, tabela, operacao, dados FROM alteracoes ORDER BY seq'),
+                         a.fetch_all('SELECT seq, tabela, operacao, dados FROM alteracoes ORDER BY seq'))
+
+    def test_restaurar_com_falha_remove_o_destino(self):
+        a = self.abrir("a.db")
+        backups = os.path.join(self.pasta, "backups")
+        self.adicionar(a, "01/01/2024", 10, "salário")
+        a.fazer_backup(backups)
+        self.adicionar(a, "02/01/2024", 20, "bônus")
+        self.adicionar(a, "03/01/2024", 30, "prêmio")
+        incremental = a.fazer_backup(backups)
+        # Um incremental que pula alterações desta instância não pode ser aplicado
+        with open(incremental, encoding="utf-8") as arquivo:
+            linhas = arquivo.readlines()
+        with open(incremental, "w", encoding="utf-8") as arquivo:
+            arquivo.writelines(linhas[:1] + linhas[2:])
+        destino = os.path.join(self.pasta, "restaurado.db")
+        with self.assertRaises(ErroBancoDados):
+            restaurar_backup(backups, destino)
+        self.assertFalse(any(nome.startswith("restaurado.db") for nome in os.listdir(self.pasta)))
+
+
+if __name__ == "__main__":
+    unittest.main()